@@ -74,6 +74,8 @@ const translations = {
         "dashboard.7_days": "7 Days",
         "dashboard.1_week": "1 Week",
         "dashboard.1_month": "1 Month",
+        "dashboard.3_months": "3 Months",
+        "dashboard.1_year": "1 Year",
         "dashboard.select_species": "Select Species",
         "dashboard.systolic_range": "Systolic within range",
         "dashboard.avg_today": "Avg: 38.2°C today",
@@ -634,6 +636,8 @@ const translations = {
         "dashboard.7_days": "7 दिन",
         "dashboard.1_week": "1 हफ्ता",
         "dashboard.1_month": "1 महीना",
+        "dashboard.3_months": "3 महीने",
+        "dashboard.1_year": "1 साल",
         "dashboard.select_species": "प्रजाति चुनें",
         "dashboard.systolic_range": "सिस्टोलिक सीमा में है",
         "dashboard.avg_today": "आज का औसत: 38.2°C",
@@ -1,13 +1,12 @@
-import sqlite3
+from db import get_db
 from flask import session, render_template, request, redirect, flash, url_for
 
 def login_admin(username, password):
     """Login admin user"""
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM admin WHERE username = ? AND password = ?", (username, password))
     admin = cursor.fetchone()
-    conn.close()
 
     if admin:
         session['admin'] = admin[1]  # username
@@ -17,8 +16,7 @@ def login_admin(username, password):
 
 def get_user_species(user_email):
     """Get species and their counts for a specific user"""
-    conn = sqlite3.connect('users.db')
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT species, COUNT(*) as count
@@ -28,13 +26,11 @@ def get_user_species(user_email):
         ORDER BY species
     """, (user_email,))
     species = cursor.fetchall()
-    conn.close()
     return species
 
 def get_all_users():
     """Get all users from database with animal count and species info"""
-    conn = sqlite3.connect('users.db')
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT u.id, u.full_name, u.email, u.mobile, u.age, u.gender,
@@ -53,22 +49,19 @@ def get_all_users():
         user_dict['species_list'] = get_user_species(user['email'])
         users_list.append(user_dict)
     
-    conn.close()
     return users_list
 
 def get_all_vets():
     """Get all vets from database"""
-    conn = sqlite3.connect('users.db')
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("SELECT id, full_name, email, license_id, region FROM vets")
     vets = cursor.fetchall()
-    conn.close()
     return vets
 
 def get_user_statistics():
     """Get user statistics"""
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute("SELECT COUNT(*) FROM users")
@@ -83,7 +76,6 @@ def get_user_statistics():
     cursor.execute("SELECT COUNT(*) FROM health_readings")
     total_readings = cursor.fetchone()[0]
     
-    conn.close()
     
     return {
         'total_users': total_users,
@@ -95,7 +87,7 @@ def get_user_statistics():
 def delete_user(user_id):
     """Delete a user"""
     try:
-        conn = sqlite3.connect('users.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         # Get user email first
@@ -110,7 +102,6 @@ def delete_user(user_id):
             cursor.execute("DELETE FROM appointment_queue WHERE user_email = ?", (user_email,))
             cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
             conn.commit()
-            conn.close()
             return True
     except Exception as e:
         print(f"Error deleting user: {e}")
@@ -120,12 +111,11 @@ def delete_user(user_id):
 def delete_vet(vet_id):
     """Delete a vet"""
     try:
-        conn = sqlite3.connect('users.db')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute("DELETE FROM vets WHERE id = ?", (vet_id,))
         cursor.execute("DELETE FROM vet_notifications WHERE animal_tag IN (SELECT animal_tag FROM appointment_queue)")
         conn.commit()
-        conn.close()
         return True
     except Exception as e:
         print(f"Error deleting vet: {e}")
@@ -135,7 +125,7 @@ def delete_vet(vet_id):
 def update_user(user_id, full_name, email, mobile, age, gender):
     """Update user information"""
     try:
-        conn = sqlite3.connect('users.db')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute("""
             UPDATE users 
@@ -143,7 +133,6 @@ def update_user(user_id, full_name, email, mobile, age, gender):
             WHERE id = ?
         """, (full_name, email, mobile, age, gender, user_id))
         conn.commit()
-        conn.close()
         return True
     except Exception as e:
         print(f"Error updating user: {e}")
@@ -152,7 +141,7 @@ def update_user(user_id, full_name, email, mobile, age, gender):
 def update_vet(vet_id, full_name, email, license_id, region):
     """Update vet information"""
     try:
-        conn = sqlite3.connect('users.db')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute("""
             UPDATE vets 
@@ -160,7 +149,6 @@ def update_vet(vet_id, full_name, email, license_id, region):
             WHERE id = ?
         """, (full_name, email, license_id, region, vet_id))
         conn.commit()
-        conn.close()
         return True
     except Exception as e:
         print(f"Error updating vet: {e}")
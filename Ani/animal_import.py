@@ -0,0 +1,203 @@
+"""
+Streaming bulk import of animals from CSV or Excel uploads.
+Rows are read one at a time (csv.reader over a text wrapper, openpyxl in
+read-only mode) and validated, and the valid ones are inserted in chunks
+with executemany inside a single transaction. Each chunk's tags are
+reserved per species from the tag_sequences counter instead of scanning
+the animals table for every row. A chunk that hits a database error is
+retried row by row so only the offending rows are reported.
+"""
+import csv
+import io
+import sqlite3
+
+import openpyxl
+
+from config import Config
+from db import get_db
+from user import reserve_tag_range
+
+VALID_SPECIES = ['Cow', 'Buffalo', 'Sheep', 'Goat', 'Horse', 'Pig']
+
+INSERT_ANIMAL = '''
+    INSERT INTO animals (tag, name, species, weight, age, gender, user_email)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def iter_csv_rows(stream):
+    """Yield (row number, cells) from a CSV upload without reading it all into memory"""
+    # utf-8-sig drops the byte order mark Excel puts in front of exported CSVs
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        yield from enumerate(csv.reader(text), start=1)
+    finally:
+        # Leave the upload stream open; Werkzeug closes it
+        text.detach()
+
+
+def iter_xlsx_rows(stream):
+    """Yield (row number, cells) from the active sheet of an Excel upload"""
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        yield from enumerate(workbook.active.iter_rows(values_only=True), start=1)
+    finally:
+        workbook.close()
+
+
+def column_map(headers):
+    """Map each field to its column index. Headers are matched loosely
+    ('Weight (kg)' is weight); a later matching column wins."""
+    columns = {}
+    for index, header in enumerate(headers):
+        if header is None:
+            continue
+        key = str(header).lower().strip()
+        if 'name' in key:
+            columns['name'] = index
+        elif 'species' in key:
+            columns['species'] = index
+        elif 'weight' in key:
+            columns['weight'] = index
+        elif 'age' in key:
+            columns['age'] = index
+        elif 'gender' in key:
+            columns['gender'] = index
+    return columns
+
+
+def parse_animal(cells, columns):
+    """Validate one row. Returns (name, species, weight, age, gender);
+    raises ValueError with the message to report for that row."""
+    def cell(field):
+        index = columns.get(field)
+        return cells[index] if index is not None and index < len(cells) else None
+
+    name, species, weight, age, gender = (cell(field) for field in ('name', 'species', 'weight', 'age', 'gender'))
+
+    # Validate required fields
+    if not name or len(str(name).strip()) == 0:
+        raise ValueError('Name is required')
+    if not species or len(str(species).strip()) == 0:
+        raise ValueError('Species is required')
+
+    name = str(name).strip()
+    species = str(species).strip()
+
+    # Validate species
+    species_match = next((valid for valid in VALID_SPECIES if species.lower() == valid.lower()), None)
+    if not species_match:
+        raise ValueError(f'Invalid species: {species}. Valid options: {", ".join(VALID_SPECIES)}')
+
+    # Convert weight and age to appropriate types
+    try:
+        weight = float(weight) if weight else None
+    except (ValueError, TypeError):
+        weight = None
+
+    try:
+        age = int(age) if age else None
+    except (ValueError, TypeError):
+        age = None
+
+    # Normalize gender
+    if gender:
+        gender = str(gender).strip().lower()
+        if gender not in ['male', 'female', 'm', 'f']:
+            gender = None
+        elif gender == 'm':
+            gender = 'Male'
+        elif gender == 'f':
+            gender = 'Female'
+        else:
+            gender = gender.capitalize()
+    else:
+        gender = 'Female'  # Default
+
+    return name, species_match, weight, age, gender
+
+
+class AnimalImporter:
+    """Inserts validated rows in chunks within one transaction and collects per-row errors"""
+
+    def __init__(self, user_email, chunk_size=Config.IMPORT_CHUNK_SIZE,
+                 max_reported_errors=Config.IMPORT_MAX_REPORTED_ERRORS):
+        self.user_email = user_email
+        self.chunk_size = chunk_size
+        self.max_reported_errors = max_reported_errors
+        self.added = 0
+        self.errors = []
+        self.error_count = 0
+        self._chunk = []
+
+    def error(self, row_num, message):
+        # Every error is counted; only the first few are listed in the response
+        self.error_count += 1
+        if len(self.errors) < self.max_reported_errors:
+            self.errors.append({'row': row_num, 'message': message})
+
+    def run(self, rows):
+        """rows: (row number, cells) pairs, the first being the header row.
+        Everything is committed together at the end (or rolled back on failure)."""
+        rows = iter(rows)
+        header = next(rows, None)
+        if header is None:
+            return self
+        columns = column_map(header[1])
+
+        conn = get_db()
+        conn.execute('BEGIN')
+        try:
+            for row_num, cells in rows:
+                # Skip blank lines
+                if not any(value not in (None, '') for value in cells):
+                    continue
+                try:
+                    self._chunk.append((row_num, parse_animal(cells, columns)))
+                except ValueError as e:
+                    self.error(row_num, str(e))
+                    continue
+                if len(self._chunk) >= self.chunk_size:
+                    self._flush(conn)
+            self._flush(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return self
+
+    def _flush(self, conn):
+        chunk, self._chunk = self._chunk, []
+        if not chunk:
+            return
+        cursor = conn.cursor()
+
+        # One tag range per species for the whole chunk
+        counts = {}
+        for _, animal in chunk:
+            counts[animal[1]] = counts.get(animal[1], 0) + 1
+        tags = {}
+        for species, count in counts.items():
+            tags[species] = iter(reserve_tag_range(cursor, species, count))
+        records = [(next(tags[animal[1]]),) + animal + (self.user_email,) for _, animal in chunk]
+
+        cursor.execute('SAVEPOINT import_chunk')
+        try:
+            cursor.executemany(INSERT_ANIMAL, records)
+            self.added += len(records)
+        except sqlite3.DatabaseError:
+            # Find the offending rows one at a time
+            cursor.execute('ROLLBACK TO import_chunk')
+            for (row_num, _), record in zip(chunk, records):
+                try:
+                    cursor.execute(INSERT_ANIMAL, record)
+                    self.added += 1
+                except sqlite3.DatabaseError as e:
+                    self.error(row_num, f'Failed to add animal to database: {e}')
+        cursor.execute('RELEASE import_chunk')
+
+
+def import_animals(rows, user_email):
+    """Import (row number, cells) rows for user_email. Returns (added, errors, error_count)."""
+    importer = AnimalImporter(user_email).run(rows)
+    return importer.added, importer.errors, importer.error_count
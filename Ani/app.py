@@ -6,7 +6,24 @@ from werkzeug.security import generate_password_hash
 from login import login_user, login_vet, get_user_by_email, get_vet_by_email
 from admin import login_admin, get_all_users, get_all_vets, get_user_statistics, delete_user, delete_vet, update_user, update_vet
 from user import init_animals_table, add_animal, get_animals_by_user, get_all_animals, get_animal_by_tag, update_animal, assign_sample_animals_to_user, deactivate_animal, get_inactive_animals_by_user, get_all_animals_by_user
-from simulate import get_current_health_data, generate_readings_history, get_species_normal_ranges, load_previous_readings_from_db
+from simulate import get_current_health_data, generate_shard, generate_readings_history, get_species_normal_ranges
+from simulator_state import state_store
+from db import get_db, close_db, init_app as init_db_app
+from schema import init_db, prepare_database
+from readings import save_health_reading, save_health_readings, get_latest_reading, get_consecutive_summary, ROLLUP_TABLES
+from trends import TREND_PERIODS, get_trend_data
+from retention import run_retention
+from config import Config, get_config
+from scheduler_lease import SchedulerLease
+from reading_stream import reading_broker, format_event
+from reading_jobs import ReadingJobQueue
+from inference import InferenceBatcher
+from animal_import import iter_csv_rows, iter_xlsx_rows, import_animals
+from model_loader import ModelLoader
+from prediction_cache import PredictionCache, cache_key
+from response_cache import ResponseCache, bump_version
+from image_preprocess import preprocess_image, preprocess_uploads, TTA_VIEWS
+from health_report import fetch_report_data, render_report
 import os
 from datetime import datetime, timedelta
 import time
@@ -16,13 +33,18 @@ import io
 import openpyxl
 import csv
 import threading
+import queue
+import zlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import FileWrapper
 import base64
 import json
 import numpy as np
-from PIL import Image
 
-# Keras will be imported lazily when needed (avoid Python 3.13 compatibility issues)
+# TensorFlow/TFLite are imported lazily by model_loader (avoid Python 3.13 compatibility issues)
 
 app = Flask(__name__, template_folder='Templates', static_folder='Static')
 
@@ -31,127 +53,287 @@ FLASK_ENV = os.getenv('FLASK_ENV', 'development')
 app.secret_key = os.getenv('SECRET_KEY', 'dev-secure-key-change-in-production-12345')
 app.config['DEBUG'] = FLASK_ENV == 'development'
 
-# Database configuration
-DB_PATH = os.getenv('DATABASE_PATH', os.path.join(os.path.dirname(__file__), 'users.db'))
+# Database connections are shared per worker thread (see db.py)
+init_db_app(app)
 
-# Global scheduler
+# Global scheduler and the leases that decide which worker runs the readings and retention jobs
 scheduler = None
-
-# Global Keras model and labels (loaded once at startup)
-keras_model = None
-keras_labels = []
-
-def load_keras_model():
-    """Load the Keras model and labels once at startup"""
-    global keras_model, keras_labels
-    
-    model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Model', 'keras_model.h5')
-    labels_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Model', 'labels.txt')
-    
-    try:
-        # Use tf_keras for legacy Teachable Machine model support
-        import tf_keras as keras
-        
-        # Load the Keras model with legacy H5 format
-        keras_model = keras.models.load_model(model_path, compile=False)
-        print(f"[{datetime.now()}] Keras model loaded successfully from {model_path}")
-        
-        # Load the labels
-        with open(labels_path, 'r') as f:
-            keras_labels = [line.strip().split(' ', 1)[1] if ' ' in line.strip() else line.strip() for line in f.readlines()]
-        print(f"[{datetime.now()}] Labels loaded: {keras_labels}")
-        
-        # Warm-up prediction to optimize model for faster subsequent predictions
-        dummy_input = np.zeros((1, 224, 224, 3), dtype=np.float32)
-        keras_model.predict(dummy_input, verbose=0)
-        print(f"[{datetime.now()}] Model warm-up complete - ready for fast predictions")
-        
-    except Exception as e:
-        print(f"Error loading Keras model: {e}")
-        keras_model = None
-        keras_labels = []
-
-def generate_health_reading_for_animal(animal_tag, species):
-    """Generate and save a health reading for an animal"""
+scheduler_lease = None
+retention_lease = None
+
+# Process pool for sharded reading generation (created on first use)
+reading_executor = None
+
+# Time of the last full reading cycle, for client-side sync
+LAST_READING_TIME_FILE = 'last_reading_time.txt'
+
+# Image model, loaded on first use (or after fork from the file gunicorn's master read, see model_loader.py)
+model_loader = ModelLoader()
+
+def predict_image_batch(batch):
+    """Run the image model on a batch of preprocessed images"""
+    return model_loader.predict(batch)
+
+# Concurrent /predict-image requests share predict calls (see inference.py)
+inference_batcher = InferenceBatcher(predict_image_batch)
+
+# Re-uploads of the same photo skip the model (see prediction_cache.py)
+prediction_cache = PredictionCache()
+# Polled read APIs are answered from memory until a write bumps their data version (see response_cache.py)
+response_cache = ResponseCache()
+
+def describe_class(index):
+    """Class name for a model output index, with species and disease separated"""
+    labels = model_loader.labels
+    class_name = labels[index] if index < len(labels) else f"Class {index}"
+    
+    # Parse species and disease from class name (format: "Species - Disease")
+    parts = class_name.split(' - ', 1)
+    species = parts[0] if len(parts) > 0 else "Unknown"
+    disease = parts[1] if len(parts) > 1 else class_name
+    return {'className': class_name, 'species': species, 'disease': disease}
+
+def format_prediction(scores):
+    """Turn one row of model scores into the top class with species and disease separated"""
+    # Get the predicted class index and confidence
+    predicted_index = int(np.argmax(scores))
+    return {**describe_class(predicted_index), 'confidence': float(scores[predicted_index])}
+
+def top_k_predictions(scores, k):
+    """The k most likely classes, most likely first"""
+    k = min(k, len(scores))
+    indexes = np.argpartition(scores, -k)[-k:]
+    indexes = indexes[np.argsort(scores[indexes])[::-1]]
+    return [{**describe_class(int(index)), 'probability': float(scores[index])} for index in indexes]
+
+def shard_animals(animals, shard_count):
+    """Split (tag, species, last_health_index) tuples into shards by a stable hash of the tag"""
+    shards = [[] for _ in range(shard_count)]
+    for animal in animals:
+        shards[zlib.crc32(animal[0].encode()) % shard_count].append(animal)
+    return [(shard, members) for shard, members in enumerate(shards) if members]
+
+def get_reading_executor():
+    """Create the reading process pool on first use.
+    Workers are spawned rather than forked so they never inherit the scheduler's threads or locks."""
+    global reading_executor
+    if reading_executor is None:
+        reading_executor = ProcessPoolExecutor(max_workers=Config.READING_WORKERS,
+                                               mp_context=multiprocessing.get_context('spawn'))
+        atexit.register(reading_executor.shutdown, cancel_futures=True)
+    return reading_executor
+
+def generate_reading_shards(shards, states, timestamp, use_pool):
+    """Yield (shard, rows, states, generate seconds, wall seconds) as each shard finishes"""
+    start = time.perf_counter()
+    shard_states = {
+        shard: {tag: states[tag] for tag, _, _ in animals}
+        for shard, animals in shards
+    }
+    if not use_pool:
+        for shard, animals in shards:
+            shard, rows, advanced, seconds = generate_shard(shard, animals, shard_states[shard], timestamp)
+            yield shard, rows, advanced, seconds, time.perf_counter() - start
+        return
+    
+    executor = get_reading_executor()
+    futures = [
+        executor.submit(generate_shard, shard, animals, shard_states[shard], timestamp)
+        for shard, animals in shards
+    ]
+    for future in as_completed(futures):
+        shard, rows, advanced, seconds = future.result()
+        yield shard, rows, advanced, seconds, time.perf_counter() - start
+
+def write_reading_shards(results):
+    """Write every shard's readings and simulator state in one short transaction.
+    The shards are generated first, so the write lock is only held for the inserts.
+    Returns the number of readings written."""
+    conn = get_db()
+    cursor = conn.cursor()
+    count = 0
     try:
-        health_data = get_current_health_data(animal_tag, species)
-        
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO health_readings (animal_tag, heart_rate, body_temp, blood_pressure, movement, health_index, status, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            animal_tag,
-            health_data['heart_rate'],
-            health_data['body_temp'],
-            health_data['blood_pressure'],
-            health_data['movement'],
-            health_data['health_index'],
-            health_data['status'],
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        ))
-        
+        cursor.execute('BEGIN IMMEDIATE')
+        for rows, states in results:
+            count += save_health_readings(cursor, rows)
+            state_store.save_many(cursor, states)
         conn.commit()
-        conn.close()
-        print(f"[{datetime.now()}] Generated health reading for {animal_tag}")
-        return True
-    except Exception as e:
-        print(f"Error generating reading for {animal_tag}: {e}")
-        return False
+    except Exception:
+        # The cache still holds the states from before the cycle, which is what SQLite has again
+        conn.rollback()
+        raise
+    # Committed: the advanced states are what the next cycle starts from
+    for _, states in results:
+        state_store.remember(states)
+    return count
+
+def generate_health_readings(user_email=None, progress=None):
+    """Generate one reading for every active animal, or only for user_email's animals.
+    Cycles never overlap, in this process or another: each holds the reading_cycle
+    lease from loading the simulator state until its readings are committed.
+    progress(done, total) is called as shards finish. Returns the number of
+    readings written and raises if the cycle failed."""
+    # A fresh holder per cycle, so the scheduler and job threads exclude each other too
+    cycle_lease = SchedulerLease('reading_cycle', Config.READING_CYCLE_LEASE_SECONDS)
+    if not cycle_lease.wait(Config.READING_CYCLE_WAIT_SECONDS):
+        raise RuntimeError('Another reading cycle is still running')
+    try:
+        return run_reading_cycle(user_email, progress, cycle_lease)
+    finally:
+        cycle_lease.release()
+
+def run_reading_cycle(user_email, progress, cycle_lease):
+    """One query loads the animals with their last health index. They are split into
+    shards by tag hash and generated on a process pool (in-process for small
+    herds); once every shard is back they are written in one short transaction.
+    The cycle lease is renewed as shards finish."""
+    global reading_executor
+    cycle_start = time.perf_counter()
+    
+    cursor = get_db().cursor()
+    
+    # Get the active animals together with their last health index
+    query = '''
+        SELECT a.tag, a.species, l.health_index
+        FROM animals a
+        LEFT JOIN latest_health_reading l ON l.animal_tag = a.tag
+        WHERE a.is_active = 1
+    '''
+    if user_email is None:
+        cursor.execute(query)
+    else:
+        cursor.execute(query + ' AND a.user_email = ?', (user_email,))
+    animals = [(a['tag'], a['species'], a['health_index']) for a in cursor.fetchall()]
+    load_time = time.perf_counter() - cycle_start
+    
+    if progress:
+        progress(0, len(animals))
+    if not animals:
+        print("No active animals found")
+        return 0
+    
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    states = state_store.get_many([tag for tag, _, _ in animals])
+    shards = shard_animals(animals, max(1, Config.READING_SHARDS))
+    use_pool = Config.READING_WORKERS > 1 and len(animals) >= Config.READING_POOL_MIN_ANIMALS
+    print(f"[{datetime.now()}] {len(animals)} animals in {len(shards)} shards "
+          f"({'process pool of ' + str(Config.READING_WORKERS) if use_pool else 'in-process'})")
+    
+    # Buffered in memory (one small row per animal) so no lock is held while shards compute
+    results = []
+    start = time.perf_counter()
+    done = 0
+    try:
+        for shard, rows, advanced, seconds, wall in generate_reading_shards(shards, states, timestamp, use_pool):
+            results.append((rows, advanced))
+            done += len(rows)
+            print(f"[{datetime.now()}] Shard {shard}: {len(rows)} readings generated in {seconds * 1000:.1f} ms, "
+                  f"done after {wall * 1000:.1f} ms ({done}/{len(animals)} animals)")
+            cycle_lease.acquire()
+            if progress:
+                progress(done, len(animals))
+    except BrokenProcessPool:
+        # A worker died; start a fresh pool next cycle
+        reading_executor = None
+        raise
+    generate_time = time.perf_counter() - start
+    
+    # Expired leases can be taken over: only the holder may write its cycle
+    if not cycle_lease.acquire():
+        raise RuntimeError('Lost the reading cycle lease before writing')
+    write_start = time.perf_counter()
+    count = write_reading_shards(results)
+    write_time = time.perf_counter() - write_start
+    
+    # Wake this process's stream subscribers; other workers pick the commit up on their next poll
+    reading_broker.notify()
+    
+    # Update the last reading time in a file for client-side sync (full cycles only)
+    if user_email is None:
+        with open(LAST_READING_TIME_FILE, 'w') as f:
+            f.write(timestamp)
+    
+    total_time = time.perf_counter() - cycle_start
+    print(f"[{datetime.now()}] Generated readings for {count} animals in {total_time * 1000:.1f} ms "
+          f"(load {load_time * 1000:.1f} ms, generate {generate_time * 1000:.1f} ms, write {write_time * 1000:.1f} ms)")
+    return count
 
 def scheduled_health_reading_job():
-    """Background job that generates readings for ALL active animals every hour"""
+    """Background job that generates readings for ALL active animals every 5 minutes"""
     print(f"\n[{datetime.now()}] Running scheduled health readings job...")
-    
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # Get all active animals
-        cursor.execute('SELECT tag, species FROM animals WHERE is_active = 1')
-        animals = cursor.fetchall()
-        conn.close()
-        
-        if not animals:
-            print("No active animals found")
-            return
-        
-        count = 0
-        for animal in animals:
-            if generate_health_reading_for_animal(animal['tag'], animal['species']):
-                count += 1
-        
-        # Update the last reading time in a file for client-side sync
-        with open('last_reading_time.txt', 'w') as f:
-            f.write(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-        
-        print(f"[{datetime.now()}] Generated readings for {count} animals")
-        
+        return generate_health_readings()
     except Exception as e:
         print(f"Error in scheduled job: {e}")
+        return 0
+
+# Readings triggered from the dashboard run in the background, scoped to the caller's animals
+reading_jobs = ReadingJobQueue(generate_health_readings, Config.TRIGGER_COALESCE_SECONDS,
+                               Config.READING_JOB_STALE_SECONDS)
+
+def renew_scheduler_lease():
+    """Scheduler heartbeat: take or renew the readings lease"""
+    scheduler_lease.acquire()
+
+def run_scheduled_readings():
+    """Run the readings job if this process holds the lease and no cycle has run this interval"""
+    interval = Config.SCHEDULER_INTERVAL_MINUTES * 60
+    # Half a heartbeat of slack so cycles land on the nearest tick instead of drifting later
+    if scheduler_lease.is_leader and scheduler_lease.claim_run(interval, Config.SCHEDULER_HEARTBEAT_SECONDS / 2):
+        scheduled_health_reading_job()
+
+def run_scheduled_retention():
+    """Apply the retention policy if this process holds the retention lease and
+    it hasn't run this interval (see retention.py)"""
+    interval = Config.RETENTION_INTERVAL_HOURS * 3600
+    if retention_lease.acquire() and retention_lease.claim_run(interval):
+        try:
+            run_retention()
+        except Exception as e:
+            print(f"Error in retention job: {e}")
 
 def start_scheduler():
-    """Start the background scheduler for health readings every 5 minutes"""
-    global scheduler
+    """Start this process's scheduler. Every worker runs one, but only the
+    holder of the SQLite lease runs the readings job (see scheduler_lease.py)."""
+    global scheduler, scheduler_lease, retention_lease
     
     if scheduler is None:
+        # Created here, after any fork, so each worker gets its own holder id
+        scheduler_lease = SchedulerLease('health_readings', Config.SCHEDULER_LEASE_SECONDS)
+        scheduler_lease.acquire()
+        retention_lease = SchedulerLease('reading_retention', Config.SCHEDULER_LEASE_SECONDS)
+        
         scheduler = BackgroundScheduler()
-        # Run every 5 minutes
-        scheduler.add_job(func=scheduled_health_reading_job, trigger='interval', minutes=5, id='health_readings_job')
+        scheduler.add_job(func=renew_scheduler_lease, trigger='interval', seconds=Config.SCHEDULER_HEARTBEAT_SECONDS,
+                          id='scheduler_lease_heartbeat', coalesce=True)
+        # Checked every heartbeat so a new leader picks the cycle up promptly; runs
+        # immediately on start if the last cycle is older than the interval
+        scheduler.add_job(func=run_scheduled_readings, trigger='interval', seconds=Config.SCHEDULER_HEARTBEAT_SECONDS,
+                          id='health_readings_job', coalesce=True, next_run_time=datetime.now())
+        # Its own lease, so a long retention pass never delays a readings cycle
+        scheduler.add_job(func=run_scheduled_retention, trigger='interval', seconds=Config.SCHEDULER_HEARTBEAT_SECONDS,
+                          id='reading_retention_job', coalesce=True)
         scheduler.start()
-        print(f"[{datetime.now()}] Background scheduler started - readings every 5 minutes")
+        print(f"[{datetime.now()}] Background scheduler started - readings every "
+              f"{Config.SCHEDULER_INTERVAL_MINUTES} minutes on the lease holder")
         
-        # Shut down the scheduler when exiting the app
-        atexit.register(lambda: scheduler.shutdown())
+        # Shut down the scheduler and hand the lease over when exiting the app
+        atexit.register(stop_scheduler)
+
+def stop_scheduler():
+    """Stop this process's scheduler and release the lease so another worker takes over"""
+    global scheduler
+    if scheduler is not None:
+        scheduler.shutdown(wait=False)
+        scheduler = None
+        scheduler_lease.release()
+        retention_lease.release()
 
 def get_last_scheduled_reading_time():
     """Get the last time a scheduled reading was taken"""
     try:
-        if os.path.exists('last_reading_time.txt'):
-            with open('last_reading_time.txt', 'r') as f:
+        if os.path.exists(LAST_READING_TIME_FILE):
+            with open(LAST_READING_TIME_FILE, 'r') as f:
                 return f.read().strip()
     except:
         pass
@@ -169,241 +351,6 @@ def get_next_scheduled_reading_time():
             pass
     return None
 
-def init_db():
-    # Initialize users.db
-    schema_path = os.path.join(os.path.dirname(__file__), 'schema.sql')
-    if not os.path.exists(DB_PATH):
-        conn1 = sqlite3.connect(DB_PATH)
-        if os.path.exists(schema_path):
-            with open(schema_path) as f:
-                conn1.executescript(f.read())
-        conn1.commit()
-        conn1.close()
-    else:
-        # Add missing columns/tables if they don't exist
-        conn1 = sqlite3.connect(DB_PATH)
-        cursor1 = conn1.cursor()
-        try:
-            cursor1.execute("ALTER TABLE users ADD COLUMN age INTEGER")
-            conn1.commit()
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-        try:
-            cursor1.execute("ALTER TABLE users ADD COLUMN gender TEXT")
-            conn1.commit()
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-        
-        # Add is_active column to animals table if it doesn't exist
-        try:
-            cursor1.execute("ALTER TABLE animals ADD COLUMN is_active INTEGER DEFAULT 1")
-            conn1.commit()
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-        
-        # Create animals table if it doesn't exist
-        cursor1.execute('''
-            CREATE TABLE IF NOT EXISTS animals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tag TEXT NOT NULL UNIQUE,
-                name TEXT NOT NULL,
-                species TEXT NOT NULL,
-                weight REAL,
-                age INTEGER,
-                gender TEXT,
-                user_email TEXT NOT NULL,
-                date_added TEXT DEFAULT CURRENT_TIMESTAMP,
-                is_active INTEGER DEFAULT 1,
-                FOREIGN KEY (user_email) REFERENCES users(email)
-            )
-        ''')
-        
-        # Create health_readings table if it doesn't exist
-        cursor1.execute('''
-            CREATE TABLE IF NOT EXISTS health_readings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                animal_tag TEXT NOT NULL,
-                heart_rate REAL NOT NULL,
-                body_temp REAL NOT NULL,
-                blood_pressure INTEGER NOT NULL,
-                movement TEXT NOT NULL,
-                health_index REAL NOT NULL,
-                status TEXT NOT NULL,
-                timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (animal_tag) REFERENCES animals(tag)
-            )
-        ''')
-        
-        # Create removed_animals_history table if it doesn't exist
-        cursor1.execute('''
-            CREATE TABLE IF NOT EXISTS removed_animals_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                animal_tag TEXT NOT NULL,
-                animal_name TEXT NOT NULL,
-                species TEXT NOT NULL,
-                user_email TEXT NOT NULL,
-                removed_date TEXT DEFAULT CURRENT_TIMESTAMP,
-                last_temp REAL,
-                last_heart_rate REAL,
-                last_health_status TEXT,
-                last_health_index REAL
-            )
-        ''')
-        
-        # Create admin table if it doesn't exist
-        cursor1.execute('''
-            CREATE TABLE IF NOT EXISTS admin (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT NOT NULL UNIQUE,
-                password TEXT NOT NULL,
-                full_name TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Insert admin account if it doesn't exist
-        cursor1.execute("INSERT OR IGNORE INTO admin (username, password, full_name) VALUES (?, ?, ?)",
-                       ('Nikhil_jaroli', '8288', 'Admin'))
-        
-        # Create notifications table if it doesn't exist
-        cursor1.execute('''
-            CREATE TABLE IF NOT EXISTS notifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_email TEXT NOT NULL,
-                animal_tag TEXT,
-                title TEXT NOT NULL,
-                message TEXT NOT NULL,
-                notification_type TEXT DEFAULT 'info',
-                is_read INTEGER DEFAULT 0,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_email) REFERENCES users(email)
-            )
-        ''')
-        
-        # Create appointment queue table if it doesn't exist
-        cursor1.execute('''
-            CREATE TABLE IF NOT EXISTS appointment_queue (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                animal_tag TEXT NOT NULL,
-                user_email TEXT NOT NULL,
-                owner_name TEXT,
-                owner_mobile TEXT,
-                health_status TEXT NOT NULL,
-                health_index REAL,
-                appointment_time TEXT DEFAULT CURRENT_TIMESTAMP,
-                priority INTEGER DEFAULT 0,
-                status TEXT DEFAULT 'pending',
-                notes TEXT,
-                FOREIGN KEY (animal_tag) REFERENCES animals(tag),
-                FOREIGN KEY (user_email) REFERENCES users(email)
-            )
-        ''')
-        cursor1.execute('''
-            CREATE UNIQUE INDEX IF NOT EXISTS idx_appointment_pending_unique
-            ON appointment_queue(animal_tag, user_email, status)
-            WHERE status = 'pending'
-        ''')
-        conn1.commit()
-        conn1.close()
-    
-    # Always ensure appointment_queue and vet_notifications tables exist (for existing databases)
-    conn1 = sqlite3.connect(DB_PATH)
-    cursor1 = conn1.cursor()
-    cursor1.execute('''
-        CREATE TABLE IF NOT EXISTS appointment_queue (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            animal_tag TEXT NOT NULL,
-            user_email TEXT NOT NULL,
-            owner_name TEXT,
-            owner_mobile TEXT,
-            health_status TEXT NOT NULL,
-            health_index REAL,
-            appointment_time TEXT DEFAULT CURRENT_TIMESTAMP,
-            priority INTEGER DEFAULT 0,
-            status TEXT DEFAULT 'pending',
-            notes TEXT
-        )
-    ''')
-    # Prevent duplicate pending appointments per animal/user
-    cursor1.execute('''
-        CREATE UNIQUE INDEX IF NOT EXISTS idx_appointment_pending_unique
-        ON appointment_queue(animal_tag, user_email, status)
-        WHERE status = 'pending'
-    ''')
-    
-    # Add mobile column to vets table if it doesn't exist
-    try:
-        cursor1.execute("ALTER TABLE vets ADD COLUMN mobile TEXT")
-        conn1.commit()
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    cursor1.execute('''
-        CREATE TABLE IF NOT EXISTS vet_notifications (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            animal_tag TEXT,
-            owner_name TEXT,
-            owner_mobile TEXT,
-            title TEXT NOT NULL,
-            message TEXT NOT NULL,
-            notification_type TEXT DEFAULT 'info',
-            is_read INTEGER DEFAULT 0,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create treatment_history table for storing vet treatments
-    cursor1.execute('''
-        CREATE TABLE IF NOT EXISTS treatment_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            animal_tag TEXT NOT NULL,
-            animal_name TEXT,
-            species TEXT,
-            user_email TEXT NOT NULL,
-            owner_name TEXT,
-            owner_mobile TEXT,
-            health_status TEXT,
-            health_index REAL,
-            treatment TEXT NOT NULL,
-            notes TEXT,
-            treated_date TEXT DEFAULT CURRENT_TIMESTAMP,
-            vet_email TEXT,
-            FOREIGN KEY (animal_tag) REFERENCES animals(tag),
-            FOREIGN KEY (user_email) REFERENCES users(email)
-        )
-    ''')
-    
-    # Create confirmed_appointments table for animals confirmed to visit vet
-    cursor1.execute('''
-        CREATE TABLE IF NOT EXISTS confirmed_appointments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            animal_tag TEXT NOT NULL,
-            animal_name TEXT,
-            species TEXT,
-            user_email TEXT NOT NULL,
-            owner_name TEXT,
-            owner_mobile TEXT,
-            health_status TEXT,
-            health_index REAL,
-            confirmed_date TEXT DEFAULT CURRENT_TIMESTAMP,
-            appointment_id INTEGER,
-            notes TEXT,
-            vet_email TEXT,
-            FOREIGN KEY (animal_tag) REFERENCES animals(tag),
-            FOREIGN KEY (user_email) REFERENCES users(email)
-        )
-    ''')
-    conn1.commit()
-    conn1.close()
-
-    # Initialize vets.db
-    if not os.path.exists('vets.db'):
-        conn2 = sqlite3.connect('vets.db')
-        with open(schema_path) as f:
-            conn2.executescript(f.read())
-        conn2.commit()
-        conn2.close()
-
 @app.route('/')
 def home():
     return redirect(url_for('login'))
@@ -442,7 +389,7 @@ def signup():
         mobile = request.form.get('mobile')
         password = generate_password_hash(request.form.get('password'))
 
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         try:
             cursor.execute("INSERT INTO users (full_name, email, mobile, password) VALUES (?, ?, ?, ?)",
@@ -459,9 +406,8 @@ def signup():
                 'redirect': url_for('dashboard')
             })
         except sqlite3.IntegrityError:
+            conn.rollback()
             return jsonify({'status': 'error', 'message': 'Email already exists'})
-        finally:
-            conn.close()
     return render_template('signup.html')
 
 @app.route('/vetlogin', methods=['GET', 'POST'])
@@ -529,13 +475,12 @@ def admin_user():
     # Get total animals treated from treatment_history
     total_animals_treated = 0
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('SELECT COUNT(*) FROM treatment_history')
         result = cursor.fetchone()
         if result is not None:
             total_animals_treated = result[0]
-        conn.close()
         print(f"[ADMIN USER] Total animals treated: {total_animals_treated}")
     except Exception as e:
         print(f"Error fetching total animals treated: {e}")
@@ -556,7 +501,7 @@ def admin_vet():
     # Get statistics for each vet
     total_animals_treated = 0
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         
         vet_stats = {}
@@ -591,7 +536,6 @@ def admin_vet():
             total_animals_treated = result[0]
         print(f"[ADMIN VET] Total animals treated: {total_animals_treated}")
         
-        conn.close()
     except Exception as e:
         print(f"Error fetching vet statistics: {e}")
         import traceback
@@ -661,7 +605,7 @@ def add_vet():
         if not all([full_name, email, password, mobile, region]):
             return jsonify({'status': 'error', 'message': 'All fields are required'}), 400
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         
         # Check if mobile column exists and add it if it doesn't
@@ -682,7 +626,6 @@ def add_vet():
             VALUES (?, ?, ?, ?, ?, ?)
         """, (full_name, email, password, license_id, region, mobile))
         conn.commit()
-        conn.close()
         return jsonify({'status': 'success', 'message': 'Veterinarian added successfully', 'license_id': license_id})
     except sqlite3.IntegrityError as e:
         error_msg = str(e).lower()
@@ -740,7 +683,7 @@ def update_userinfo():
         age = data.get('age')
         gender = data.get('gender')
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -750,7 +693,6 @@ def update_userinfo():
         """, (full_name, mobile, age, gender, email))
         
         conn.commit()
-        conn.close()
         
         # Update session with new name
         session['user'] = full_name
@@ -768,8 +710,7 @@ def history():
     
     # Get removed animals history from database
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         # Get all removed animals from the history table
@@ -780,7 +721,6 @@ def history():
         ''', (user_email,))
         
         rows = cursor.fetchall()
-        conn.close()
         
         removed_history = []
         for row in rows:
@@ -822,68 +762,156 @@ def image_predict():
 
 @app.route('/predict-image', methods=['POST'])
 def predict_image():
-    """POST route that accepts an uploaded image and returns prediction"""
-    global keras_model, keras_labels
+    """POST route that accepts one or more uploaded images and returns predictions"""
+    # Loads the model on first use; requests arriving meanwhile wait for it
+    if not model_loader.load():
+        return jsonify({'error': f'Image model is unavailable: {model_loader.error}'}), 503
     
-    # Check if model is still loading in background
-    if keras_model is None:
-        return jsonify({'error': 'Model is still loading. Please wait a few seconds and try again.'}), 503
+    # Refuse oversized bodies before the upload is parsed
+    if (request.content_length or 0) > Config.MAX_IMAGE_UPLOAD_BYTES * Config.MAX_IMAGES_PER_UPLOAD:
+        return jsonify({'error': 'Upload is too large'}), 413
     
     if 'image' not in request.files:
         return jsonify({'error': 'No image file provided'}), 400
     
-    file = request.files['image']
-    if file.filename == '':
+    files = [file for file in request.files.getlist('image') if file.filename != '']
+    if not files:
         return jsonify({'error': 'No image selected'}), 400
+    if len(files) > Config.MAX_IMAGES_PER_UPLOAD:
+        return jsonify({'error': f'At most {Config.MAX_IMAGES_PER_UPLOAD} images per upload'}), 400
+    
+    batch, rows = preprocess_uploads(files)
+    results = []
+    for result in predict_uploads(batch, rows):
+        if 'error' in result:
+            results.append(result)
+        else:
+            results.append({**format_prediction(result['scores']), 'cached': result['cached']})
+    
+    if len(files) == 1:
+        if 'error' in results[0]:
+            return jsonify({'error': results[0]['error']}), results[0]['status']
+        return prediction_response(results[0])
+    return jsonify({'success': True, 'results': results})
+
+@app.route('/api/predict/batch', methods=['POST'])
+def api_predict_batch():
+    """Diagnose several images in one request (e.g. a herd walk-through).
+    Form fields: 'images' (repeated), 'top_k' (default PREDICT_TOP_K) and
+    'tta' ('true' averages a mirrored and a centre-cropped view with each image).
+    All images and views run through the model together."""
+    if 'user' not in session and 'vet' not in session:
+        return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
+    
+    if not model_loader.load():
+        return jsonify({'status': 'error', 'message': f'Image model is unavailable: {model_loader.error}'}), 503
+    
+    if (request.content_length or 0) > Config.MAX_IMAGE_UPLOAD_BYTES * Config.MAX_IMAGES_PER_BATCH:
+        return jsonify({'status': 'error', 'message': 'Upload is too large'}), 413
+    
+    files = [file for file in request.files.getlist('images') if file.filename != '']
+    if not files:
+        return jsonify({'status': 'error', 'message': 'No images provided'}), 400
+    if len(files) > Config.MAX_IMAGES_PER_BATCH:
+        return jsonify({'status': 'error', 'message': f'At most {Config.MAX_IMAGES_PER_BATCH} images per request'}), 400
     
     try:
-        # Read and process the image using PIL (fast)
-        img = Image.open(file.stream).convert('RGB')
-        
-        # Resize to 224x224 using BILINEAR for speed (LANCZOS is slower)
-        img = img.resize((224, 224), Image.BILINEAR)
-        
-        # Convert to numpy array and normalize to [0, 1]
-        img_array = np.array(img, dtype=np.float32) / 255.0
-        
-        # Add batch dimension
-        img_array = np.expand_dims(img_array, axis=0)
-        
-        # Run prediction
-        predictions = keras_model.predict(img_array, verbose=0)
-        
-        # Add delay for better UX (simulates processing time)
-        time.sleep(4)
-        
-        # Get the predicted class index and confidence
-        predicted_index = np.argmax(predictions[0])
-        confidence = float(predictions[0][predicted_index])
-        
-        # Get class name
-        class_name = keras_labels[predicted_index] if predicted_index < len(keras_labels) else f"Class {predicted_index}"
-        
-        # Parse species and disease from class name (format: "Species - Disease")
-        parts = class_name.split(' - ', 1)
-        species = parts[0] if len(parts) > 0 else "Unknown"
-        disease = parts[1] if len(parts) > 1 else class_name
-        
-        # Return only top prediction with species and disease separated
-        return jsonify({
-            'success': True,
-            'className': class_name,
-            'species': species,
-            'disease': disease,
-            'confidence': confidence,
-            'predictions': [{
-                'className': class_name,
-                'species': species,
-                'disease': disease,
-                'probability': confidence
-            }]  
-        })
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        top_k = int(request.form.get('top_k', Config.PREDICT_TOP_K))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'top_k must be a number'}), 400
+    top_k = max(1, min(top_k, len(model_loader.labels) or 1))
+    tta = request.form.get('tta', 'false').lower() in ('1', 'true', 'yes')
+    
+    start = time.perf_counter()
+    batch, rows = preprocess_uploads(files, tta=tta)
+    results = []
+    for file, result in zip(files, predict_uploads(batch, rows, views=TTA_VIEWS if tta else 1)):
+        if 'error' in result:
+            results.append({'filename': file.filename, **result})
+        else:
+            results.append({'filename': file.filename, 'cached': result['cached'],
+                            'predictions': top_k_predictions(result['scores'], top_k)})
+    
+    return jsonify({
+        'status': 'success',
+        'count': len(results),
+        'top_k': top_k,
+        'tta': tta,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 1),
+        'results': results
+    })
+
+def predict_uploads(batch, rows, views=1):
+    """Score each decoded upload, from the cache where possible.
+    rows[i] is the first of upload i's `views` rows in batch, or an (http_status,
+    message) rejection. With several views (test-time augmentation) their scores
+    are averaged. Returns {'scores', 'cached'} or {'error', 'status'} per upload."""
+    results = [None] * len(rows)
+    misses = []
+    for i, row in enumerate(rows):
+        if isinstance(row, tuple):
+            results[i] = {'error': row[1], 'status': row[0]}
+            continue
+        
+        # The same photo uploaded again is answered from the cache
+        image_hash = cache_key(batch[row])
+        if views > 1:
+            image_hash = b'tta:' + image_hash
+        scores = prediction_cache.get(image_hash)
+        if scores is not None:
+            results[i] = {'scores': scores, 'cached': True}
+        else:
+            misses.append((i, row, image_hash))
+    if not misses:
+        return results
+    
+    try:
+        # All views of all images go in together, batched with other concurrent uploads
+        futures = inference_batcher.submit_many([batch[row + view] for _, row, _ in misses for view in range(views)])
+    except queue.Full:
+        for i, _, _ in misses:
+            results[i] = {'error': 'Too many images are being analyzed. Please try again shortly.', 'status': 503}
+        return results
+    
+    for n, (i, _, image_hash) in enumerate(misses):
+        image_futures = futures[n * views:(n + 1) * views]
+        try:
+            scores = np.mean([future.result(timeout=Config.INFERENCE_TIMEOUT_SECONDS) for future in image_futures], axis=0)
+        except Exception as e:
+            for future in image_futures:
+                future.cancel()
+            results[i] = {'error': str(e) or type(e).__name__, 'status': 500}
+            continue
+        prediction_cache.put(image_hash, scores)
+        results[i] = {'scores': scores, 'cached': False}
+    return results
+
+def prediction_response(result):
+    """Return only top prediction with species and disease separated"""
+    return jsonify({
+        'success': True,
+        **result,
+        'predictions': [{
+            'className': result['className'],
+            'species': result['species'],
+            'disease': result['disease'],
+            'probability': result['confidence']
+        }]  
+    })
+
+@app.route('/api/admin/predict-cache', methods=['GET'])
+def api_predict_cache_stats():
+    """Prediction cache counters for this worker process"""
+    if 'admin' not in session:
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    return jsonify({'status': 'success', 'pid': os.getpid(), 'cache': prediction_cache.stats()})
+
+@app.route('/api/admin/response-cache', methods=['GET'])
+def api_response_cache_stats():
+    """API response cache counters for this worker process"""
+    if 'admin' not in session:
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    return jsonify({'status': 'success', 'pid': os.getpid(), 'cache': response_cache.stats()})
 
 @app.route('/Static/Model/<path:filename>')
 def serve_model(filename):
@@ -924,49 +952,24 @@ def api_export_pdf():
         if not animal_tag or not date_from or not date_to:
             return jsonify({'status': 'error', 'message': 'Missing required parameters'}), 400
         
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # Get animal(s) and their health readings
-        if animal_tag == 'all':
-            # Get all user's animals
-            cursor.execute('SELECT * FROM animals WHERE user_email = ? AND (is_active = 1 OR is_active IS NULL)', (user_email,))
-            animals = cursor.fetchall()
-            animal_tags = [a['tag'] for a in animals]
-        else:
-            # Get specific animal
-            cursor.execute('SELECT * FROM animals WHERE tag = ? AND user_email = ?', (animal_tag, user_email))
-            animal = cursor.fetchone()
-            if not animal:
-                conn.close()
-                return jsonify({'status': 'error', 'message': 'Animal not found'}), 404
-            animals = [animal]
-            animal_tags = [animal_tag]
-        
-        # Get health readings for the date range
-        all_readings = []
-        for tag in animal_tags:
-            cursor.execute('''
-                SELECT * FROM health_readings 
-                WHERE animal_tag = ? 
-                AND date(timestamp) >= date(?) 
-                AND date(timestamp) <= date(?)
-                ORDER BY timestamp DESC
-            ''', (tag, date_from, date_to))
-            readings = cursor.fetchall()
-            all_readings.extend(readings)
-        
-        conn.close()
+        # Aggregates and the listed readings only (see health_report.py)
+        try:
+            report = fetch_report_data(get_db().cursor(), user_email, animal_tag, date_from, date_to)
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Dates must be YYYY-MM-DD'}), 400
+        if report is None:
+            return jsonify({'status': 'error', 'message': 'Animal not found'}), 404
         
-        # Generate PDF content
-        pdf_content = generate_pdf_report(animals, all_readings, date_from, date_to, user_email)
+        # Generate PDF content into a spooled temp file and stream it back
+        pdf_file, pdf_size = render_report(*report, date_from, date_to, user_email)
         
         return Response(
-            pdf_content,
+            FileWrapper(pdf_file, Config.REPORT_STREAM_CHUNK_BYTES),
             mimetype='application/pdf',
+            direct_passthrough=True,
             headers={
                 'Content-Disposition': f'attachment; filename=Health_Report_{animal_tag}_{date_from}_to_{date_to}.pdf',
+                'Content-Length': str(pdf_size),
                 'Content-Transfer-Encoding': 'binary',
                 'Accept-Ranges': 'none',
                 'Cache-Control': 'no-cache, no-store, must-revalidate',
@@ -980,193 +983,6 @@ def api_export_pdf():
         print(f"Error generating PDF: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-def generate_pdf_report(animals, readings, date_from, date_to, user_email):
-    """Generate a simple PDF report using basic text formatting"""
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import letter, A4
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
-    story = []
-    styles = getSampleStyleSheet()
-    
-    # Title style
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        textColor=colors.HexColor('#13ec5b')
-    )
-    
-    # Header style
-    header_style = ParagraphStyle(
-        'CustomHeader',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=12,
-        spaceBefore=20,
-        textColor=colors.HexColor('#111813')
-    )
-    
-    # Normal text style
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontSize=10,
-        spaceAfter=6
-    )
-    
-    # Title
-    story.append(Paragraph("🐄 Ani-Health - Livestock Health Report", title_style))
-    story.append(Spacer(1, 12))
-    
-    # Report info
-    story.append(Paragraph(f"<b>Report Period:</b> {date_from} to {date_to}", normal_style))
-    story.append(Paragraph(f"<b>Generated:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", normal_style))
-    story.append(Paragraph(f"<b>User:</b> {user_email}", normal_style))
-    story.append(Spacer(1, 20))
-    
-    # Animal Summary
-    story.append(Paragraph("📋 Animal Summary", header_style))
-    
-    animal_data = [['Tag', 'Name', 'Species', 'Weight (kg)', 'Age (years)', 'Gender']]
-    for animal in animals:
-        animal_data.append([
-            animal['tag'],
-            animal['name'],
-            animal['species'],
-            str(animal['weight'] or 'N/A'),
-            str(animal['age'] or 'N/A'),
-            animal['gender'] or 'N/A'
-        ])
-    
-    animal_table = Table(animal_data, colWidths=[60, 80, 70, 70, 70, 60])
-    animal_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#13ec5b')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f6f8f6')),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#111813')),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e0e0e0')),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 1), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-    ]))
-    story.append(animal_table)
-    story.append(Spacer(1, 20))
-    
-    # Health Readings
-    story.append(Paragraph("📊 Health Readings", header_style))
-    
-    if readings:
-        # Calculate statistics per animal
-        stats_by_animal = {}
-        for reading in readings:
-            tag = reading['animal_tag']
-            if tag not in stats_by_animal:
-                stats_by_animal[tag] = {
-                    'temps': [],
-                    'hrs': [],
-                    'indexes': [],
-                    'statuses': []
-                }
-            stats_by_animal[tag]['temps'].append(reading['body_temp'])
-            stats_by_animal[tag]['hrs'].append(reading['heart_rate'])
-            stats_by_animal[tag]['indexes'].append(reading['health_index'])
-            stats_by_animal[tag]['statuses'].append(reading['status'])
-        
-        # Statistics summary
-        stats_data = [['Animal Tag', 'Avg Temp (°C)', 'Avg HR (bpm)', 'Avg Health Index', 'Most Common Status', 'Readings']]
-        for tag, stats in stats_by_animal.items():
-            avg_temp = round(sum(stats['temps']) / len(stats['temps']), 1) if stats['temps'] else 'N/A'
-            avg_hr = round(sum(stats['hrs']) / len(stats['hrs']), 1) if stats['hrs'] else 'N/A'
-            avg_index = round(sum(stats['indexes']) / len(stats['indexes']), 1) if stats['indexes'] else 'N/A'
-            most_common_status = max(set(stats['statuses']), key=stats['statuses'].count) if stats['statuses'] else 'N/A'
-            stats_data.append([tag, str(avg_temp), str(avg_hr), str(avg_index), most_common_status, str(len(stats['temps']))])
-        
-        stats_table = Table(stats_data, colWidths=[70, 70, 70, 90, 90, 60])
-        stats_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4CAF50')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#111813')),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e0e0e0')),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('TOPPADDING', (0, 1), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-        ]))
-        story.append(stats_table)
-        story.append(Spacer(1, 20))
-        
-        # Detailed readings table (last 20)
-        story.append(Paragraph("📝 Recent Readings (Last 20)", header_style))
-        
-        readings_data = [['Timestamp', 'Tag', 'Temp', 'HR', 'BP', 'Movement', 'Index', 'Status']]
-        for reading in readings[:20]:
-            readings_data.append([
-                reading['timestamp'][:16] if reading['timestamp'] else 'N/A',
-                reading['animal_tag'],
-                f"{reading['body_temp']}°C",
-                f"{reading['heart_rate']} bpm",
-                reading['blood_pressure'] or 'N/A',
-                reading['movement'] or 'N/A',
-                f"{reading['health_index']}%",
-                reading['status']
-            ])
-        
-        readings_table = Table(readings_data, colWidths=[85, 50, 50, 55, 55, 55, 45, 55])
-        readings_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2196F3')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#111813')),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e0e0e0')),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('TOPPADDING', (0, 1), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-        ]))
-        story.append(readings_table)
-    else:
-        story.append(Paragraph("No health readings found for the selected period.", normal_style))
-    
-    story.append(Spacer(1, 30))
-    
-    # Footer
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.gray
-    )
-    story.append(Paragraph("---", footer_style))
-    story.append(Paragraph("This report was automatically generated by Ani-Health Livestock Monitoring System.", footer_style))
-    story.append(Paragraph("For any concerns about animal health, please consult with a veterinarian.", footer_style))
-    
-    doc.build(story)
-    buffer.seek(0)
-    return buffer.getvalue()
-
 @app.route('/notifications')
 def notifications():
     if 'user' not in session:
@@ -1174,8 +990,7 @@ def notifications():
     
     # Fetch notifications from database
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -1186,7 +1001,6 @@ def notifications():
         ''', (session.get('user_email'),))
         
         rows = cursor.fetchall()
-        conn.close()
         
         notification_list = []
         for row in rows:
@@ -1217,11 +1031,10 @@ def settings():
     if not user_email:
         user_name = session.get('user')
         if user_name:
-            conn = sqlite3.connect(DB_PATH)
+            conn = get_db()
             cursor = conn.cursor()
             cursor.execute("SELECT email FROM users WHERE full_name = ?", (user_name,))
             result = cursor.fetchone()
-            conn.close()
             if result:
                 user_email = result[0]
                 session['user_email'] = user_email  # Store for future use
@@ -1240,7 +1053,7 @@ def vetdashboard():
     vet_data = get_vet_by_email(session.get('vet_email'))
     
     # Get dashboard stats
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     
     # Critical alerts (Ill/Critical status animals with pending appointments)
@@ -1261,7 +1074,6 @@ def vetdashboard():
     cursor.execute('''SELECT COUNT(*) as count FROM appointment_queue WHERE status = 'treated' ''')
     total_treated = cursor.fetchone()['count']
     
-    conn.close()
     
     stats = {
         'critical_alerts': critical_alerts,
@@ -1296,6 +1108,7 @@ def vet_settings():
 
 # Animal API Routes
 @app.route('/api/animals', methods=['GET'])
+@response_cache.cached('animals:{user}')
 def api_get_animals():
     if 'user' not in session:
         return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
@@ -1339,121 +1152,21 @@ def api_bulk_upload_animals():
     
     file = request.files['file']
     user_email = session.get('user_email')
-    success_count = 0
-    errors = []
     
     try:
-        # Check file type and read accordingly
-        if file.filename.endswith('.csv'):
-            # Handle CSV
-            stream = io.StringIO(file.stream.read().decode('utf-8'), newline=None)
-            csv_reader = csv.DictReader(stream)
-            rows = list(csv_reader)
+        # Rows are streamed from the upload and inserted in chunks (see animal_import.py)
+        if file.filename.lower().endswith('.csv'):
+            rows = iter_csv_rows(file.stream)
         else:
-            # Handle Excel (.xlsx, .xls)
-            wb = openpyxl.load_workbook(file.stream)
-            ws = wb.active
-            rows = []
-            headers = []
-            
-            for i, row in enumerate(ws.iter_rows(values_only=True)):
-                if i == 0:
-                    headers = [str(cell).lower().strip() for cell in row if cell]
-                else:
-                    if any(cell is not None for cell in row):
-                        row_dict = {}
-                        for j, header in enumerate(headers):
-                            if j < len(row):
-                                row_dict[header] = row[j]
-                        rows.append(row_dict)
-        
-        # Process each row
-        for row_num, row_data in enumerate(rows, start=2):  # Start at 2 because row 1 is headers
-            try:
-                # Get values from row - handle different column name variations
-                name = None
-                species = None
-                weight = None
-                age = None
-                gender = None
-                
-                for key, value in row_data.items():
-                    key_lower = str(key).lower().strip()
-                    if 'name' in key_lower:
-                        name = value
-                    elif 'species' in key_lower:
-                        species = value
-                    elif 'weight' in key_lower:
-                        weight = value
-                    elif 'age' in key_lower:
-                        age = value
-                    elif 'gender' in key_lower:
-                        gender = value
-                
-                # Validate required fields
-                if not name or not name or len(str(name).strip()) == 0:
-                    errors.append({'row': row_num, 'message': 'Name is required'})
-                    continue
-                
-                if not species or len(str(species).strip()) == 0:
-                    errors.append({'row': row_num, 'message': 'Species is required'})
-                    continue
-                
-                name = str(name).strip()
-                species = str(species).strip()
-                
-                # Validate species
-                valid_species = ['Cow', 'Buffalo', 'Sheep', 'Goat', 'Horse', 'Pig']
-                species_match = None
-                for valid_sp in valid_species:
-                    if species.lower() == valid_sp.lower():
-                        species_match = valid_sp
-                        break
-                
-                if not species_match:
-                    errors.append({'row': row_num, 'message': f'Invalid species: {species}. Valid options: {", ".join(valid_species)}'})
-                    continue
-                
-                # Convert weight and age to appropriate types
-                try:
-                    weight = float(weight) if weight else None
-                except (ValueError, TypeError):
-                    weight = None
-                
-                try:
-                    age = int(age) if age else None
-                except (ValueError, TypeError):
-                    age = None
-                
-                # Normalize gender
-                if gender:
-                    gender = str(gender).strip().lower()
-                    if gender not in ['male', 'female', 'm', 'f']:
-                        gender = None
-                    elif gender == 'm':
-                        gender = 'Male'
-                    elif gender == 'f':
-                        gender = 'Female'
-                    else:
-                        gender = gender.capitalize()
-                else:
-                    gender = 'Female'  # Default
-                
-                # Add the animal
-                animal = add_animal(name, species_match, weight, age, gender, user_email)
-                
-                if animal:
-                    success_count += 1
-                else:
-                    errors.append({'row': row_num, 'message': 'Failed to add animal to database'})
-            
-            except Exception as row_error:
-                errors.append({'row': row_num, 'message': str(row_error)})
+            # Handle Excel (.xlsx)
+            rows = iter_xlsx_rows(file.stream)
+        success_count, errors, error_count = import_animals(rows, user_email)
         
         return jsonify({
             'status': 'success' if success_count > 0 else 'error',
             'success_count': success_count,
             'errors': errors,
+            'error_count': error_count,
             'message': f'{success_count} animals added successfully'
         })
     
@@ -1461,6 +1174,7 @@ def api_bulk_upload_animals():
         return jsonify({'status': 'error', 'message': f'Error processing file: {str(e)}'}), 500
 
 @app.route('/api/animals/status', methods=['GET'])
+@response_cache.cached('animals:{user}', 'readings')
 def api_get_animals_status():
     """Get all animals with their ACTUAL stored health status from database"""
     if 'user' not in session:
@@ -1468,8 +1182,7 @@ def api_get_animals_status():
     
     try:
         user_email = session.get('user_email')
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         # Get all active animals for the user with their LATEST stored health reading
@@ -1478,21 +1191,12 @@ def api_get_animals_status():
                 a.tag, a.name, a.species, a.weight, a.age, a.gender, a.date_added,
                 h.health_index, h.status as health_status, h.timestamp as last_reading_time
             FROM animals a
-            LEFT JOIN (
-                SELECT animal_tag, health_index, status, timestamp
-                FROM health_readings h1
-                WHERE timestamp = (
-                    SELECT MAX(timestamp) 
-                    FROM health_readings h2 
-                    WHERE h2.animal_tag = h1.animal_tag
-                )
-            ) h ON a.tag = h.animal_tag
+            LEFT JOIN latest_health_reading h ON a.tag = h.animal_tag
             WHERE a.user_email = ? AND (a.is_active = 1 OR a.is_active IS NULL)
             ORDER BY a.date_added DESC
         ''', (user_email,))
         
         rows = cursor.fetchall()
-        conn.close()
         
         animals = {}
         for row in rows:
@@ -1569,18 +1273,10 @@ def api_remove_animal(tag):
     
     try:
         # Get the last health reading for this animal
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT body_temp, heart_rate, status, health_index 
-            FROM health_readings 
-            WHERE animal_tag = ? 
-            ORDER BY timestamp DESC 
-            LIMIT 1
-        ''', (tag,))
-        last_reading = cursor.fetchone()
+        last_reading = get_latest_reading(cursor, tag)
         
         # Save to removed_animals_history
         cursor.execute('''
@@ -1598,7 +1294,6 @@ def api_remove_animal(tag):
             last_reading['health_index'] if last_reading else None
         ))
         conn.commit()
-        conn.close()
         
         # Deactivate the animal
         success = deactivate_animal(tag)
@@ -1617,8 +1312,7 @@ def api_reactivate_animal(tag):
         return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         # Check if animal exists and belongs to this user
@@ -1627,11 +1321,9 @@ def api_reactivate_animal(tag):
         animal = cursor.fetchone()
         
         if not animal:
-            conn.close()
             return jsonify({'status': 'error', 'message': 'Animal not found or access denied'}), 404
         
         if animal['is_active'] == 1:
-            conn.close()
             return jsonify({'status': 'error', 'message': 'Animal is already active'}), 400
         
         # Reactivate the animal
@@ -1642,7 +1334,6 @@ def api_reactivate_animal(tag):
                       (tag, session.get('user_email')))
         
         conn.commit()
-        conn.close()
         
         return jsonify({
             'status': 'success', 
@@ -1714,14 +1405,11 @@ def api_save_health_reading(tag):
     try:
         data = request.get_json()
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            INSERT INTO health_readings 
-            (animal_tag, heart_rate, body_temp, blood_pressure, movement, health_index, status, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        reading_id = save_health_reading(
+            cursor,
             tag,
             data['heart_rate'],
             data['body_temp'],
@@ -1730,11 +1418,9 @@ def api_save_health_reading(tag):
             data['health_index'],
             data['status'],
             data['timestamp']
-        ))
+        )
         
         conn.commit()
-        reading_id = cursor.lastrowid
-        conn.close()
         
         return jsonify({'status': 'success', 'message': 'Reading saved', 'id': reading_id})
     except Exception as e:
@@ -1757,19 +1443,17 @@ def api_get_health_readings(tag):
     try:
         limit = request.args.get('limit', 10, type=int)
         
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('''
             SELECT * FROM health_readings 
             WHERE animal_tag = ? 
-            ORDER BY timestamp DESC 
+            ORDER BY ts DESC 
             LIMIT ?
         ''', (tag, limit))
         
         rows = cursor.fetchall()
-        conn.close()
         
         readings = []
         for row in rows:
@@ -1790,41 +1474,34 @@ def api_get_health_readings(tag):
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/api/health-readings/all', methods=['GET'])
+@response_cache.cached('animals:{user}', 'readings')
 def api_get_all_health_readings():
     """Get stored health readings for all user's animals"""
     if 'user' not in session:
         return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
     
     try:
-        limit = request.args.get('limit', 10, type=int)
+        limit = min(max(request.args.get('limit', 10, type=int), 1), Config.READINGS_PER_ANIMAL_MAX)
         user_email = session.get('user_email')
         
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
-        # Get all active animal tags for the user
-        cursor.execute('SELECT tag FROM animals WHERE user_email = ? AND (is_active = 1 OR is_active IS NULL)', (user_email,))
-        animal_tags = [row['tag'] for row in cursor.fetchall()]
-        
-        if not animal_tags:
-            conn.close()
-            return jsonify({'status': 'success', 'readings': {}, 'count': 0})
-        
-        # Get readings for all animals
-        placeholders = ','.join('?' * len(animal_tags))
-        query = f'''
-            SELECT * FROM (
-                SELECT *, ROW_NUMBER() OVER (PARTITION BY animal_tag ORDER BY timestamp DESC) as rn
-                FROM health_readings 
-                WHERE animal_tag IN ({placeholders})
-            ) WHERE rn <= ?
-            ORDER BY animal_tag, timestamp DESC
-        '''
-        
-        cursor.execute(query, animal_tags + [limit])
+        # Newest readings of each active animal in one statement: the correlated
+        # subquery is one (animal_tag, ts) index seek per animal, instead of
+        # numbering every reading the herd ever had with a window function
+        cursor.execute('''
+            SELECT h.* FROM animals a
+            JOIN health_readings h ON h.id IN (
+                SELECT id FROM health_readings
+                WHERE animal_tag = a.tag
+                ORDER BY ts DESC
+                LIMIT ?
+            )
+            WHERE a.user_email = ? AND (a.is_active = 1 OR a.is_active IS NULL)
+            ORDER BY a.tag, h.ts DESC
+        ''', (limit, user_email))
         rows = cursor.fetchall()
-        conn.close()
         
         # Group readings by animal tag
         readings_by_animal = {}
@@ -1876,15 +1553,64 @@ def api_get_next_reading_time():
         'seconds_until_next': seconds_until_next
     })
 
+@app.route('/api/stream/readings', methods=['GET'])
+def api_stream_readings():
+    """Server-Sent Events: push the user's new readings and status changes as they are committed"""
+    if 'user' not in session:
+        return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
+    
+    subscription = reading_broker.subscribe(session.get('user_email'))
+    
+    def stream():
+        try:
+            # Reconnect quickly after the stream closes itself below
+            yield 'retry: 3000\n\n'
+            deadline = time.monotonic() + Config.STREAM_MAX_SECONDS
+            while time.monotonic() < deadline:
+                try:
+                    event, data = subscription.get(timeout=Config.STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if event is None:
+                    break
+                yield format_event(event, data)
+        finally:
+            reading_broker.unsubscribe(subscription)
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/trigger-reading', methods=['POST'])
 def api_trigger_reading():
-    """Manually trigger a reading (for testing or initial setup)"""
+    """Queue a reading for the caller's animals (for initial setup or when the scheduler is off).
+    Returns the job id straight away; poll /api/jobs/<id> for progress."""
     if 'user' not in session:
         return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
     
     try:
-        scheduled_health_reading_job()
-        return jsonify({'status': 'success', 'message': 'Readings generated'})
+        job, coalesced = reading_jobs.submit(session.get('user_email'))
+        return jsonify({
+            'status': 'success',
+            'message': 'Reading already in progress' if coalesced else 'Reading queued',
+            'job_id': job['id'],
+            'job': job,
+            'coalesced': coalesced
+        }), 202
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def api_get_job(job_id):
+    """Report the status and progress of a reading job"""
+    if 'user' not in session:
+        return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
+    
+    try:
+        job = reading_jobs.get(job_id, user_email=session.get('user_email'))
+        if job is None:
+            return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+        return jsonify({'status': 'success', 'job': job})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -1892,7 +1618,9 @@ def api_trigger_reading():
 def api_get_trend_data(tag):
     """Get trend data for the health index graph
     
-    period: '1day' for hourly data (24 hours), '7days' for daily averages
+    period: '1day' for hourly data (24 hours), '7days', '30days' or '90days' for
+    daily averages, '1year' for weekly averages (see trends.py); anything else
+    falls back to '7days', as it always has
     """
     if 'user' not in session:
         return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
@@ -1905,110 +1633,18 @@ def api_get_trend_data(tag):
     if animal['user_email'] != session.get('user_email'):
         return jsonify({'status': 'error', 'message': 'Access denied'}), 403
     
+    period = request.args.get('period', '1day')
+    if period not in TREND_PERIODS:
+        period = '7days'
+    
     try:
-        period = request.args.get('period', '1day')
-        
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        now = datetime.now()
-        
-        if period == '1day':
-            # Get hourly data for the last 24 hours
-            start_time = now - timedelta(hours=24)
-            
-            cursor.execute('''
-                SELECT 
-                    strftime('%Y-%m-%d %H:00:00', timestamp) as hour,
-                    AVG(health_index) as avg_health_index,
-                    AVG(body_temp) as avg_temp,
-                    AVG(heart_rate) as avg_heart_rate,
-                    COUNT(*) as reading_count
-                FROM health_readings 
-                WHERE animal_tag = ? AND timestamp >= ?
-                GROUP BY strftime('%Y-%m-%d %H', timestamp)
-                ORDER BY hour ASC
-            ''', (tag, start_time.strftime('%Y-%m-%d %H:%M:%S')))
-            
-            rows = cursor.fetchall()
-            
-            # Create 24-hour labels
-            labels = []
-            data_points = []
-            
-            for i in range(24):
-                hour_time = now - timedelta(hours=23-i)
-                hour_str = hour_time.strftime('%H:00')
-                hour_key = hour_time.strftime('%Y-%m-%d %H:00:00')
-                labels.append(hour_str)
-                
-                # Find matching data
-                found = False
-                for row in rows:
-                    if row['hour'] == hour_key:
-                        data_points.append({
-                            'value': round(row['avg_health_index'], 1),
-                            'temp': round(row['avg_temp'], 1) if row['avg_temp'] else None,
-                            'heart_rate': round(row['avg_heart_rate'], 1) if row['avg_heart_rate'] else None,
-                            'count': row['reading_count']
-                        })
-                        found = True
-                        break
-                
-                if not found:
-                    data_points.append({'value': None, 'temp': None, 'heart_rate': None, 'count': 0})
-        
-        else:  # 7days - daily averages
-            start_time = now - timedelta(days=7)
-            
-            cursor.execute('''
-                SELECT 
-                    date(timestamp) as day,
-                    AVG(health_index) as avg_health_index,
-                    AVG(body_temp) as avg_temp,
-                    AVG(heart_rate) as avg_heart_rate,
-                    COUNT(*) as reading_count
-                FROM health_readings 
-                WHERE animal_tag = ? AND timestamp >= ?
-                GROUP BY date(timestamp)
-                ORDER BY day ASC
-            ''', (tag, start_time.strftime('%Y-%m-%d %H:%M:%S')))
-            
-            rows = cursor.fetchall()
-            
-            # Create 7-day labels
-            labels = []
-            data_points = []
-            day_names = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
-            
-            for i in range(7):
-                day_time = now - timedelta(days=6-i)
-                day_str = day_names[day_time.weekday()]
-                day_key = day_time.strftime('%Y-%m-%d')
-                labels.append(day_str)
-                
-                # Find matching data
-                found = False
-                for row in rows:
-                    if row['day'] == day_key:
-                        data_points.append({
-                            'value': round(row['avg_health_index'], 1),
-                            'temp': round(row['avg_temp'], 1) if row['avg_temp'] else None,
-                            'heart_rate': round(row['avg_heart_rate'], 1) if row['avg_heart_rate'] else None,
-                            'count': row['reading_count']
-                        })
-                        found = True
-                        break
-                
-                if not found:
-                    data_points.append({'value': None, 'temp': None, 'heart_rate': None, 'count': 0})
-        
-        conn.close()
+        # Read from the hourly/daily rollups rather than the raw readings
+        labels, data_points = get_trend_data(get_db().cursor(), tag, period, datetime.now())
         
         return jsonify({
             'status': 'success',
             'period': period,
+            'bucket': TREND_PERIODS[period][0],
             'labels': labels,
             'data': data_points,
             'animal_tag': tag
@@ -2026,8 +1662,7 @@ def api_get_notifications():
         return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -2038,7 +1673,6 @@ def api_get_notifications():
         ''', (session.get('user_email'),))
         
         rows = cursor.fetchall()
-        conn.close()
         
         notifications = []
         for row in rows:
@@ -2057,14 +1691,14 @@ def api_get_notifications():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/api/notifications/unread', methods=['GET'])
+@response_cache.cached('notifications:{user}')
 def api_get_unread_notifications():
     """Get unread notifications for current user"""
     if 'user' not in session:
         return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -2074,7 +1708,6 @@ def api_get_unread_notifications():
         ''', (session.get('user_email'),))
         
         rows = cursor.fetchall()
-        conn.close()
         
         notifications = []
         for row in rows:
@@ -2101,7 +1734,7 @@ def api_create_notification():
     try:
         data = request.get_json()
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -2118,7 +1751,6 @@ def api_create_notification():
         
         conn.commit()
         notification_id = cursor.lastrowid
-        conn.close()
         
         return jsonify({'status': 'success', 'message': 'Notification created', 'id': notification_id})
     except Exception as e:
@@ -2131,7 +1763,7 @@ def api_mark_notification_read(notification_id):
         return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -2141,7 +1773,6 @@ def api_mark_notification_read(notification_id):
         ''', (notification_id, session.get('user_email')))
         
         conn.commit()
-        conn.close()
         
         return jsonify({'status': 'success', 'message': 'Notification marked as read'})
     except Exception as e:
@@ -2154,7 +1785,7 @@ def api_mark_all_notifications_read():
         return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -2164,7 +1795,6 @@ def api_mark_all_notifications_read():
         ''', (session.get('user_email'),))
         
         conn.commit()
-        conn.close()
         
         return jsonify({'status': 'success', 'message': 'All notifications marked as read'})
     except Exception as e:
@@ -2178,8 +1808,7 @@ def api_get_vet_notifications():
         return jsonify({'status': 'error', 'message': 'Not authenticated as vet'}), 401
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -2189,7 +1818,6 @@ def api_get_vet_notifications():
         ''')
         
         rows = cursor.fetchall()
-        conn.close()
         
         notifications = []
         for row in rows:
@@ -2216,8 +1844,7 @@ def api_get_vet_unread_notifications():
         return jsonify({'status': 'error', 'message': 'Not authenticated as vet'}), 401
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -2227,7 +1854,6 @@ def api_get_vet_unread_notifications():
         ''')
         
         rows = cursor.fetchall()
-        conn.close()
         
         notifications = []
         for row in rows:
@@ -2254,7 +1880,7 @@ def api_mark_vet_notification_read(notification_id):
         return jsonify({'status': 'error', 'message': 'Not authenticated as vet'}), 401
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -2264,7 +1890,6 @@ def api_mark_vet_notification_read(notification_id):
         ''', (notification_id,))
         
         conn.commit()
-        conn.close()
         
         return jsonify({'status': 'success', 'message': 'Notification marked as read'})
     except Exception as e:
@@ -2277,13 +1902,12 @@ def api_mark_all_vet_notifications_read():
         return jsonify({'status': 'error', 'message': 'Not authenticated as vet'}), 401
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('UPDATE vet_notifications SET is_read = 1')
         
         conn.commit()
-        conn.close()
         
         return jsonify({'status': 'success', 'message': 'All notifications marked as read'})
     except Exception as e:
@@ -2313,8 +1937,7 @@ def api_book_appointment():
         print(f"Request data: animal_tag={animal_tag}, health_status={health_status}, health_index={health_index}")
         
         # Connect to database
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         # Check if appointment already exists
@@ -2326,7 +1949,6 @@ def api_book_appointment():
         existing = cursor.fetchone()
         if existing:
             print(f"ERROR: Appointment already exists with id={existing['id']}")
-            conn.close()
             return jsonify({'status': 'error', 'message': 'An appointment is already pending for this animal'}), 400
         
         # Get animal info
@@ -2335,7 +1957,6 @@ def api_book_appointment():
         
         if not animal:
             print(f"ERROR: Animal not found for tag={animal_tag}, user={user_email}")
-            conn.close()
             return jsonify({'status': 'error', 'message': 'Animal not found'}), 404
         
         print(f"Animal found: {animal['name']} ({animal['species']})")
@@ -2390,7 +2011,6 @@ def api_book_appointment():
         print("Committing transaction...")
         conn.commit()
         print("Transaction committed successfully!")
-        conn.close()
         
         print("=" * 50)
         print("BOOKING APPOINTMENT - SUCCESS")
@@ -2412,7 +2032,6 @@ def api_book_appointment():
         if conn:
             try:
                 conn.rollback()
-                conn.close()
             except:
                 pass
         
@@ -2433,8 +2052,7 @@ def api_get_appointments():
     try:
         sort_by = request.args.get('sort_by', 'priority')  # 'priority' or 'health_index'
         
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         if sort_by == 'health_index':
@@ -2457,7 +2075,6 @@ def api_get_appointments():
             ''')
         
         appointments = cursor.fetchall()
-        conn.close()
         
         appointments_list = [{
             'id': row['id'],
@@ -2483,8 +2100,7 @@ def api_check_appointment(animal_tag):
         return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -2496,7 +2112,6 @@ def api_check_appointment(animal_tag):
         ''', (animal_tag, session.get('user_email')))
         
         appointment = cursor.fetchone()
-        conn.close()
         
         if appointment:
             return jsonify({
@@ -2524,8 +2139,7 @@ def api_confirm_appointment(appointment_id):
         return jsonify({'status': 'error', 'message': 'Not authenticated as vet'}), 401
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         # Get appointment details first
@@ -2538,7 +2152,6 @@ def api_confirm_appointment(appointment_id):
         appointment = cursor.fetchone()
         
         if not appointment:
-            conn.close()
             return jsonify({'status': 'error', 'message': 'Appointment not found'}), 404
         
         # Move to confirmed_appointments table
@@ -2582,7 +2195,6 @@ def api_confirm_appointment(appointment_id):
         # Don't deactivate animal yet - just confirmed for visit
         
         conn.commit()
-        conn.close()
         
         return jsonify({'status': 'success', 'message': 'Appointment confirmed and moved to visit queue'})
     except Exception as e:
@@ -2592,14 +2204,14 @@ def api_confirm_appointment(appointment_id):
         return jsonify({'status': 'error', 'message': f'Database error: {str(e)}'}), 500
 
 @app.route('/api/vet/stats', methods=['GET'])
+@response_cache.cached('appointments', login='vet', identity='vet')
 def api_get_vet_stats():
     """Get vet dashboard stats"""
     if 'vet' not in session:
         return jsonify({'status': 'error', 'message': 'Not authenticated as vet'}), 401
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         # Critical alerts (Ill/Critical status animals with pending appointments)
@@ -2620,7 +2232,6 @@ def api_get_vet_stats():
         cursor.execute('''SELECT COUNT(*) as count FROM appointment_queue WHERE status = 'treated' ''')
         total_treated = cursor.fetchone()['count']
         
-        conn.close()
         
         return jsonify({
             'status': 'success',
@@ -2644,8 +2255,7 @@ def api_get_vet_treatment_history():
     print(f"[DEBUG] Getting treatment history for vet: {vet_email}")
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         # Get treatment history records only for the logged-in vet
@@ -2656,7 +2266,6 @@ def api_get_vet_treatment_history():
         ''', (vet_email,))
         
         rows = cursor.fetchall()
-        conn.close()
         
         history = []
         for row in rows:
@@ -2686,8 +2295,7 @@ def api_get_user_treatment_history():
         return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         # Get treatment history for this user's animals
@@ -2698,7 +2306,6 @@ def api_get_user_treatment_history():
         ''', (session.get('user_email'),))
         
         rows = cursor.fetchall()
-        conn.close()
         
         history = []
         for row in rows:
@@ -2736,8 +2343,7 @@ def api_get_confirmed_appointments():
     print(f"[DEBUG] Getting confirmed appointments for vet: {vet_email}")
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         # Get confirmed appointments only for the logged-in vet
@@ -2748,7 +2354,6 @@ def api_get_confirmed_appointments():
         ''', (vet_email,))
         
         rows = cursor.fetchall()
-        conn.close()
         
         confirmed = []
         for row in rows:
@@ -2782,8 +2387,7 @@ def api_mark_confirmed_treated(confirmed_id):
         treatment = data.get('treatment', 'General Treatment')
         notes = data.get('notes', '')
         
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         
         # Get confirmed appointment details and verify vet owns it
@@ -2793,7 +2397,6 @@ def api_mark_confirmed_treated(confirmed_id):
         confirmed = cursor.fetchone()
         
         if not confirmed:
-            conn.close()
             return jsonify({'status': 'error', 'message': 'Confirmed appointment not found or you do not have access to it'}), 404
         
         # Save to treatment_history
@@ -2835,14 +2438,7 @@ def api_mark_confirmed_treated(confirmed_id):
         ''', (confirmed['user_email'], confirmed['animal_tag']))
         
         # Get the last health reading for history record
-        cursor.execute('''
-            SELECT body_temp, heart_rate, status, health_index 
-            FROM health_readings 
-            WHERE animal_tag = ? 
-            ORDER BY timestamp DESC 
-            LIMIT 1
-        ''', (confirmed['animal_tag'],))
-        last_reading = cursor.fetchone()
+        last_reading = get_latest_reading(cursor, confirmed['animal_tag'])
         
         # Save to removed_animals_history
         cursor.execute('''
@@ -2881,7 +2477,6 @@ def api_mark_confirmed_treated(confirmed_id):
             ''', (treatment, confirmed['appointment_id']))
         
         conn.commit()
-        conn.close()
         
         return jsonify({'status': 'success', 'message': 'Treatment saved and animal marked as treated'})
     except Exception as e:
@@ -2894,44 +2489,8 @@ def api_check_consecutive_readings(tag):
         return jsonify({'status': 'error', 'message': 'Not authenticated'}), 401
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # Get last 3 readings for this animal
-        cursor.execute('''
-            SELECT status, health_index, body_temp, heart_rate FROM health_readings 
-            WHERE animal_tag = ? 
-            ORDER BY timestamp DESC 
-            LIMIT 3
-        ''', (tag,))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        if len(rows) < 3:
-            return jsonify({'status': 'success', 'has_consecutive': False, 'reason': 'Not enough readings'})
-        
-        # Check if all 3 have the same status
-        statuses = [row['status'] for row in rows]
-        
-        if statuses[0] == statuses[1] == statuses[2]:
-            # All 3 readings have same status - check if it's concerning
-            common_status = statuses[0]
-            avg_health_index = sum(row['health_index'] for row in rows) / 3
-            avg_temp = sum(row['body_temp'] for row in rows) / 3
-            avg_hr = sum(row['heart_rate'] for row in rows) / 3
-            
-            return jsonify({
-                'status': 'success',
-                'has_consecutive': True,
-                'consecutive_status': common_status,
-                'avg_health_index': round(avg_health_index, 1),
-                'avg_temp': round(avg_temp, 1),
-                'avg_heart_rate': round(avg_hr)
-            })
-        
-        return jsonify({'status': 'success', 'has_consecutive': False})
+        summary = get_consecutive_summary(get_db().cursor(), tag)
+        return jsonify({'status': 'success', **summary})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -2951,7 +2510,7 @@ def vet_logout():
 def cleanup_orphan_readings():
     """Remove health readings for animals that no longer exist"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         
         # Delete readings for animals that don't exist in animals table
@@ -2961,8 +2520,22 @@ def cleanup_orphan_readings():
         ''')
         
         deleted = cursor.rowcount
+        bump_version(cursor, 'readings')
+        cursor.execute('''
+            DELETE FROM latest_health_reading 
+            WHERE animal_tag NOT IN (SELECT tag FROM animals WHERE is_active = 1)
+        ''')
+        cursor.execute('''
+            DELETE FROM simulator_state 
+            WHERE animal_tag NOT IN (SELECT tag FROM animals WHERE is_active = 1)
+        ''')
+        for table in [table for table, _ in ROLLUP_TABLES] + ['health_reading_blocks']:
+            cursor.execute(f'''
+                DELETE FROM {table} 
+                WHERE animal_tag NOT IN (SELECT tag FROM animals WHERE is_active = 1)
+            ''')
         conn.commit()
-        conn.close()
+        state_store.clear()
         
         if deleted > 0:
             print(f"Cleaned up {deleted} orphan health readings")
@@ -2970,27 +2543,18 @@ def cleanup_orphan_readings():
         print(f"Error cleaning up orphan readings: {e}")
 
 if __name__ == '__main__':
-    init_db()
-    init_animals_table()
+    prepare_database()
     
     # Clean up any orphan readings from deleted animals
     cleanup_orphan_readings()
     
-    # Load previous readings from database for gradual health changes
-    load_previous_readings_from_db()
-    
-    # Load Keras model in background thread for faster first prediction
+    # Load the image model in a background thread for a faster first prediction
     print(f"[{datetime.now()}] Starting background model loading...")
-    model_thread = threading.Thread(target=load_keras_model, daemon=True)
+    model_thread = threading.Thread(target=model_loader.load, daemon=True)
     model_thread.start()
     
-    # Start the background scheduler for automatic readings every 5 minutes
+    # Start the background scheduler; its first tick generates readings
+    # straight away unless a cycle already ran this interval
     start_scheduler()
     
-    # Run initial reading if no readings exist yet
-    last_reading = get_last_scheduled_reading_time()
-    if not last_reading:
-        print("No previous readings found - generating initial readings...")
-        scheduled_health_reading_job()
-    
     app.run(debug=True, use_reloader=False)  # use_reloader=False to prevent scheduler running twice
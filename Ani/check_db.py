@@ -1,6 +1,7 @@
 import sqlite3
+from db import DB_PATH
 
-conn = sqlite3.connect('users.db')
+conn = sqlite3.connect(DB_PATH)
 cursor = conn.cursor()
 
 print('=== USERS ===')
@@ -1,6 +1,9 @@
 import sqlite3
+from db import DB_PATH
+from readings import ROLLUP_TABLES
+from response_cache import bump_version
 
-conn = sqlite3.connect('users.db')
+conn = sqlite3.connect(DB_PATH)
 cursor = conn.cursor()
 
 # Delete health_readings for demo user's animals
@@ -11,8 +14,18 @@ cursor.execute('''
     )
 ''')
 deleted = cursor.rowcount
+bump_version(cursor, 'readings')
 print(f'Deleted {deleted} demo user readings')
 
+# And everything derived from them, in the same transaction
+for table in ['latest_health_reading', 'simulator_state', 'health_reading_blocks'] + [table for table, _ in ROLLUP_TABLES]:
+    cursor.execute(f'''
+        DELETE FROM {table} 
+        WHERE animal_tag IN (
+            SELECT tag FROM animals WHERE user_email = 'demo@example.com'
+        )
+    ''')
+
 # Also delete demo user's animals
 cursor.execute("DELETE FROM animals WHERE user_email = 'demo@example.com'")
 deleted_animals = cursor.rowcount
@@ -13,7 +13,7 @@ class Config:
     TESTING = False
     
     # Database configuration
-    DATABASE_PATH = os.getenv('DATABASE_PATH', 'users.db')
+    DATABASE_PATH = os.getenv('DATABASE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'users.db'))
     
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
@@ -22,9 +22,110 @@ class Config:
     # Flask configuration
     JSON_SORT_KEYS = False
     
+    # SQLite PRAGMA profile applied to every connection (see db.py)
+    # WAL lets dashboard readers run while the scheduler is writing
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 16384))
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 128 * 1024 * 1024))
+    SQLITE_TEMP_STORE = os.getenv('SQLITE_TEMP_STORE', 'MEMORY')
+    # Only takes effect on a new database; run `python retention.py --vacuum` once
+    # to convert an existing one (see retention.py)
+    SQLITE_AUTO_VACUUM = os.getenv('SQLITE_AUTO_VACUUM', 'INCREMENTAL')
+    
     # Scheduler configuration
     ENABLE_SCHEDULER = os.getenv('ENABLE_SCHEDULER', 'True').lower() == 'true'
     SCHEDULER_INTERVAL_MINUTES = int(os.getenv('SCHEDULER_INTERVAL_MINUTES', 5))
+    # Only the holder of the scheduler lease runs the readings job; it renews the
+    # lease every heartbeat and another worker takes over once it expires
+    SCHEDULER_HEARTBEAT_SECONDS = int(os.getenv('SCHEDULER_HEARTBEAT_SECONDS', 30))
+    SCHEDULER_LEASE_SECONDS = int(os.getenv('SCHEDULER_LEASE_SECONDS', 90))
+    # Reading cycles, scheduled or triggered, run one at a time across workers: each
+    # holds the reading_cycle lease (renewed as shards finish) and waits up to
+    # READING_CYCLE_WAIT_SECONDS for the cycle before it
+    READING_CYCLE_LEASE_SECONDS = int(os.getenv('READING_CYCLE_LEASE_SECONDS', 60))
+    READING_CYCLE_WAIT_SECONDS = int(os.getenv('READING_CYCLE_WAIT_SECONDS', 300))
+
+    # Scheduled readings are split into shards by tag hash and generated on a
+    # process pool; smaller herds are generated in-process (pool startup costs more)
+    READING_SHARDS = int(os.getenv('READING_SHARDS', 16))
+    READING_WORKERS = int(os.getenv('READING_WORKERS', min(4, os.cpu_count() or 1)))
+    READING_POOL_MIN_ANIMALS = int(os.getenv('READING_POOL_MIN_ANIMALS', 2000))
+    
+    # Per-process LRU cache of simulator state (see simulator_state.py)
+    SIMULATOR_STATE_CACHE_SIZE = int(os.getenv('SIMULATOR_STATE_CACHE_SIZE', 20000))
+    
+    # /api/stream/readings: how often each process checks for new readings, how
+    # often idle streams send a keepalive, and when a stream closes so the
+    # browser reconnects (and the worker thread is recycled)
+    STREAM_POLL_SECONDS = float(os.getenv('STREAM_POLL_SECONDS', 2))
+    STREAM_KEEPALIVE_SECONDS = int(os.getenv('STREAM_KEEPALIVE_SECONDS', 15))
+    STREAM_MAX_SECONDS = int(os.getenv('STREAM_MAX_SECONDS', 600))
+    
+    # /api/health-readings/all returns at most this many readings per animal
+    READINGS_PER_ANIMAL_MAX = int(os.getenv('READINGS_PER_ANIMAL_MAX', 100))
+    
+    # /api/trigger-reading jobs: triggers within the coalesce window of the user's
+    # last job reuse it; a job without progress for the stale window is presumed dead
+    TRIGGER_COALESCE_SECONDS = int(os.getenv('TRIGGER_COALESCE_SECONDS', 60))
+    READING_JOB_STALE_SECONDS = int(os.getenv('READING_JOB_STALE_SECONDS', 600))
+    
+    # /predict-image batches concurrent uploads into one predict call: up to
+    # INFERENCE_MAX_BATCH images, waiting at most INFERENCE_MAX_WAIT_MS for the batch to fill
+    INFERENCE_MAX_BATCH = int(os.getenv('INFERENCE_MAX_BATCH', 32))
+    INFERENCE_MAX_WAIT_MS = float(os.getenv('INFERENCE_MAX_WAIT_MS', 10))
+    INFERENCE_MAX_PENDING = int(os.getenv('INFERENCE_MAX_PENDING', 256))
+    INFERENCE_TIMEOUT_SECONDS = float(os.getenv('INFERENCE_TIMEOUT_SECONDS', 30))
+    
+    # Image model runtime: 'auto' uses Model/model.tflite when present, else the
+    # Keras H5 via tf_keras (see model_loader.py)
+    MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'auto')
+    MODEL_THREADS = int(os.getenv('MODEL_THREADS', 2))
+    
+    # Per-process cache of predictions keyed by a digest of the image's pixels
+    # (exact repeats only); 0 entries disables it
+    PREDICTION_CACHE_SIZE = int(os.getenv('PREDICTION_CACHE_SIZE', 1024))
+    PREDICTION_CACHE_TTL_SECONDS = int(os.getenv('PREDICTION_CACHE_TTL_SECONDS', 3600))
+    
+    # Uploads beyond these limits are rejected before decoding (see image_preprocess.py)
+    MAX_IMAGE_UPLOAD_BYTES = int(os.getenv('MAX_IMAGE_UPLOAD_BYTES', 10 * 1024 * 1024))
+    MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', 40_000_000))
+    MAX_IMAGES_PER_UPLOAD = int(os.getenv('MAX_IMAGES_PER_UPLOAD', 16))
+    
+    # /api/predict/batch: images per request and classes returned per image
+    MAX_IMAGES_PER_BATCH = int(os.getenv('MAX_IMAGES_PER_BATCH', 32))
+    PREDICT_TOP_K = int(os.getenv('PREDICT_TOP_K', 3))
+    
+    # Bulk animal import: rows per executemany, and how many row errors are listed
+    IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 5000))
+    IMPORT_MAX_REPORTED_ERRORS = int(os.getenv('IMPORT_MAX_REPORTED_ERRORS', 500))
+    
+    # PDF health reports: detail rows listed, and how much of the rendered PDF is
+    # kept in memory before it spills to a temp file (see health_report.py)
+    REPORT_RECENT_READINGS = int(os.getenv('REPORT_RECENT_READINGS', 20))
+    REPORT_SPOOL_MAX_BYTES = int(os.getenv('REPORT_SPOOL_MAX_BYTES', 1024 * 1024))
+    REPORT_STREAM_CHUNK_BYTES = int(os.getenv('REPORT_STREAM_CHUNK_BYTES', 64 * 1024))
+    
+    # Retention (see retention.py): raw readings are kept for READING_RETENTION_DAYS
+    # and hourly rollups for HOURLY_ROLLUP_RETENTION_DAYS (0 keeps them forever);
+    # daily rollups are never deleted. Rows go in batches with a pause between
+    # them so the readings writer is never held up, then free pages are vacuumed.
+    READING_RETENTION_DAYS = int(os.getenv('READING_RETENTION_DAYS', 90))
+    # Optionally pack them into compact archive blocks rather than dropping them (see
+    # reading_store.py); archive blocks are kept forever, so the file keeps growing
+    READING_ARCHIVE = os.getenv('READING_ARCHIVE', 'False').lower() == 'true'
+    READING_ARCHIVE_BLOCK_SIZE = int(os.getenv('READING_ARCHIVE_BLOCK_SIZE', 2048))
+    HOURLY_ROLLUP_RETENTION_DAYS = int(os.getenv('HOURLY_ROLLUP_RETENTION_DAYS', 400))
+    RETENTION_INTERVAL_HOURS = float(os.getenv('RETENTION_INTERVAL_HOURS', 24))
+    RETENTION_DELETE_BATCH = int(os.getenv('RETENTION_DELETE_BATCH', 5000))
+    RETENTION_BATCH_PAUSE_SECONDS = float(os.getenv('RETENTION_BATCH_PAUSE_SECONDS', 0.05))
+    RETENTION_VACUUM_PAGES = int(os.getenv('RETENTION_VACUUM_PAGES', 2000))
+    
+    # Per-process cache of the polled read APIs, invalidated by the data version
+    # counters writes bump (see response_cache.py); 0 entries disables it
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 4096))
+    RESPONSE_CACHE_TTL_SECONDS = int(os.getenv('RESPONSE_CACHE_TTL_SECONDS', 300))
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -36,12 +137,11 @@ class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     TESTING = False
-    ENABLE_SCHEDULER = False  # Disable scheduler in serverless environment
+    # Disabled in the serverless environment; set ENABLE_SCHEDULER=true for gunicorn (see gunicorn.conf.py)
+    ENABLE_SCHEDULER = os.getenv('ENABLE_SCHEDULER', 'False').lower() == 'true'
     
-    # Ensure SECRET_KEY is set in production
+    # Checked in get_config() so importing this module never fails
     SECRET_KEY = os.getenv('SECRET_KEY')
-    if not SECRET_KEY:
-        raise ValueError("SECRET_KEY environment variable must be set in production")
 
 class TestingConfig(Config):
     """Testing configuration"""
@@ -54,6 +154,9 @@ def get_config():
     env = os.getenv('FLASK_ENV', 'development')
     
     if env == 'production':
+        # Ensure SECRET_KEY is set in production
+        if not ProductionConfig.SECRET_KEY:
+            raise ValueError("SECRET_KEY environment variable must be set in production")
         return ProductionConfig
     elif env == 'testing':
         return TestingConfig
@@ -0,0 +1,35 @@
+"""Shared test setup: every test gets its own temporary database.
+The test modules call fresh_db() from their setup helpers, so they also run as
+scripts; under pytest the temp_db fixture keeps the files in tmp_path and puts
+db.DB_PATH and app.LAST_READING_TIME_FILE back afterwards."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+import db
+import app as app_module
+
+# Where fresh_db() makes its directories (the system temp dir outside pytest)
+TEMP_ROOT = None
+
+
+def fresh_db():
+    """Point db at a new, empty database in its own temp directory; returns its path"""
+    db.close_db()
+    directory = tempfile.mkdtemp(dir=TEMP_ROOT)
+    db.DB_PATH = os.path.join(directory, 'users.db')
+    # Full cycles write the last reading time; keep it out of the working tree
+    app_module.LAST_READING_TIME_FILE = os.path.join(directory, 'last_reading_time.txt')
+    return db.DB_PATH
+
+
+@pytest.fixture(autouse=True)
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys.modules[__name__], 'TEMP_ROOT', str(tmp_path))
+    # Recorded so that monkeypatch restores them, whatever fresh_db() sets in between
+    monkeypatch.setattr(db, 'DB_PATH', db.DB_PATH)
+    monkeypatch.setattr(app_module, 'LAST_READING_TIME_FILE', app_module.LAST_READING_TIME_FILE)
+    yield fresh_db()
+    db.close_db()
@@ -0,0 +1,79 @@
+"""
+Shared data-access layer for the health database.
+Every module gets its connection from here so they all agree on one DB_PATH
+and reuse a long-lived connection per worker thread instead of reconnecting
+(and re-parsing the schema) on every query.
+"""
+import sqlite3
+import threading
+from config import Config
+
+# Single source of truth for the database location
+DB_PATH = Config.DATABASE_PATH
+
+# One connection per thread (gunicorn workers, APScheduler pool threads, dev server threads)
+_local = threading.local()
+
+
+def get_pragma_profile(config=Config):
+    """Build the ordered PRAGMA profile from the config"""
+    return [
+        ('journal_mode', config.SQLITE_JOURNAL_MODE),
+        ('synchronous', config.SQLITE_SYNCHRONOUS),
+        ('busy_timeout', config.SQLITE_BUSY_TIMEOUT_MS),
+        # Negative cache_size is in KiB rather than pages
+        ('cache_size', -abs(config.SQLITE_CACHE_SIZE_KB)),
+        ('mmap_size', config.SQLITE_MMAP_SIZE),
+        ('temp_store', config.SQLITE_TEMP_STORE),
+    ]
+
+
+def apply_pragmas(conn, config=Config):
+    """Apply the PRAGMA profile to a connection"""
+    # auto_vacuum only takes effect on a new, empty file, and must come before
+    # journal_mode there. Setting it on an existing database waits for the
+    # write lock, so it is skipped (retention.py converts old files).
+    if conn.execute('PRAGMA page_count').fetchone()[0] == 0:
+        conn.execute(f"PRAGMA auto_vacuum = {config.SQLITE_AUTO_VACUUM}")
+    for name, value in get_pragma_profile(config):
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def _connect():
+    """Open a new connection with the settings every caller expects"""
+    conn = sqlite3.connect(DB_PATH, timeout=Config.SQLITE_BUSY_TIMEOUT_MS / 1000)
+    # sqlite3.Row supports both row['col'] and row[0], so tuple-style callers keep working
+    conn.row_factory = sqlite3.Row
+    apply_pragmas(conn)
+    return conn
+
+
+def get_db():
+    """Return this thread's long-lived connection, opening it on first use"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _connect()
+        _local.conn = conn
+    return conn
+
+
+def close_db():
+    """Close this thread's connection (used on shutdown and in tests)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        _local.conn = None
+        conn.close()
+
+
+def release_db(exception=None):
+    """Return the connection to a clean state at the end of a request.
+    The connection stays open; any transaction left open by a failed
+    request is rolled back so it can't leak into the next one."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+
+def init_app(app):
+    """Register the connection lifecycle hooks on the Flask app"""
+    app.teardown_appcontext(release_db)
@@ -7,7 +7,9 @@ Generate new health readings with specific distribution:
 Old readings are kept intact; this adds new readings for all active animals.
 """
 
-import sqlite3
+from db import get_db
+from readings import save_health_reading
+from simulate import READING_MAX_DRAWS, REPAIR_ORDER, repair_reading
 import random
 import numpy as np
 from datetime import datetime
@@ -72,6 +74,28 @@ WEIGHTS = {
     'movement': 0.20
 }
 
+SCORE_MULTIPLIERS = {'heart_rate': 2, 'body_temp': 25, 'blood_pressure': 1.5}
+
+# State mix with no history, and transitions from the last status
+STATE_WEIGHTS = {'Healthy': 0.6, 'Warning': 0.3, 'Critical': 0.1}
+STATE_TRANSITIONS = {
+    'Healthy': {'Healthy': 0.8, 'Warning': 0.2},
+    'Warning': {'Healthy': 0.4, 'Warning': 0.4, 'Critical': 0.2},
+    'Critical': {'Critical': 0.7, 'Warning': 0.3}
+}
+
+# How far from normal each state's vitals are drawn:
+# Warning within +/- spread, Critical between the (near, far) offsets on a random side
+WARNING_SPREADS = {'heart_rate': 15, 'body_temp': 0.8, 'blood_pressure': 25}
+CRITICAL_OFFSETS = {'heart_rate': (25, 40), 'body_temp': (1.5, 2.5), 'blood_pressure': (35, 50)}
+STATE_MOVEMENTS = {
+    'Healthy': ['Active', 'Normal'],
+    'Warning': ['Normal', 'Inactive', 'Low'],
+    'Critical': ['Inactive', 'Lying Down', 'Low']
+}
+
+READING_CLAMPS = {'heart_rate': (20, 200), 'body_temp': (35.0, 43.0), 'blood_pressure': (60, 200)}
+
 
 def get_species_params(species):
     return SPECIES_PARAMS.get(species, DEFAULT_PARAMS)
@@ -83,17 +107,17 @@ def calculate_health_index(heart_rate, body_temp, blood_pressure, movement, spec
     # Heart rate score
     hr_normal = params['heart_rate']['normal']
     hr_deviation = abs(heart_rate - hr_normal)
-    hr_score = max(0, 100 - hr_deviation * 2)
+    hr_score = max(0, 100 - hr_deviation * SCORE_MULTIPLIERS['heart_rate'])
     
     # Temperature score
     temp_normal = params['body_temp']['normal']
     temp_deviation = abs(body_temp - temp_normal)
-    temp_score = max(0, 100 - temp_deviation * 25)
+    temp_score = max(0, 100 - temp_deviation * SCORE_MULTIPLIERS['body_temp'])
     
     # Blood pressure score
     bp_normal = params['blood_pressure']['normal']
     bp_deviation = abs(blood_pressure - bp_normal)
-    bp_score = max(0, 100 - bp_deviation * 1.5)
+    bp_score = max(0, 100 - bp_deviation * SCORE_MULTIPLIERS['blood_pressure'])
     
     # Movement score
     move_score = MOVEMENT_SCORES.get(movement, 70)
@@ -122,85 +146,90 @@ def classify_health_status(health_index):
         return 'Critical'
 
 
+def _draw_state(state_weights):
+    """Pick a health state from a {state: weight} mix"""
+    rand = random.random()
+    for state, weight in state_weights.items():
+        if rand < weight:
+            return state
+        rand -= weight
+    return state
+
+
+def _draw_reading(params, health_state):
+    """A reading from one health state's distribution"""
+    if health_state == 'Healthy':
+        heart_rate = np.random.uniform(params['heart_rate']['min'], params['heart_rate']['max'])
+        body_temp = np.random.uniform(params['body_temp']['min'], params['body_temp']['max'])
+        bp_systolic = np.random.uniform(params['blood_pressure']['min'], params['blood_pressure']['max'])
+    elif health_state == 'Warning':
+        heart_rate = params['heart_rate']['normal'] + np.random.uniform(-1, 1) * WARNING_SPREADS['heart_rate']
+        body_temp = params['body_temp']['normal'] + np.random.uniform(-1, 1) * WARNING_SPREADS['body_temp']
+        bp_systolic = params['blood_pressure']['normal'] + np.random.uniform(-1, 1) * WARNING_SPREADS['blood_pressure']
+    else:  # Critical
+        heart_rate, body_temp, bp_systolic = (
+            params[vital]['normal'] + np.random.choice([-1, 1]) * np.random.uniform(*CRITICAL_OFFSETS[vital])
+            for vital in ('heart_rate', 'body_temp', 'blood_pressure'))
+    
+    # Clamp values
+    heart_rate = max(READING_CLAMPS['heart_rate'][0], min(READING_CLAMPS['heart_rate'][1], heart_rate))
+    body_temp = max(READING_CLAMPS['body_temp'][0], min(READING_CLAMPS['body_temp'][1], body_temp))
+    bp_systolic = max(READING_CLAMPS['blood_pressure'][0], min(READING_CLAMPS['blood_pressure'][1], bp_systolic))
+    
+    return {
+        'heart_rate': round(heart_rate, 1),
+        'body_temp': round(body_temp, 1),
+        'blood_pressure': int(bp_systolic),
+        'movement': random.choice(STATE_MOVEMENTS[health_state])
+    }
+
+
+def _repair(params, reading, state_weights, target_min, target_max):
+    """Move a reading into the target range with simulate.repair_reading, over what the states can draw"""
+    ranges = {}
+    for vital in REPAIR_ORDER:
+        clamp_min, clamp_max = READING_CLAMPS[vital]
+        normal, far = params[vital]['normal'], CRITICAL_OFFSETS[vital][1]
+        ranges[vital] = (max(clamp_min, min(params[vital]['min'], normal - far)),
+                         min(clamp_max, max(params[vital]['max'], normal + far)))
+    movements = {movement: MOVEMENT_SCORES.get(movement, 70)
+                 for state in state_weights for movement in STATE_MOVEMENTS[state]}
+    return repair_reading(reading, ranges, movements,
+                          {vital: params[vital]['normal'] for vital in REPAIR_ORDER},
+                          SCORE_MULTIPLIERS, (target_min, target_max))
+
+
 def generate_reading_for_status_with_constraint(species, last_health_index=None):
     """
     Generate a reading with constraints:
     - If last_health_index exists: change must be <= 10% (max difference)
     - Prevents direct jumps from Healthy (80+) to Critical (<50)
     - Ensures realistic gradual health changes
+    Draws are retried at most READING_MAX_DRAWS times; if all of them miss the
+    target range, the last one is repaired into it instead of drawing on.
     """
     params = get_species_params(species)
     
-    # Determine the target health range based on last reading
     if last_health_index is None:
-        # No previous reading - generate any valid reading
-        target_min, target_max = 0, 100
-    else:
-        # Apply constraint: max 10% difference
-        target_min = max(0, last_health_index - 10)
-        target_max = min(100, last_health_index + 10)
+        # No history - random distribution, no constraint
+        reading = _draw_reading(params, _draw_state(STATE_WEIGHTS))
+        health_index = calculate_health_index(
+            reading['heart_rate'],
+            reading['body_temp'],
+            reading['blood_pressure'],
+            reading['movement'],
+            species
+        )
+        return reading, health_index, classify_health_status(health_index)
     
-    # Try to generate a reading within constraints
-    for attempt in range(30):
-        # Randomly choose health state weighted towards current state
-        if last_health_index is None:
-            # No history - random distribution
-            rand = random.random()
-            if rand < 0.60:
-                health_state = 'Healthy'
-            elif rand < 0.90:
-                health_state = 'Warning'
-            else:
-                health_state = 'Critical'
-        else:
-            # Biased towards staying in same category with small changes
-            current_status = classify_health_status(last_health_index)
-            rand = random.random()
-            
-            if current_status == 'Healthy':
-                # Stay healthy or move to warning
-                health_state = 'Healthy' if rand < 0.8 else 'Warning'
-            elif current_status == 'Warning':
-                # Can go healthy, stay warning, or go critical
-                if rand < 0.4:
-                    health_state = 'Healthy'
-                elif rand < 0.8:
-                    health_state = 'Warning'
-                else:
-                    health_state = 'Critical'
-            else:  # Critical
-                # Stay critical or move to warning
-                health_state = 'Critical' if rand < 0.7 else 'Warning'
-        
-        # Generate reading based on state
-        if health_state == 'Healthy':
-            heart_rate = np.random.uniform(params['heart_rate']['min'], params['heart_rate']['max'])
-            body_temp = np.random.uniform(params['body_temp']['min'], params['body_temp']['max'])
-            bp_systolic = np.random.uniform(params['blood_pressure']['min'], params['blood_pressure']['max'])
-            movement = random.choice(['Active', 'Normal'])
-        elif health_state == 'Warning':
-            heart_rate = params['heart_rate']['normal'] + np.random.uniform(-15, 15)
-            body_temp = params['body_temp']['normal'] + np.random.uniform(-0.8, 0.8)
-            bp_systolic = params['blood_pressure']['normal'] + np.random.uniform(-25, 25)
-            movement = random.choice(['Normal', 'Inactive', 'Low'])
-        else:  # Critical
-            heart_rate = params['heart_rate']['normal'] + np.random.choice([-1, 1]) * np.random.uniform(25, 40)
-            body_temp = params['body_temp']['normal'] + np.random.choice([-1, 1]) * np.random.uniform(1.5, 2.5)
-            bp_systolic = params['blood_pressure']['normal'] + np.random.choice([-1, 1]) * np.random.uniform(35, 50)
-            movement = random.choice(['Inactive', 'Lying Down', 'Low'])
-        
-        # Clamp values
-        heart_rate = max(20, min(200, heart_rate))
-        body_temp = max(35.0, min(43.0, body_temp))
-        bp_systolic = max(60, min(200, bp_systolic))
-        
-        reading = {
-            'heart_rate': round(heart_rate, 1),
-            'body_temp': round(body_temp, 1),
-            'blood_pressure': int(bp_systolic),
-            'movement': movement
-        }
-        
+    # Apply constraint: max 10% difference
+    target_min = max(0, last_health_index - 10)
+    target_max = min(100, last_health_index + 10)
+    
+    # Biased towards staying in same category with small changes
+    state_weights = STATE_TRANSITIONS[classify_health_status(last_health_index)]
+    for attempt in range(READING_MAX_DRAWS):
+        reading = _draw_reading(params, _draw_state(state_weights))
         health_index = calculate_health_index(
             reading['heart_rate'],
             reading['body_temp'],
@@ -208,61 +237,20 @@ def generate_reading_for_status_with_constraint(species, last_health_index=None)
             reading['movement'],
             species
         )
-        
-        # Check if within constraint
-        if last_health_index is None:
-            # No constraint on first reading
-            return reading, health_index, classify_health_status(health_index)
-        elif target_min <= health_index <= target_max:
-            # Within constraint
+        if target_min <= health_index <= target_max:
             return reading, health_index, classify_health_status(health_index)
     
-    # Fallback - if we couldn't find a reading within range, use the closest value
-    if last_health_index is not None:
-        # Clamp to target range
-        clamped_index = max(target_min, min(target_max, health_index))
-        if health_index != clamped_index:
-            # We had to clamp, regenerate until we get closer
-            for attempt in range(10):
-                health_state = 'Healthy' if clamped_index >= 80 else ('Warning' if clamped_index >= 50 else 'Critical')
-                
-                if health_state == 'Healthy':
-                    heart_rate = np.random.uniform(params['heart_rate']['min'], params['heart_rate']['max'])
-                    body_temp = np.random.uniform(params['body_temp']['min'], params['body_temp']['max'])
-                    bp_systolic = np.random.uniform(params['blood_pressure']['min'], params['blood_pressure']['max'])
-                    movement = random.choice(['Active', 'Normal'])
-                elif health_state == 'Warning':
-                    heart_rate = params['heart_rate']['normal'] + np.random.uniform(-10, 10)
-                    body_temp = params['body_temp']['normal'] + np.random.uniform(-0.5, 0.5)
-                    bp_systolic = params['blood_pressure']['normal'] + np.random.uniform(-15, 15)
-                    movement = random.choice(['Normal', 'Inactive'])
-                else:
-                    heart_rate = params['heart_rate']['normal'] + np.random.uniform(-15, 15)
-                    body_temp = params['body_temp']['normal'] + np.random.uniform(-1, 1)
-                    bp_systolic = params['blood_pressure']['normal'] + np.random.uniform(-25, 25)
-                    movement = random.choice(['Inactive', 'Low'])
-                
-                heart_rate = max(20, min(200, heart_rate))
-                body_temp = max(35.0, min(43.0, body_temp))
-                bp_systolic = max(60, min(200, bp_systolic))
-                
-                reading = {
-                    'heart_rate': round(heart_rate, 1),
-                    'body_temp': round(body_temp, 1),
-                    'blood_pressure': int(bp_systolic),
-                    'movement': movement
-                }
-                
-                health_index = calculate_health_index(
-                    reading['heart_rate'],
-                    reading['body_temp'],
-                    reading['blood_pressure'],
-                    reading['movement'],
-                    species
-                )
-                
-                if target_min <= health_index <= target_max:
-                    return reading, health_index, classify_health_status(health_index)
+    repaired = _repair(params, reading, state_weights, target_min, target_max)
+    if repaired is not None:
+        repaired_index = calculate_health_index(
+            repaired['heart_rate'],
+            repaired['body_temp'],
+            repaired['blood_pressure'],
+            repaired['movement'],
+            species
+        )
+        if target_min <= repaired_index <= target_max:
+            return repaired, repaired_index, classify_health_status(repaired_index)
     
     # Last resort: return what we have (should be very rare)
     return reading, health_index, classify_health_status(health_index)
@@ -277,8 +265,7 @@ def generate_readings_with_distribution():
     - Health index change from previous reading must be < 8
     - Cannot jump directly from Healthy (≥80) to Critical (<50)
     """
-    conn = sqlite3.connect('users.db')
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     cursor = conn.cursor()
     
     # Get all active animals
@@ -287,22 +274,13 @@ def generate_readings_with_distribution():
     
     if not animals:
         print("No active animals found!")
-        conn.close()
         return
     
     print(f"Found {len(animals)} active animals")
     
     # Get last reading for each animal
     last_readings = {}
-    cursor.execute('''
-        SELECT animal_tag, health_index, status
-        FROM health_readings
-        WHERE (animal_tag, timestamp) IN (
-            SELECT animal_tag, MAX(timestamp)
-            FROM health_readings
-            GROUP BY animal_tag
-        )
-    ''')
+    cursor.execute('SELECT animal_tag, health_index, status FROM latest_health_reading')
     for row in cursor.fetchall():
         last_readings[row['animal_tag']] = {
             'health_index': row['health_index'],
@@ -343,10 +321,8 @@ def generate_readings_with_distribution():
                 actual_status = classify_health_status(health_index)
         
         # Insert reading into database
-        cursor.execute('''
-            INSERT INTO health_readings (animal_tag, heart_rate, body_temp, blood_pressure, movement, health_index, status, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        save_health_reading(
+            cursor,
             tag,
             reading['heart_rate'],
             reading['body_temp'],
@@ -355,7 +331,7 @@ def generate_readings_with_distribution():
             health_index,
             actual_status,
             timestamp
-        ))
+        )
         
         results[actual_status].append(tag)
         change_info = ""
@@ -365,7 +341,6 @@ def generate_readings_with_distribution():
         print(f"  {tag} ({species}): {actual_status} (Health Index: {health_index}%){change_info}")
     
     conn.commit()
-    conn.close()
     
     print("-" * 60)
     print(f"\n✓ Generated {len(animals)} new readings!")
@@ -0,0 +1,268 @@
+"""
+PDF health reports for one animal or a whole herd over a date range.
+Per-animal averages, reading counts and the most common status are built from
+per-(animal, status) sums, and only the few detail rows the report lists are
+fetched, so a year of readings for a large herd never passes through Python
+row by row. Both come from ReadingRepository (see reading_store.py), which
+also covers readings retention has moved into the compact archive.
+The PDF is rendered into a SpooledTemporaryFile (in memory while small, on
+disk beyond REPORT_SPOOL_MAX_BYTES) and streamed back in chunks.
+"""
+import tempfile
+from datetime import datetime, timedelta
+
+from config import Config
+from reading_store import ReadingRepository, to_epoch
+
+ACTIVE_ANIMALS = "user_email = ? AND (is_active = 1 OR is_active IS NULL)"
+
+
+def report_range(date_from, date_to):
+    """Inclusive YYYY-MM-DD dates as a half-open [start, end) range of epoch
+    seconds. Comparing the ts column (rather than date(timestamp)) lets the
+    (animal_tag, ts) index bound the scan. Raises ValueError on bad dates."""
+    start = datetime.strptime(date_from, '%Y-%m-%d')
+    end = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
+    return to_epoch(start), to_epoch(end)
+
+
+def fetch_report_data(cursor, user_email, animal_tag, date_from, date_to, recent_limit=None):
+    """Returns (animals, stats by tag, recent readings) for the report,
+    or None if animal_tag is not one of the user's animals.
+    animal_tag 'all' covers every active animal of the user."""
+    if recent_limit is None:
+        recent_limit = Config.REPORT_RECENT_READINGS
+    start, end = report_range(date_from, date_to)
+
+    if animal_tag == 'all':
+        cursor.execute(f'SELECT * FROM animals WHERE {ACTIVE_ANIMALS}', (user_email,))
+        animals = cursor.fetchall()
+        scope = f'animal_tag IN (SELECT tag FROM animals WHERE {ACTIVE_ANIMALS})'
+        scope_params = (user_email,)
+    else:
+        cursor.execute('SELECT * FROM animals WHERE tag = ? AND user_email = ?', (animal_tag, user_email))
+        animals = cursor.fetchall()
+        if not animals:
+            return None
+        scope = 'animal_tag = ?'
+        scope_params = (animal_tag,)
+
+    repository = ReadingRepository()
+    stats = summarize_groups(repository.status_groups(cursor, scope, scope_params, start, end))
+    recent = repository.recent(cursor, scope, scope_params, start, end, recent_limit)
+    return animals, stats, recent
+
+
+def summarize_groups(groups):
+    """Fold (animal_tag, status, n, temp_sum, hr_sum, index_sum) groups into
+    per-animal averages, reading count and most common status"""
+    totals = {}
+    for tag, status, n, temp_sum, hr_sum, index_sum in groups:
+        animal = totals.setdefault(tag, {'n': 0, 'temp': 0.0, 'hr': 0.0, 'index': 0.0, 'statuses': {}})
+        animal['n'] += n
+        animal['temp'] += temp_sum
+        animal['hr'] += hr_sum
+        animal['index'] += index_sum
+        animal['statuses'][status] = animal['statuses'].get(status, 0) + n
+    stats = {}
+    for tag, animal in totals.items():
+        common_status = max(animal['statuses'], key=animal['statuses'].get)
+        stats[tag] = {
+            'animal_tag': tag,
+            'avg_temp': animal['temp'] / animal['n'],
+            'avg_hr': animal['hr'] / animal['n'],
+            'avg_index': animal['index'] / animal['n'],
+            'common_status': common_status,
+            'status_count': animal['statuses'][common_status],
+            'readings': animal['n'],
+        }
+    return stats
+
+
+def generate_pdf_report(out, animals, stats, recent, date_from, date_to, user_email):
+    """Render the report into the writable binary file out"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+    doc = SimpleDocTemplate(out, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
+    story = []
+    styles = getSampleStyleSheet()
+
+    # Title style
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        spaceAfter=30,
+        textColor=colors.HexColor('#13ec5b')
+    )
+
+    # Header style
+    header_style = ParagraphStyle(
+        'CustomHeader',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=12,
+        spaceBefore=20,
+        textColor=colors.HexColor('#111813')
+    )
+
+    # Normal text style
+    normal_style = ParagraphStyle(
+        'CustomNormal',
+        parent=styles['Normal'],
+        fontSize=10,
+        spaceAfter=6
+    )
+
+    # Title
+    story.append(Paragraph("🐄 Ani-Health - Livestock Health Report", title_style))
+    story.append(Spacer(1, 12))
+
+    # Report info
+    story.append(Paragraph(f"<b>Report Period:</b> {date_from} to {date_to}", normal_style))
+    story.append(Paragraph(f"<b>Generated:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", normal_style))
+    story.append(Paragraph(f"<b>User:</b> {user_email}", normal_style))
+    story.append(Spacer(1, 20))
+
+    # Animal Summary
+    story.append(Paragraph("📋 Animal Summary", header_style))
+
+    animal_data = [['Tag', 'Name', 'Species', 'Weight (kg)', 'Age (years)', 'Gender']]
+    for animal in animals:
+        animal_data.append([
+            animal['tag'],
+            animal['name'],
+            animal['species'],
+            str(animal['weight'] or 'N/A'),
+            str(animal['age'] or 'N/A'),
+            animal['gender'] or 'N/A'
+        ])
+
+    # Long tables split across pages; repeatRows keeps the header on each
+    animal_table = Table(animal_data, colWidths=[60, 80, 70, 70, 70, 60], repeatRows=1)
+    animal_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#13ec5b')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f6f8f6')),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#111813')),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e0e0e0')),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 1), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+    ]))
+    story.append(animal_table)
+    story.append(Spacer(1, 20))
+
+    # Health Readings
+    story.append(Paragraph("📊 Health Readings", header_style))
+
+    if stats:
+        # Statistics summary, in the same order as the animal summary
+        stats_data = [['Animal Tag', 'Avg Temp (°C)', 'Avg HR (bpm)', 'Avg Health Index', 'Most Common Status', 'Readings']]
+        for animal in animals:
+            row = stats.get(animal['tag'])
+            if row is None:
+                continue
+            stats_data.append([
+                row['animal_tag'],
+                str(round(row['avg_temp'], 1)),
+                str(round(row['avg_hr'], 1)),
+                str(round(row['avg_index'], 1)),
+                row['common_status'],
+                str(row['readings'])
+            ])
+
+        stats_table = Table(stats_data, colWidths=[70, 70, 70, 90, 90, 60], repeatRows=1)
+        stats_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4CAF50')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#111813')),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e0e0e0')),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 1), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+        ]))
+        story.append(stats_table)
+        story.append(Spacer(1, 20))
+
+        # Detailed readings table
+        story.append(Paragraph(f"📝 Recent Readings (Last {len(recent)})", header_style))
+
+        readings_data = [['Timestamp', 'Tag', 'Temp', 'HR', 'BP', 'Movement', 'Index', 'Status']]
+        for reading in recent:
+            readings_data.append([
+                reading['timestamp'][:16] if reading['timestamp'] else 'N/A',
+                reading['animal_tag'],
+                f"{reading['body_temp']}°C",
+                f"{reading['heart_rate']} bpm",
+                reading['blood_pressure'] or 'N/A',
+                reading['movement'] or 'N/A',
+                f"{reading['health_index']}%",
+                reading['status']
+            ])
+
+        readings_table = Table(readings_data, colWidths=[85, 50, 50, 55, 55, 55, 45, 55], repeatRows=1)
+        readings_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2196F3')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor('#111813')),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e0e0e0')),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('TOPPADDING', (0, 1), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+        ]))
+        story.append(readings_table)
+    else:
+        story.append(Paragraph("No health readings found for the selected period.", normal_style))
+
+    story.append(Spacer(1, 30))
+
+    # Footer
+    footer_style = ParagraphStyle(
+        'Footer',
+        parent=styles['Normal'],
+        fontSize=8,
+        textColor=colors.gray
+    )
+    story.append(Paragraph("---", footer_style))
+    story.append(Paragraph("This report was automatically generated by Ani-Health Livestock Monitoring System.", footer_style))
+    story.append(Paragraph("For any concerns about animal health, please consult with a veterinarian.", footer_style))
+
+    doc.build(story)
+
+
+def render_report(animals, stats, recent, date_from, date_to, user_email):
+    """Render into a spooled temp file. Returns (file rewound to the start, size in bytes);
+    the caller closes the file."""
+    spool = tempfile.SpooledTemporaryFile(max_size=Config.REPORT_SPOOL_MAX_BYTES)
+    try:
+        generate_pdf_report(spool, animals, stats, recent, date_from, date_to, user_email)
+        size = spool.tell()
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        raise
+    return spool, size
@@ -0,0 +1,123 @@
+"""
+Image preprocessing for /predict-image.
+Uploads are decoded straight into rows of a preallocated float32 batch:
+  - oversized files and images with too many pixels are rejected from the
+    file size and the image header, before anything is decoded
+  - JPEGs are downscaled while decoding (PIL draft), so a 12 MP phone photo
+    is decoded at 1/8 scale instead of full size
+  - pixels are scaled to [0, 1] in place in the batch row, without the
+    temporary float64/float32 copies np.array(...) / 255.0 made
+Several uploads in one request go through the same path into one batch.
+For test-time augmentation each upload fills TTA_VIEWS consecutive rows:
+the whole image, its mirror image and a centre crop.
+"""
+import numpy as np
+from PIL import Image
+
+from config import Config
+
+IMAGE_SIZE = 224
+INPUT_SHAPE = (IMAGE_SIZE, IMAGE_SIZE, 3)
+PIXEL_SCALE = np.float32(1 / 255)
+
+# Test-time augmentation: whole image, horizontal flip, centre crop of this fraction
+TTA_VIEWS = 3
+TTA_CENTER_CROP = 0.8
+
+
+def upload_size(stream):
+    """Size in bytes of a seekable upload stream (the position is left at the start)"""
+    stream.seek(0, 2)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+def too_many_pixels(img, max_pixels=Config.MAX_IMAGE_PIXELS):
+    """Rejection message for an opened (not yet decoded) image that is too big, else None"""
+    width, height = img.size
+    if width * height > max_pixels:
+        return f'Image is {width}x{height}; the limit is {max_pixels // 1_000_000} megapixels'
+    return None
+
+
+def decode_for_resize(img):
+    """Decode an opened image as RGB, letting JPEGs scale down by up to 8x while
+    staying at least 224x224"""
+    img.draft('RGB', (IMAGE_SIZE, IMAGE_SIZE))
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img
+
+
+def preprocess_into(img, out):
+    """Decode an opened image into out, a (224, 224, 3) float32 array scaled to [0, 1]"""
+    img = decode_for_resize(img)
+
+    # Resize to 224x224 using BILINEAR for speed (LANCZOS is slower)
+    img = img.resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR)
+    np.multiply(np.asarray(img), PIXEL_SCALE, out=out)
+    return out
+
+
+def preprocess_views_into(img, out):
+    """Decode an opened image into the TTA_VIEWS rows of out: whole, mirrored, centre crop"""
+    img = decode_for_resize(img)
+    width, height = img.size
+    np.multiply(np.asarray(img.resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR)), PIXEL_SCALE, out=out[0])
+    # The mirror is a reversed view of the first row, no second resize
+    np.copyto(out[1], out[0][:, ::-1])
+    # Crop while resizing (box=), so the crop itself is never materialized
+    margin_x, margin_y = width * (1 - TTA_CENTER_CROP) / 2, height * (1 - TTA_CENTER_CROP) / 2
+    crop = img.resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR,
+                      box=(margin_x, margin_y, width - margin_x, height - margin_y))
+    np.multiply(np.asarray(crop), PIXEL_SCALE, out=out[2])
+    return out
+
+
+def preprocess_image(stream, max_pixels=Config.MAX_IMAGE_PIXELS):
+    """Decode one upload into a new (224, 224, 3) float32 array"""
+    img = Image.open(stream)
+    rejection = too_many_pixels(img, max_pixels)
+    if rejection:
+        raise ValueError(rejection)
+    return preprocess_into(img, np.empty(INPUT_SHAPE, dtype=np.float32))
+
+
+def preprocess_uploads(files, max_bytes=Config.MAX_IMAGE_UPLOAD_BYTES, max_pixels=Config.MAX_IMAGE_PIXELS,
+                       tta=False):
+    """Decode uploaded files into one preallocated (n * views, 224, 224, 3) float32 batch.
+    Returns (batch, results): results[i] is the first of files[i]'s rows in batch
+    (TTA_VIEWS consecutive rows with tta, else one), or an (http_status, message)
+    tuple when that file was rejected."""
+    views = TTA_VIEWS if tta else 1
+    batch = np.empty((len(files) * views,) + INPUT_SHAPE, dtype=np.float32)
+    results = []
+    rows = 0
+    for file in files:
+        size = upload_size(file.stream)
+        if size > max_bytes:
+            results.append((413, f'{file.filename} is {size / 1024 / 1024:.1f} MB; '
+                                 f'the limit is {max_bytes / 1024 / 1024:.0f} MB'))
+            continue
+        try:
+            # Image.open only reads the header
+            img = Image.open(file.stream)
+        except Exception as e:
+            results.append((400, f'Could not read image {file.filename}: {e}'))
+            continue
+        rejection = too_many_pixels(img, max_pixels)
+        if rejection:
+            results.append((413, f'{file.filename}: {rejection}'))
+            continue
+        try:
+            if tta:
+                preprocess_views_into(img, batch[rows:rows + views])
+            else:
+                preprocess_into(img, batch[rows])
+        except Exception as e:
+            results.append((400, f'Could not read image {file.filename}: {e}'))
+            continue
+        results.append(rows)
+        rows += views
+    return batch[:rows], results
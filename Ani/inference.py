@@ -0,0 +1,106 @@
+"""
+Micro-batching inference queue for /predict-image.
+Request threads preprocess their image and submit it here; one worker thread
+per process collects whatever arrives within a short window (up to a batch
+size) and runs a single predict call for the whole batch. Each request gets
+its row of the result back through a Future. Keras pays most of its cost per
+predict call rather than per image, so concurrent uploads share that cost.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+import numpy as np
+
+from config import Config
+
+
+class InferenceBatcher:
+    """Collects submitted images into batches for one predict function"""
+
+    def __init__(self, predict, max_batch=Config.INFERENCE_MAX_BATCH,
+                 max_wait_ms=Config.INFERENCE_MAX_WAIT_MS, max_pending=Config.INFERENCE_MAX_PENDING):
+        """
+        predict(batch) takes an array of shape (n, ...) and returns n rows of scores
+        max_batch: most images per predict call
+        max_wait_ms: how long the first image of a batch waits for company
+        max_pending: submit raises queue.Full beyond this many waiting uploads
+        """
+        self.predict = predict
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._last_batch_size = 0
+        self._carry = []
+        # Reused for every batch instead of allocating a new array per predict
+        self._buffer = None
+        self.batches = 0
+        self.images = 0
+
+    def submit(self, image):
+        """Queue one preprocessed image; returns a Future for its scores"""
+        return self.submit_many([image])[0]
+
+    def submit_many(self, images):
+        """Queue the images of one upload together, so they land in the same batch
+        when there is room. Returns a Future per image."""
+        futures = [Future() for _ in images]
+        self._queue.put_nowait(list(zip(images, futures)))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+                self._thread.start()
+        return futures
+
+    def _collect(self):
+        """Block for the first upload, then take whatever else is already queued. The
+        batch only waits (up to max_wait) for more while traffic is concurrent, so a
+        lone upload on an idle server goes straight to predict. Images beyond
+        max_batch are carried over to the next batch."""
+        batch = self._carry or self._queue.get()
+        deadline = time.monotonic() + (self.max_wait if self._last_batch_size > 1 else 0)
+        while len(batch) < self.max_batch:
+            try:
+                batch.extend(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.extend(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        batch, self._carry = batch[:self.max_batch], batch[self.max_batch:]
+        self._last_batch_size = len(batch)
+        return batch
+
+    def _stack(self, images):
+        """Copy images into the reusable batch buffer; returns the filled rows"""
+        shape = (self.max_batch,) + images[0].shape
+        if self._buffer is None or self._buffer.shape != shape:
+            self._buffer = np.empty(shape, dtype=np.float32)
+        return np.stack(images, out=self._buffer[:len(images)])
+
+    def _run(self):
+        while True:
+            # Skip requests whose caller already gave up
+            batch = [(image, future) for image, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                scores = self.predict(self._stack([image for image, _ in batch]))
+            except Exception as e:
+                print(f"[{datetime.now()}] Inference batch of {len(batch)} failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.images += len(batch)
+            for (_, future), row in zip(batch, scores):
+                future.set_result(row)
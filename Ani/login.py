@@ -1,13 +1,14 @@
 import sqlite3
 from flask import session
+from db import get_db
+from user import generate_animal_tag
 from werkzeug.security import check_password_hash
 
 def login_user(email, password):
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
     user = cursor.fetchone()
-    conn.close()
 
     if not user:
         return 'not_found'
@@ -25,7 +26,7 @@ def login_user(email, password):
 
 def assign_animals_if_needed(user_email):
     """Create sample animals for new user if they don't have any"""
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     try:
@@ -44,21 +45,8 @@ def assign_animals_if_needed(user_email):
             
             # Generate unique tags for each animal
             for name, species, weight, age, gender, email in sample_animals:
-                # Get the next available tag number for this species
-                prefix_map = {'Cow': 'C', 'Goat': 'G', 'Sheep': 'S', 'Buffalo': 'B', 'Horse': 'H'}
-                prefix = prefix_map.get(species, 'A')
-                
-                cursor.execute("SELECT tag FROM animals WHERE tag LIKE ? ORDER BY tag DESC LIMIT 1", (f'{prefix}-%',))
-                last_tag = cursor.fetchone()
-                
-                if last_tag:
-                    try:
-                        num = int(last_tag[0].split('-')[1])
-                        new_tag = f"{prefix}-{str(num + 1).zfill(3)}"
-                    except:
-                        new_tag = f"{prefix}-001"
-                else:
-                    new_tag = f"{prefix}-001"
+                # Reserve the next tag for this species from its counter
+                new_tag = generate_animal_tag(species)
                 
                 # Insert the animal with generated tag
                 cursor.execute('''
@@ -69,16 +57,14 @@ def assign_animals_if_needed(user_email):
             conn.commit()
     except sqlite3.OperationalError:
         # Table doesn't exist yet, will be created on app init
-        pass
+        conn.rollback()
     
-    conn.close()
 
 def login_vet(email, password):
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM vets WHERE email = ?", (email,))
     vet = cursor.fetchone()
-    conn.close()
 
     if not vet:
         return 'not_found'
@@ -95,11 +81,10 @@ def login_vet(email, password):
 def get_user_by_email(email):
     if not email:
         return None
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
     user = cursor.fetchone()
-    conn.close()
     
     if user:
         return {
@@ -115,11 +100,10 @@ def get_user_by_email(email):
 def get_vet_by_email(email):
     if not email:
         return None
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM vets WHERE email = ?", (email,))
     vet = cursor.fetchone()
-    conn.close()
     
     if vet:
         return {
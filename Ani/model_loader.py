@@ -0,0 +1,177 @@
+"""
+Image model loading for /predict-image.
+The model is loaded on first use behind a lock, so it works the same under
+the dev server, gunicorn and Vercel. Two runtimes are supported:
+  - tflite: Model/model.tflite run by tflite_runtime (or tensorflow.lite).
+    Much smaller per worker than TensorFlow. gunicorn's master can read the
+    file before fork so workers share its bytes copy-on-write; each worker
+    builds its own interpreter, since XNNPACK's threads don't survive fork.
+  - keras: the original Teachable Machine Model/keras_model.h5 via tf_keras.
+With MODEL_BACKEND=auto the TFLite file is used when present, else the H5.
+Create the TFLite file once with:  python model_loader.py --export
+"""
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from config import Config
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Model')
+KERAS_FILE = 'keras_model.h5'
+TFLITE_FILE = 'model.tflite'
+LABELS_FILE = 'labels.txt'
+INPUT_SHAPE = (224, 224, 3)
+
+
+def read_labels(path):
+    """Teachable Machine labels: one '<index> <name>' per line"""
+    with open(path, 'r') as f:
+        return [line.strip().split(' ', 1)[1] if ' ' in line.strip() else line.strip() for line in f if line.strip()]
+
+
+def load_tflite_interpreter(path, content=None):
+    """Prefer the standalone tflite_runtime wheel; fall back to the copy inside TensorFlow.
+    content: the model file's bytes, if already read (see ModelLoader.preload)"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        from tensorflow.lite.python.interpreter import Interpreter
+    if content is not None:
+        return Interpreter(model_content=content, num_threads=Config.MODEL_THREADS)
+    return Interpreter(model_path=path, num_threads=Config.MODEL_THREADS)
+
+
+class TFLitePredictor:
+    """Runs a TFLite interpreter on (n, 224, 224, 3) batches"""
+
+    def __init__(self, path, content=None):
+        self.interpreter = load_tflite_interpreter(path, content)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+        self.batch_size = 1
+        # The interpreter isn't thread-safe
+        self._lock = threading.Lock()
+
+    def __call__(self, batch):
+        with self._lock:
+            if len(batch) != self.batch_size:
+                self.interpreter.resize_tensor_input(self.input_index, list(batch.shape))
+                self.interpreter.allocate_tensors()
+                self.batch_size = len(batch)
+            self.interpreter.set_tensor(self.input_index, np.ascontiguousarray(batch, dtype=np.float32))
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output_index).copy()
+
+
+class KerasPredictor:
+    """Runs the H5 model through tf_keras (legacy Teachable Machine format)"""
+
+    def __init__(self, path):
+        import tf_keras as keras
+        self.model = keras.models.load_model(path, compile=False)
+
+    def __call__(self, batch):
+        return self.model.predict(batch, verbose=0)
+
+
+class ModelLoader:
+    """Loads the image model once per process, on first use"""
+
+    def __init__(self, model_dir=MODEL_DIR, backend=Config.MODEL_BACKEND):
+        self.model_dir = model_dir
+        self.backend = backend
+        self.predict = None
+        self.labels = []
+        self.runtime = None
+        self.error = None
+        # The TFLite file's bytes, read by preload() in gunicorn's master
+        self.model_content = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.predict is not None
+
+    def _open(self):
+        """Pick the runtime and open the model. Returns (predict, runtime)."""
+        tflite_path = os.path.join(self.model_dir, TFLITE_FILE)
+        if self.backend == 'tflite' or (self.backend == 'auto' and os.path.exists(tflite_path)):
+            try:
+                return TFLitePredictor(tflite_path, self.model_content), 'tflite'
+            except Exception as e:
+                if self.backend == 'tflite':
+                    raise
+                print(f"[{datetime.now()}] TFLite model unavailable ({e}), falling back to tf_keras")
+        return KerasPredictor(os.path.join(self.model_dir, KERAS_FILE)), 'keras'
+
+    def load(self):
+        """Load the model and labels if no other thread has; returns True once ready.
+        A failed load is remembered and retried on the next call."""
+        if self.predict is not None:
+            return True
+        with self._lock:
+            if self.predict is not None:
+                return True
+            start = time.perf_counter()
+            try:
+                predict, runtime = self._open()
+                labels = read_labels(os.path.join(self.model_dir, LABELS_FILE))
+                # Warm-up prediction so the first real request doesn't pay for graph setup
+                predict(np.zeros((1,) + INPUT_SHAPE, dtype=np.float32))
+            except Exception as e:
+                self.error = str(e)
+                print(f"Error loading image model: {e}")
+                return False
+            self.labels, self.runtime, self.error = labels, runtime, None
+            self.predict = predict
+            print(f"[{datetime.now()}] Image model ready ({runtime}, {len(labels)} labels) "
+                  f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+            return True
+
+    def preload(self):
+        """Read the TFLite file in gunicorn's master before fork, so the workers
+        share its bytes. No interpreter is built here: XNNPACK and TensorFlow start
+        thread pools that don't survive fork, so each worker builds its own from
+        these bytes in load() (see post_worker_init in gunicorn.conf.py)."""
+        tflite_path = os.path.join(self.model_dir, TFLITE_FILE)
+        if self.backend == 'keras' or not os.path.exists(tflite_path):
+            print(f"[{datetime.now()}] No {TFLITE_FILE}; workers load the model on first use")
+            return False
+        with open(tflite_path, 'rb') as f:
+            self.model_content = f.read()
+        print(f"[{datetime.now()}] Read {TFLITE_FILE} ({len(self.model_content) / 1024 / 1024:.1f} MiB)")
+        return True
+
+
+def export_tflite(model_dir=MODEL_DIR):
+    """Convert Model/keras_model.h5 into Model/model.tflite (needs TensorFlow)"""
+    import tensorflow as tf
+    import tf_keras as keras
+
+    model = keras.models.load_model(os.path.join(model_dir, KERAS_FILE), compile=False)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    # Dynamic-range quantization: weights stored as int8, roughly a quarter of the size
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    path = os.path.join(model_dir, TFLITE_FILE)
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+    print(f"[{datetime.now()}] Wrote {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MiB)")
+
+    # Check the converted model agrees with the original on a few inputs
+    sample = np.random.default_rng(0).random((4,) + INPUT_SHAPE, dtype=np.float32)
+    expected = model.predict(sample, verbose=0).argmax(axis=1)
+    converted = TFLitePredictor(path)(sample).argmax(axis=1)
+    print(f"[{datetime.now()}] Top class matches the H5 model on {int((expected == converted).sum())}/4 samples")
+    return path
+
+
+if __name__ == "__main__":
+    if '--export' in sys.argv:
+        export_tflite()
+    else:
+        print("Usage: python model_loader.py --export")
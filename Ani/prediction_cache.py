@@ -0,0 +1,82 @@
+"""
+Prediction cache for /predict-image and /api/predict/batch.
+Farmers often upload the same photo several times. Uploads are keyed by
+cache_key, a SHA-256 of the preprocessed 224x224 image's pixels, so the cache
+is exact-match: a hit is always the same picture, and its cached model scores
+are returned without a forward pass. A copy the phone has re-encoded decodes
+to other pixels and costs a forward pass. Entries are evicted least recently
+used and expire after a TTL. Per process.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from config import Config
+
+
+def cache_key(image):
+    """SHA-256 of a preprocessed image's float32 pixels"""
+    pixels = np.ascontiguousarray(image, dtype=np.float32)
+    return hashlib.sha256(pixels.tobytes()).digest()
+
+
+class PredictionCache:
+    """LRU + TTL cache of model scores with hit/miss counters"""
+
+    def __init__(self, max_entries=Config.PREDICTION_CACHE_SIZE, ttl_seconds=Config.PREDICTION_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, scores)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return the cached scores, or None on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, scores):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, scores)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
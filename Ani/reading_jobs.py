@@ -0,0 +1,133 @@
+"""
+Background reading jobs for /api/trigger-reading.
+A trigger enqueues a job scoped to the caller's animals and returns its id
+straight away; one worker thread per process runs the jobs. Jobs are kept
+in the reading_jobs table (created by init_db, see schema.py) so
+/api/jobs/<id> answers from any worker process.
+Progress is written to the row as shards finish, which is also the job's
+heartbeat: a running job is only presumed dead once it stops moving, however
+long it takes. A trigger while the same user's job is queued, running or only
+just finished returns that job instead of starting another one.
+"""
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from db import close_db, get_db
+
+JOB_COLUMNS = 'id, user_email, status, done, total, count, error, created_at, started_at, finished_at'
+
+# Finished jobs older than this are deleted when the same user triggers again
+JOB_RETENTION_SECONDS = 24 * 60 * 60
+
+
+class ReadingJobQueue:
+    """Per-process queue of reading jobs backed by the reading_jobs table"""
+
+    def __init__(self, run_job, coalesce_seconds, stale_seconds):
+        """
+        run_job(user_email, progress) generates the readings and returns how many it wrote
+        coalesce_seconds: a finished job is reused for triggers within this window
+        stale_seconds: a queued/running job with no progress for this long is presumed
+        dead (its process exited) and no longer absorbs new triggers
+        """
+        self.run_job = run_job
+        self.coalesce_seconds = coalesce_seconds
+        self.stale_seconds = stale_seconds
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, user_email):
+        """Enqueue a job for user_email's animals, or return the job it coalesces with.
+        Returns (job, coalesced)."""
+        conn = get_db()
+        now = time.time()
+        # IMMEDIATE takes the write lock first, so two workers can't both miss the other's job
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM reading_jobs WHERE user_email = ? AND created_at < ? AND finished_at IS NOT NULL',
+                         (user_email, now - JOB_RETENTION_SECONDS))
+            existing = conn.execute(f'''
+                SELECT {JOB_COLUMNS} FROM reading_jobs
+                WHERE user_email = ? AND created_at >= ?
+                AND ((status IN ('queued', 'running') AND updated_at >= ?)
+                     OR (status = 'done' AND finished_at >= ?))
+                ORDER BY created_at DESC LIMIT 1
+            ''', (user_email, now - JOB_RETENTION_SECONDS, now - self.stale_seconds,
+                  now - self.coalesce_seconds)).fetchone()
+            if existing is not None:
+                conn.commit()
+                return dict(existing), True
+
+            job_id = uuid.uuid4().hex
+            conn.execute('''
+                INSERT INTO reading_jobs (id, user_email, status, created_at, updated_at)
+                VALUES (?, ?, 'queued', ?, ?)
+            ''', (job_id, user_email, now, now))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        self._queue.put((job_id, user_email))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='reading-jobs', daemon=True)
+                self._thread.start()
+        return self.get(job_id), False
+
+    def get(self, job_id, user_email=None):
+        """Return the job as a dict (None if unknown, or if it belongs to another user)"""
+        conn = get_db()
+        row = conn.execute(f'SELECT {JOB_COLUMNS} FROM reading_jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None or (user_email is not None and row['user_email'] != user_email):
+            return None
+        return dict(row)
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        conn = get_db()
+        conn.execute(f'UPDATE reading_jobs SET {assignments} WHERE id = ?', list(fields.values()) + [job_id])
+        conn.commit()
+
+    def _run(self):
+        while True:
+            job_id, user_email = self._queue.get()
+            try:
+                self._update(job_id, status='running', started_at=time.time())
+                last = {}
+
+                def progress(done, total):
+                    last.update(done=done, total=total)
+                    try:
+                        self._update(job_id, done=done, total=total)
+                    except Exception as e:
+                        # A missed heartbeat is retried at the next shard
+                        get_db().rollback()
+                        print(f"[{datetime.now()}] Could not record progress of job {job_id}: {e}")
+
+                count = self.run_job(user_email, progress)
+                self._update(job_id, status='done', done=last.get('done', count), total=last.get('total', count),
+                             count=count, finished_at=time.time())
+            except Exception as e:
+                print(f"[{datetime.now()}] Reading job {job_id} failed: {e}")
+                try:
+                    self._update(job_id, status='failed', error=str(e), finished_at=time.time())
+                except Exception as update_error:
+                    print(f"[{datetime.now()}] Could not record job failure: {update_error}")
+            finally:
+                # Jobs are occasional; don't pin a connection between them
+                close_db()
+
+    def wait(self, job_id, timeout):
+        """Block until the job finishes (used by tests and scripts). Returns the job."""
+        deadline = time.monotonic() + timeout
+        job = self.get(job_id)
+        while job is not None and job['status'] in ('queued', 'running') and time.monotonic() < deadline:
+            time.sleep(0.05)
+            job = self.get(job_id)
+        return job
@@ -0,0 +1,319 @@
+"""
+Storage tiers for health readings and the repository the reports read through.
+
+Hot readings live in health_readings, one row per reading with TEXT
+timestamps, movements and statuses. When retention moves readings out of it
+(see retention.py) they are packed into health_reading_blocks instead of being
+dropped: append-only blocks of up to READING_ARCHIVE_BLOCK_SIZE readings of one
+animal (each batch tops up the animal's newest block), holding each column as a
+packed array (epoch-second timestamps as deltas, vitals as integers or tenths
+where that is exact, movement and status as small-int codes into a per-block
+label list), zlib-compressed. Simulator readings take about 6 bytes each in a
+block against over 100 as a row plus its index entry.
+
+ReadingRepository answers the report queries from both tiers, so a report over
+a range that retention has already moved out still sees every reading.
+
+Convert the readings already in an existing database with:
+    python reading_store.py --older-than 90
+"""
+import heapq
+import json
+import struct
+import sys
+import time
+import zlib
+from array import array
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from response_cache import bump_version
+
+# Block columns in payload order. Archived readings come back as dicts with
+# these keys plus animal_tag, like the rows of health_readings.
+BLOCK_COLUMNS = ('timestamp', 'heart_rate', 'body_temp', 'blood_pressure', 'movement', 'health_index', 'status')
+LABEL_COLUMNS = ('movement', 'status')
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+EPOCH = datetime(1970, 1, 1)
+
+# One animal's oldest readings, in the order of the (animal_tag, ts) index
+SELECT_OLD_READINGS_SQL = '''
+    SELECT id, animal_tag, timestamp, heart_rate, body_temp, blood_pressure, movement, health_index, status
+    FROM health_readings
+    WHERE animal_tag = ? AND ts < ?
+    ORDER BY ts
+    LIMIT ?
+'''
+
+
+def to_epoch(timestamp):
+    """'YYYY-MM-DD HH:MM:SS' as stored (or a naive datetime) -> whole seconds since 1970-01-01.
+    The stored text carries no zone, so it is counted as UTC, like SQLite's strftime('%s')."""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return int(timestamp.replace(tzinfo=timezone.utc).timestamp())
+
+
+def from_epoch(seconds):
+    return (EPOCH + timedelta(seconds=seconds)).strftime(TIMESTAMP_FORMAT)
+
+
+def _int_array(values):
+    """The narrowest signed array type that holds every value"""
+    for typecode in 'bhiq':
+        try:
+            return array(typecode, values)
+        except OverflowError:
+            continue
+    raise OverflowError('value out of 64-bit range')
+
+
+def _pack_numbers(values):
+    """Exact encoding for a numeric column: integers, tenths stored as integers, or doubles"""
+    if all(isinstance(value, int) for value in values):
+        return 'int', _int_array(values)
+    tenths = [round(value * 10) for value in values]
+    if all(tenth / 10 == value for tenth, value in zip(tenths, values)):
+        return 'tenths', _int_array(tenths)
+    return 'float', array('d', values)
+
+
+def encode_block(readings):
+    """Pack readings (dicts or rows with the BLOCK_COLUMNS keys) of one animal.
+    Returns (first_ts, last_ts, payload)."""
+    readings = sorted(readings, key=lambda reading: reading['timestamp'])
+    stamps = [to_epoch(reading['timestamp']) for reading in readings]
+    header = {'count': len(readings), 'columns': [], 'labels': {}}
+    arrays = []
+    for column in BLOCK_COLUMNS:
+        values = [reading[column] for reading in readings]
+        if column == 'timestamp':
+            encoding, packed = 'delta', _int_array([stamps[0]] + [b - a for a, b in zip(stamps, stamps[1:])])
+        elif column in LABEL_COLUMNS:
+            labels = sorted(set(values), key=str)
+            codes = {label: code for code, label in enumerate(labels)}
+            header['labels'][column] = labels
+            encoding, packed = 'label', _int_array([codes[value] for value in values])
+        else:
+            encoding, packed = _pack_numbers(values)
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        header['columns'].append([column, encoding, packed.typecode])
+        arrays.append(packed.tobytes())
+    header_bytes = json.dumps(header, separators=(',', ':')).encode()
+    payload = zlib.compress(struct.pack('<I', len(header_bytes)) + header_bytes + b''.join(arrays))
+    return stamps[0], stamps[-1], payload
+
+
+def decode_block(payload):
+    """Unpack a block into ({column: numpy array} plus 'ts', {label column: labels}).
+    Label columns come back as codes; reading_at turns an index into a reading."""
+    data = zlib.decompress(payload)
+    (header_size,) = struct.unpack_from('<I', data)
+    header = json.loads(data[4:4 + header_size])
+    offset = 4 + header_size
+    count = header['count']
+    columns = {}
+    for column, encoding, typecode in header['columns']:
+        values = np.frombuffer(data, dtype=np.dtype(typecode).newbyteorder('<'), count=count, offset=offset)
+        offset += values.nbytes
+        if encoding == 'delta':
+            columns['ts'] = np.cumsum(values, dtype=np.int64)
+        elif encoding == 'tenths':
+            columns[column] = values / 10
+        else:
+            columns[column] = values
+    return columns, header['labels']
+
+
+def reading_at(tag, columns, labels, i):
+    """One decoded reading as a dict keyed like a health_readings row"""
+    reading = {'timestamp': from_epoch(int(columns['ts'][i])), 'animal_tag': tag}
+    for column in BLOCK_COLUMNS[1:]:
+        value = columns[column][i].item()
+        reading[column] = labels[column][value] if column in labels else value
+    return reading
+
+
+def write_blocks(cursor, readings, block_size):
+    """Archive readings (rows with animal_tag and the BLOCK_COLUMNS). Each animal's
+    newest block is topped up first, as long as it ends before the new readings
+    start; the rest go into new blocks of at most block_size readings.
+    Returns the number of blocks written."""
+    by_animal = {}
+    for reading in readings:
+        by_animal.setdefault(reading['animal_tag'], []).append(reading)
+    written = 0
+    for tag, animal_readings in by_animal.items():
+        animal_readings.sort(key=lambda reading: reading['timestamp'])
+        cursor.execute('''
+            SELECT id, last_ts, reading_count, payload FROM health_reading_blocks
+            WHERE animal_tag = ? ORDER BY last_ts DESC LIMIT 1
+        ''', (tag,))
+        block = cursor.fetchone()
+        if block and block['reading_count'] < block_size and \
+                block['last_ts'] <= to_epoch(animal_readings[0]['timestamp']):
+            room = block_size - block['reading_count']
+            columns, labels = decode_block(block['payload'])
+            merged = [reading_at(tag, columns, labels, i) for i in range(block['reading_count'])]
+            merged += animal_readings[:room]
+            animal_readings = animal_readings[room:]
+            first_ts, last_ts, payload = encode_block(merged)
+            cursor.execute('''
+                UPDATE health_reading_blocks SET first_ts = ?, last_ts = ?, reading_count = ?, payload = ?
+                WHERE id = ?
+            ''', (first_ts, last_ts, len(merged), payload, block['id']))
+            written += 1
+        for i in range(0, len(animal_readings), block_size):
+            chunk = animal_readings[i:i + block_size]
+            first_ts, last_ts, payload = encode_block(chunk)
+            cursor.execute('''
+                INSERT INTO health_reading_blocks (animal_tag, first_ts, last_ts, reading_count, payload)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (tag, first_ts, last_ts, len(chunk), payload))
+            written += 1
+    return written
+
+
+def archive_readings(conn, cutoff, batch_size, pause_seconds, block_size, sleep=time.sleep):
+    """Move readings older than cutoff (epoch seconds) from health_readings into blocks of up to
+    block_size readings. Animals are taken one after another in timestamp order,
+    so blocks fill up, with batch_size readings per transaction.
+    Returns (readings moved, batches)."""
+    pending = [row[0] for row in conn.execute('SELECT DISTINCT animal_tag FROM health_readings')]
+    moved = batches = 0
+    while pending:
+        rows = []
+        while pending and len(rows) < batch_size:
+            wanted = batch_size - len(rows)
+            found = conn.execute(SELECT_OLD_READINGS_SQL, (pending[0], cutoff, wanted)).fetchall()
+            rows += found
+            if len(found) < wanted:
+                pending.pop(0)
+        if rows:
+            write_blocks(conn.cursor(), rows, block_size)
+            # One statement for the batch's ids, and one cache version bump for all of them
+            conn.execute('DELETE FROM health_readings WHERE id IN (SELECT value FROM json_each(?))',
+                         (json.dumps([row['id'] for row in rows]),))
+            bump_version(conn, 'readings')
+        conn.commit()
+        moved += len(rows)
+        batches += 1
+        if pending:
+            # Let the readings writer in between batches
+            sleep(pause_seconds)
+    return moved, batches
+
+
+class RowStore:
+    """The hot tier: health_readings, filtered and grouped in SQL"""
+
+    def status_groups(self, cursor, scope, scope_params, start, end):
+        """(animal_tag, status, n, temp_sum, hr_sum, index_sum) per animal and status"""
+        cursor.execute(f'''
+            SELECT animal_tag, status, COUNT(*) AS n,
+                   SUM(body_temp) AS temp_sum, SUM(heart_rate) AS hr_sum, SUM(health_index) AS index_sum
+            FROM health_readings
+            WHERE {scope} AND ts >= ? AND ts < ?
+            GROUP BY animal_tag, status
+        ''', scope_params + (start, end))
+        return [tuple(row) for row in cursor]
+
+    def recent(self, cursor, scope, scope_params, start, end, limit):
+        """The newest limit readings in the range, newest first"""
+        cursor.execute(f'''
+            SELECT timestamp, animal_tag, body_temp, heart_rate, blood_pressure, movement, health_index, status
+            FROM health_readings
+            WHERE {scope} AND ts >= ? AND ts < ?
+            ORDER BY ts DESC
+            LIMIT ?
+        ''', scope_params + (start, end, limit))
+        return cursor.fetchall()
+
+
+class BlockStore:
+    """The cold tier: health_reading_blocks, decoded and filtered with numpy"""
+
+    def _blocks(self, cursor, scope, scope_params, start, end, order=''):
+        """(animal_tag, last_ts, columns, labels, in-range mask) for the blocks overlapping [start, end)"""
+        cursor.execute(f'''
+            SELECT animal_tag, last_ts, payload FROM health_reading_blocks
+            WHERE {scope} AND last_ts >= ? AND first_ts < ?
+            {order}
+        ''', scope_params + (start, end))
+        # Streamed, so recent() reads no further than the blocks it needs
+        for row in cursor:
+            columns, labels = decode_block(row['payload'])
+            mask = (columns['ts'] >= start) & (columns['ts'] < end)
+            yield row['animal_tag'], row['last_ts'], columns, labels, mask
+
+    def status_groups(self, cursor, scope, scope_params, start, end):
+        groups = {}
+        for tag, _, columns, labels, mask in self._blocks(cursor, scope, scope_params, start, end):
+            codes = columns['status'][mask]
+            size = len(labels['status'])
+            counts = np.bincount(codes, minlength=size)
+            sums = [np.bincount(codes, weights=columns[column][mask], minlength=size)
+                    for column in ('body_temp', 'heart_rate', 'health_index')]
+            for code in np.flatnonzero(counts):
+                group = groups.setdefault((tag, labels['status'][code]), [0, 0.0, 0.0, 0.0])
+                group[0] += int(counts[code])
+                for i, column_sums in enumerate(sums, 1):
+                    group[i] += float(column_sums[code])
+        return [(tag, status, *sums) for (tag, status), sums in groups.items()]
+
+    def recent(self, cursor, scope, scope_params, start, end, limit):
+        newest = []
+        # Newest blocks first: stop once the next block ends before everything kept
+        for tag, last_ts, columns, labels, mask in self._blocks(cursor, scope, scope_params, start, end,
+                                                                'ORDER BY last_ts DESC'):
+            if len(newest) >= limit and newest[limit - 1][0] >= last_ts:
+                break
+            indexes = np.flatnonzero(mask)
+            # Blocks are stored oldest first, so the block's newest are at the end
+            newest.extend((int(columns['ts'][i]), reading_at(tag, columns, labels, i)) for i in indexes[-limit:])
+            newest.sort(key=lambda item: item[0], reverse=True)
+            del newest[limit:]
+        return [reading for _, reading in newest]
+
+
+class ReadingRepository:
+    """Report queries over every storage tier. scope is an SQL condition on
+    animal_tag (with scope_params); [start, end) are epoch seconds."""
+
+    def __init__(self, stores=None):
+        self.stores = stores if stores is not None else [RowStore(), BlockStore()]
+
+    def status_groups(self, cursor, scope, scope_params, start, end):
+        groups = []
+        for store in self.stores:
+            groups.extend(store.status_groups(cursor, scope, scope_params, start, end))
+        return groups
+
+    def recent(self, cursor, scope, scope_params, start, end, limit):
+        readings = []
+        for store in self.stores:
+            readings.extend(store.recent(cursor, scope, scope_params, start, end, limit))
+        return heapq.nlargest(limit, readings, key=lambda reading: reading['timestamp'])
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import Config
+    from db import get_db
+    from retention import vacuum_free_pages
+
+    parser = argparse.ArgumentParser(description='Move old health readings into compact archive blocks')
+    parser.add_argument('--older-than', type=int, default=Config.READING_RETENTION_DAYS, metavar='DAYS',
+                        help='archive readings older than this many days (0 archives everything)')
+    args = parser.parse_args()
+    conn = get_db()
+    cutoff = to_epoch(datetime.now() - timedelta(days=args.older_than))
+    start = time.perf_counter()
+    moved, batches = archive_readings(conn, cutoff, Config.RETENTION_DELETE_BATCH, 0,
+                                      Config.READING_ARCHIVE_BLOCK_SIZE)
+    released = vacuum_free_pages(conn, Config.RETENTION_VACUUM_PAGES, 0)
+    print(f"[{datetime.now()}] Archived {moved} readings in {batches} batches, "
+          f"released {released} pages in {time.perf_counter() - start:.1f} s")
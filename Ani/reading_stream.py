@@ -0,0 +1,190 @@
+"""
+Live reading stream (Server-Sent Events).
+One poller thread per process watches health_readings for newly committed
+rows and fans each batch out to the subscribers of the users who own the
+animals. A scheduler commit therefore costs one query per worker process
+no matter how many dashboards are open. The process that ran the cycle
+calls notify() after committing so its own subscribers don't wait for the
+next poll.
+"""
+import json
+import queue
+import threading
+from datetime import datetime
+
+from config import Config
+from db import get_db
+from readings import get_consecutive_summary
+
+
+class Subscription:
+    """One SSE client: a bounded queue of (event, data) for a single user"""
+
+    def __init__(self, user_email, max_events):
+        self.user_email = user_email
+        self.events = queue.Queue(maxsize=max_events)
+
+    def get(self, timeout):
+        """Next (event, data); raises queue.Empty on timeout. event is None once closed."""
+        return self.events.get(timeout=timeout)
+
+    def close(self):
+        # Make room so the close marker always fits
+        try:
+            while True:
+                self.events.get_nowait()
+        except queue.Empty:
+            pass
+        self.events.put_nowait((None, None))
+
+
+def format_event(event, data):
+    """Encode one SSE message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class ReadingBroker:
+    """Fan-out from committed readings to per-user subscriptions"""
+
+    def __init__(self, poll_seconds=Config.STREAM_POLL_SECONDS, max_events=20):
+        self.poll_seconds = poll_seconds
+        self.max_events = max_events
+        self._subscribers = {}  # user_email -> set of Subscription
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._last_id = None
+
+    def subscribe(self, user_email):
+        subscription = Subscription(user_email, self.max_events)
+        with self._lock:
+            self._subscribers.setdefault(user_email, set()).add(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='reading-broker', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_email)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_email]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def notify(self):
+        """Wake the poller now (called after this process commits new readings)"""
+        self._wake.set()
+
+    def publish(self, user_email, event, data):
+        """Queue an event for every subscription of one user.
+        A client too slow to keep up is closed; it reconnects and reloads."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_email, ()))
+        for subscription in subscribers:
+            try:
+                subscription.events.put_nowait((event, data))
+            except queue.Full:
+                self.unsubscribe(subscription)
+                subscription.close()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"[{datetime.now()}] Reading stream poll failed: {e}")
+
+    def poll(self):
+        """Publish readings committed since the last poll. Returns how many were published."""
+        with self._poll_lock:
+            return self._poll()
+
+    def _poll(self):
+        with self._lock:
+            user_emails = list(self._subscribers)
+        conn = get_db()
+        cursor = conn.cursor()
+        max_id = cursor.execute('SELECT COALESCE(MAX(id), 0) FROM health_readings').fetchone()[0]
+        if self._last_id is None or max_id < self._last_id:
+            # First poll (or the table was rebuilt): start from here
+            self._last_id = max_id
+            return 0
+        if max_id == self._last_id or not user_emails:
+            self._last_id = max_id
+            return 0
+
+        placeholders = ','.join('?' * len(user_emails))
+        cursor.execute(f'''
+            SELECT hr.id, hr.animal_tag, hr.heart_rate, hr.body_temp, hr.blood_pressure, hr.movement,
+                   hr.health_index, hr.status, hr.timestamp, a.user_email
+            FROM health_readings hr
+            JOIN animals a ON a.tag = hr.animal_tag
+            WHERE hr.id > ? AND hr.id <= ? AND a.user_email IN ({placeholders})
+            ORDER BY hr.id
+        ''', [self._last_id, max_id] + user_emails)
+        rows = cursor.fetchall()
+        self._last_id = max_id
+
+        # Group per user; the consecutive check and status change look at each animal's newest reading
+        by_user = {}
+        latest = {}
+        first_ids = {}
+        for row in rows:
+            reading = {key: row[key] for key in ('animal_tag', 'heart_rate', 'body_temp', 'blood_pressure',
+                                                 'movement', 'health_index', 'status', 'timestamp')}
+            by_user.setdefault(row['user_email'], []).append(reading)
+            latest[row['animal_tag']] = reading
+            first_ids.setdefault(row['animal_tag'], row['id'])
+
+        consecutive = {}
+        status_changes = {}
+        for animal_tag, reading in latest.items():
+            consecutive[animal_tag] = get_consecutive_summary(cursor, animal_tag)
+            # The status before this batch, to report status changes
+            cursor.execute('''
+                SELECT status FROM health_readings
+                WHERE animal_tag = ? AND id < ?
+                ORDER BY ts DESC, id DESC LIMIT 1
+            ''', (animal_tag, first_ids[animal_tag]))
+            previous = cursor.fetchone()
+            previous_status = previous['status'] if previous else None
+            if previous_status != reading['status']:
+                status_changes[animal_tag] = {
+                    'animal_tag': animal_tag,
+                    'status': reading['status'],
+                    'previous_status': previous_status,
+                    'health_index': reading['health_index'],
+                    'timestamp': reading['timestamp']
+                }
+
+        # Lets the dashboard countdown resync without polling /api/next-reading-time
+        interval = Config.SCHEDULER_INTERVAL_MINUTES * 60
+        try:
+            elapsed = (datetime.now() - datetime.strptime(rows[-1]['timestamp'], '%Y-%m-%d %H:%M:%S')).total_seconds()
+            next_reading_in = max(0, int(interval - elapsed))
+        except (TypeError, ValueError):
+            next_reading_in = interval
+
+        for user_email, readings in by_user.items():
+            tags = {reading['animal_tag'] for reading in readings}
+            self.publish(user_email, 'readings', {
+                'readings': readings,
+                'consecutive': {tag: consecutive[tag] for tag in tags},
+                'next_reading_in': next_reading_in
+            })
+            changes = [status_changes[tag] for tag in tags if tag in status_changes]
+            if changes:
+                self.publish(user_email, 'status', {'changes': changes})
+        return len(rows)
+
+
+# Process-wide broker used by /api/stream/readings
+reading_broker = ReadingBroker()
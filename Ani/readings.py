@@ -0,0 +1,184 @@
+"""
+Health reading persistence.
+Every insert into health_readings goes through here so the derived
+latest_health_reading and hourly/daily rollup tables are upserted in the
+same transaction, along with the 'readings' version that invalidates
+cached API responses (see response_cache.py). The caller owns the
+transaction and commits.
+"""
+from response_cache import bump_version
+
+# health_readings.ts: the timestamp as whole seconds since 1970 (the stored text
+# is read as UTC, as reading_store.to_epoch does). Generated by SQLite from the
+# text column, so every insert path keeps it in step; time filters and ordering
+# use it through the (animal_tag, ts) index instead of parsing text per row.
+READING_TS_COLUMN = "ts INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', timestamp) AS INTEGER)) VIRTUAL"
+
+INSERT_READING_SQL = '''
+    INSERT INTO health_readings (animal_tag, heart_rate, body_temp, blood_pressure, movement, health_index, status, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Only move the latest row forward; an out-of-order insert must not replace a newer reading
+UPSERT_LATEST_SQL = '''
+    INSERT INTO latest_health_reading (animal_tag, reading_id, heart_rate, body_temp, blood_pressure, movement, health_index, status, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(animal_tag) DO UPDATE SET
+        reading_id = excluded.reading_id,
+        heart_rate = excluded.heart_rate,
+        body_temp = excluded.body_temp,
+        blood_pressure = excluded.blood_pressure,
+        movement = excluded.movement,
+        health_index = excluded.health_index,
+        status = excluded.status,
+        timestamp = excluded.timestamp
+    WHERE excluded.timestamp >= latest_health_reading.timestamp
+'''
+
+# Rollup table -> strftime format of its bucket key
+ROLLUP_TABLES = [
+    ('health_rollup_hourly', '%Y-%m-%d %H:00:00'),
+    ('health_rollup_daily', '%Y-%m-%d'),
+]
+
+# Fold the readings selected by {where} into a rollup table: counts and sums
+# add up, minimums and maximums are merged. The WHERE clause is required for
+# an upsert from a SELECT (it keeps ON from parsing as a join constraint).
+# NOT INDEXED keeps the planner on the rowid range: left alone it walks the
+# whole (animal_tag, ts) index to skip sorting for the GROUP BY.
+UPSERT_ROLLUP_SQL = '''
+    INSERT INTO {table} (animal_tag, bucket, reading_count,
+                         index_sum, index_min, index_max,
+                         temp_sum, temp_min, temp_max,
+                         hr_sum, hr_min, hr_max)
+    SELECT animal_tag, strftime('{bucket}', timestamp), COUNT(*),
+           SUM(health_index), MIN(health_index), MAX(health_index),
+           SUM(body_temp), MIN(body_temp), MAX(body_temp),
+           SUM(heart_rate), MIN(heart_rate), MAX(heart_rate)
+    FROM health_readings NOT INDEXED
+    WHERE {where} AND timestamp IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT(animal_tag, bucket) DO UPDATE SET
+        reading_count = reading_count + excluded.reading_count,
+        index_sum = index_sum + excluded.index_sum,
+        index_min = MIN(index_min, excluded.index_min),
+        index_max = MAX(index_max, excluded.index_max),
+        temp_sum = temp_sum + excluded.temp_sum,
+        temp_min = MIN(temp_min, excluded.temp_min),
+        temp_max = MAX(temp_max, excluded.temp_max),
+        hr_sum = hr_sum + excluded.hr_sum,
+        hr_min = MIN(hr_min, excluded.hr_min),
+        hr_max = MAX(hr_max, excluded.hr_max)
+'''
+
+
+def _update_rollups(cursor, where, params):
+    for table, bucket in ROLLUP_TABLES:
+        cursor.execute(UPSERT_ROLLUP_SQL.format(table=table, bucket=bucket, where=where), params)
+
+
+def save_health_reading(cursor, animal_tag, heart_rate, body_temp, blood_pressure, movement, health_index, status, timestamp):
+    """Insert a reading and refresh the animal's latest reading. Returns the new reading id."""
+    cursor.execute(INSERT_READING_SQL, (
+        animal_tag, heart_rate, body_temp, blood_pressure, movement, health_index, status, timestamp
+    ))
+    reading_id = cursor.lastrowid
+    cursor.execute(UPSERT_LATEST_SQL, (
+        animal_tag, reading_id, heart_rate, body_temp, blood_pressure, movement, health_index, status, timestamp
+    ))
+    _update_rollups(cursor, 'id = ?', (reading_id,))
+    bump_version(cursor, 'readings')
+    return reading_id
+
+
+def save_health_readings(cursor, rows):
+    """
+    Insert many readings with one executemany and refresh the latest readings.
+    rows: (animal_tag, heart_rate, body_temp, blood_pressure, movement, health_index, status, timestamp) tuples
+    """
+    if not rows:
+        return 0
+    # The first insert takes the write lock until the caller commits, so every
+    # id from it on is one of these rows, however the ids are spaced
+    cursor.execute(INSERT_READING_SQL, rows[0])
+    first_id = cursor.lastrowid
+    cursor.executemany(INSERT_READING_SQL, rows[1:])
+    cursor.execute('''
+        INSERT INTO latest_health_reading (animal_tag, reading_id, heart_rate, body_temp, blood_pressure, movement, health_index, status, timestamp)
+        SELECT animal_tag, id, heart_rate, body_temp, blood_pressure, movement, health_index, status, timestamp
+        FROM health_readings
+        WHERE id >= ?
+        ORDER BY id
+        ON CONFLICT(animal_tag) DO UPDATE SET
+            reading_id = excluded.reading_id,
+            heart_rate = excluded.heart_rate,
+            body_temp = excluded.body_temp,
+            blood_pressure = excluded.blood_pressure,
+            movement = excluded.movement,
+            health_index = excluded.health_index,
+            status = excluded.status,
+            timestamp = excluded.timestamp
+        WHERE excluded.timestamp >= latest_health_reading.timestamp
+    ''', (first_id,))
+    _update_rollups(cursor, 'id >= ?', (first_id,))
+    bump_version(cursor, 'readings')
+    return len(rows)
+
+
+def get_latest_reading(cursor, animal_tag):
+    """Get the most recent reading for an animal (or None) without touching health_readings"""
+    cursor.execute('SELECT * FROM latest_health_reading WHERE animal_tag = ?', (animal_tag,))
+    return cursor.fetchone()
+
+
+def rebuild_latest_readings(cursor):
+    """Backfill latest_health_reading from health_readings (used by the init_db migration)"""
+    cursor.execute('DELETE FROM latest_health_reading')
+    cursor.execute('''
+        INSERT INTO latest_health_reading (animal_tag, reading_id, heart_rate, body_temp, blood_pressure, movement, health_index, status, timestamp)
+        SELECT animal_tag, id, heart_rate, body_temp, blood_pressure, movement, health_index, status, timestamp
+        FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY animal_tag ORDER BY ts DESC, id DESC) as rn
+            FROM health_readings
+        ) WHERE rn = 1
+    ''')
+    return cursor.rowcount
+
+
+def rebuild_rollups(cursor):
+    """Recompute the rollup tables from health_readings (used by the init_db migration).
+    Returns the number of hourly buckets."""
+    for table, _ in ROLLUP_TABLES:
+        cursor.execute(f'DELETE FROM {table}')
+    _update_rollups(cursor, '1', ())
+    cursor.execute('SELECT COUNT(*) FROM health_rollup_hourly')
+    return cursor.fetchone()[0]
+
+
+def get_consecutive_summary(cursor, animal_tag):
+    """
+    Summarise an animal's last 3 readings for consecutive-status alerts.
+    Returns {'has_consecutive': False} or the common status with averages.
+    """
+    cursor.execute('''
+        SELECT status, health_index, body_temp, heart_rate FROM health_readings 
+        WHERE animal_tag = ? 
+        ORDER BY ts DESC 
+        LIMIT 3
+    ''', (animal_tag,))
+    rows = cursor.fetchall()
+    
+    if len(rows) < 3:
+        return {'has_consecutive': False, 'reason': 'Not enough readings'}
+    
+    # All 3 readings have the same status - report it with the averages
+    statuses = [row['status'] for row in rows]
+    if statuses[0] == statuses[1] == statuses[2]:
+        return {
+            'has_consecutive': True,
+            'consecutive_status': statuses[0],
+            'avg_health_index': round(sum(row['health_index'] for row in rows) / 3, 1),
+            'avg_temp': round(sum(row['body_temp'] for row in rows) / 3, 1),
+            'avg_heart_rate': round(sum(row['heart_rate'] for row in rows) / 3)
+        }
+    return {'has_consecutive': False}
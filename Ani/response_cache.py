@@ -0,0 +1,191 @@
+"""
+Response cache for the dashboard's polled read APIs.
+The same sessions poll /api/animals, /api/animals/status,
+/api/health-readings/all, /api/notifications/unread and /api/vet/stats, and
+their data only changes when the scheduler or a write endpoint commits.
+Responses are cached per (endpoint, user, args) together with the versions
+of the data scopes they read, and served while those versions are unchanged.
+
+The versions live in the cache_versions table and move in the same
+transaction as the write, so every worker process sees them:
+  - triggers bump them for animals, notifications and appointment_queue
+    (see VERSION_TRIGGERS), whoever writes;
+  - 'readings' is bumped with bump_version once per statement by whatever
+    inserts or deletes readings (readings.py, retention, the archive and the
+    cleanups), as a per-row trigger would double the cost of the scheduler's
+    batch insert. Readings must be inserted through readings.py anyway to keep
+    the latest and rollup tables right.
+
+Each lookup reads the versions first (one primary key query), so a cached
+body is never served after a change has committed. Entries are evicted least
+recently used and expire after a TTL. Responses carry an ETag; a request with
+a matching If-None-Match gets an empty 304. Per process.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+from config import Config
+from db import get_db
+
+BUMP_VERSION_SQL = '''
+    INSERT INTO cache_versions (scope, version) VALUES (?, 1)
+    ON CONFLICT(scope) DO UPDATE SET version = version + 1
+'''
+
+# (table, events, scope as an SQL expression over {row}, the NEW or OLD row)
+VERSION_TRIGGERS = [
+    ('animals', ('INSERT', 'UPDATE', 'DELETE'), "'animals:' || COALESCE({row}.user_email, '')"),
+    ('notifications', ('INSERT', 'UPDATE', 'DELETE'), "'notifications:' || COALESCE({row}.user_email, '')"),
+    ('appointment_queue', ('INSERT', 'UPDATE', 'DELETE'), "'appointments'"),
+]
+
+# Replaced by per-statement bumps from Python; dropped from existing databases
+DROPPED_TRIGGERS = ['cache_version_health_readings_delete']
+
+# The rows a trigger sees for each event; an UPDATE may move a row between users
+TRIGGER_ROWS = {'INSERT': ('NEW',), 'UPDATE': ('OLD', 'NEW'), 'DELETE': ('OLD',)}
+
+
+def create_version_triggers(cursor):
+    """Create the cache_versions table and the triggers that keep it current"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    for trigger in DROPPED_TRIGGERS:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    for table, events, scope in VERSION_TRIGGERS:
+        for event in events:
+            bumps = ''.join(f'''
+                INSERT INTO cache_versions (scope, version) VALUES ({scope.format(row=row)}, 1)
+                ON CONFLICT(scope) DO UPDATE SET version = version + 1;'''
+                            for row in TRIGGER_ROWS[event])
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS cache_version_{table}_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN{bumps}
+                END
+            ''')
+
+
+def bump_version(cursor, scope):
+    """Invalidate cached responses that read scope, in the caller's transaction"""
+    cursor.execute(BUMP_VERSION_SQL, (scope,))
+
+
+def read_versions(conn, scopes):
+    """Current version of each scope, in order (0 for a scope never written)"""
+    placeholders = ','.join('?' * len(scopes))
+    rows = dict(conn.execute(f'SELECT scope, version FROM cache_versions WHERE scope IN ({placeholders})',
+                             scopes).fetchall())
+    return tuple(rows.get(scope, 0) for scope in scopes)
+
+
+class ResponseCache:
+    """LRU + TTL cache of JSON response bodies, valid while their scope versions hold"""
+
+    def __init__(self, max_entries=Config.RESPONSE_CACHE_SIZE, ttl_seconds=Config.RESPONSE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, versions, body, etag)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, versions):
+        """Return (body, etag), or None on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            elif entry is not None and entry[1] != versions:
+                del self._entries[key]
+                self.invalidations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2], entry[3]
+
+    def put(self, key, versions, body, etag):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, versions, body, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def cached(self, *scopes, login='user', identity='user_email'):
+        """Decorate a JSON view reading the given data scopes, where '{user}' stands
+        for the session's identity value. Responses are cached per identity, and only
+        while the view's login key is in the session; the view answers the rest itself."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                user = session.get(identity)
+                if login not in session or user is None or self.max_entries <= 0:
+                    return view(*args, **kwargs)
+                key = (request.endpoint, user, tuple(sorted(request.args.items(multi=True))),
+                       tuple(sorted(kwargs.items())))
+                # Versions before the body: a write landing in between only wastes the entry
+                versions = read_versions(get_db(), [scope.format(user=user) for scope in scopes])
+                entry = self.get(key, versions)
+                if entry is None:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    response.add_etag()
+                    self.put(key, versions, response.get_data(), response.get_etag()[0])
+                    response.headers['X-Cache'] = 'MISS'
+                else:
+                    body, etag = entry
+                    response = current_app.response_class(body, mimetype='application/json')
+                    response.set_etag(etag)
+                    response.headers['X-Cache'] = 'HIT'
+                # Browsers keep the body but revalidate every time, which costs a 304
+                response.headers['Cache-Control'] = 'private, no-cache'
+                response.make_conditional(request)
+                if response.status_code == 304:
+                    with self._lock:
+                        self.not_modified += 1
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'not_modified': self.not_modified,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
@@ -0,0 +1,149 @@
+"""
+Retention for health readings.
+Raw readings older than READING_RETENTION_DAYS leave health_readings; their
+history lives on in the hourly and daily rollups, which readings.py fills on
+every insert, so the data is already downsampled when the raw rows go. With
+READING_ARCHIVE on, the raw readings themselves are kept too, packed into the
+compact archive blocks of reading_store.py. Hourly rollups are trimmed after
+HOURLY_ROLLUP_RETENTION_DAYS; daily rollups stay.
+
+Rows are deleted in batches of RETENTION_DELETE_BATCH, each in its own short
+transaction with a pause in between, so the scheduler's readings writer
+never waits long for the lock. Afterwards the freed pages are returned to the
+filesystem with PRAGMA incremental_vacuum, again in bounded steps.
+
+Incremental vacuum needs auto_vacuum=INCREMENTAL, which db.py sets on new
+databases. An existing database is converted once, offline, with:
+    python retention.py --vacuum
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from config import Config
+from db import get_db
+from reading_store import archive_readings, to_epoch
+from response_cache import bump_version
+
+# auto_vacuum values reported by the PRAGMA
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+
+def _delete_in_batches(conn, sql, params, batch_size, pause_seconds, sleep, version_scope=None):
+    """Run a DELETE ... LIMIT-style statement until it removes less than a batch,
+    bumping version_scope once in each batch that deleted something.
+    Returns (rows deleted, batches)."""
+    deleted = batches = 0
+    while True:
+        cursor = conn.execute(sql, params + (batch_size,))
+        if version_scope and cursor.rowcount:
+            bump_version(conn, version_scope)
+        conn.commit()
+        deleted += cursor.rowcount
+        batches += 1
+        if cursor.rowcount < batch_size:
+            return deleted, batches
+        # Let the readings writer in between batches
+        sleep(pause_seconds)
+
+
+def _pragma(conn, name):
+    return conn.execute(f'PRAGMA {name}').fetchone()[0]
+
+
+def vacuum_free_pages(conn, step_pages, pause_seconds, sleep=time.sleep):
+    """Give free pages back to the filesystem, step_pages at a time.
+    Returns the number of pages released (0 unless auto_vacuum is incremental)."""
+    if _pragma(conn, 'auto_vacuum') != 2:
+        return 0
+    # Only the pages free now: concurrent writers keep freeing a few more
+    target = _pragma(conn, 'freelist_count')
+    released = 0
+    while released < target:
+        free = _pragma(conn, 'freelist_count')
+        # executescript steps the pragma to completion; execute() frees a single page
+        conn.executescript(f'PRAGMA incremental_vacuum({min(step_pages, target - released)});')
+        step = free - _pragma(conn, 'freelist_count')
+        if step <= 0:
+            break
+        released += step
+        sleep(pause_seconds)
+    return released
+
+
+def run_retention(now=None, config=Config, sleep=time.sleep):
+    """Apply the retention policy once and return a report of what it did"""
+    now = now or datetime.now()
+    conn = get_db()
+    start = time.perf_counter()
+    page_size = _pragma(conn, 'page_size')
+    pages_before = _pragma(conn, 'page_count')
+    report = {'deleted_readings': 0, 'archived_readings': 0, 'deleted_hourly_rollups': 0, 'batches': 0}
+
+    if config.READING_RETENTION_DAYS > 0:
+        cutoff = to_epoch(now - timedelta(days=config.READING_RETENTION_DAYS))
+        if config.READING_ARCHIVE:
+            deleted, batches = archive_readings(conn, cutoff, config.RETENTION_DELETE_BATCH,
+                                                config.RETENTION_BATCH_PAUSE_SECONDS,
+                                                config.READING_ARCHIVE_BLOCK_SIZE, sleep)
+            report['archived_readings'] = deleted
+        else:
+            deleted, batches = _delete_in_batches(conn, '''
+                DELETE FROM health_readings WHERE id IN (
+                    SELECT id FROM health_readings WHERE ts < ? LIMIT ?
+                )
+            ''', (cutoff,), config.RETENTION_DELETE_BATCH, config.RETENTION_BATCH_PAUSE_SECONDS, sleep,
+                version_scope='readings')
+        report['deleted_readings'] = deleted
+        report['batches'] += batches
+
+    if config.HOURLY_ROLLUP_RETENTION_DAYS > 0:
+        cutoff = (now - timedelta(days=config.HOURLY_ROLLUP_RETENTION_DAYS)).strftime('%Y-%m-%d %H:00:00')
+        deleted, batches = _delete_in_batches(conn, '''
+            DELETE FROM health_rollup_hourly WHERE (animal_tag, bucket) IN (
+                SELECT animal_tag, bucket FROM health_rollup_hourly WHERE bucket < ? LIMIT ?
+            )
+        ''', (cutoff,), config.RETENTION_DELETE_BATCH, config.RETENTION_BATCH_PAUSE_SECONDS, sleep)
+        report['deleted_hourly_rollups'] = deleted
+        report['batches'] += batches
+
+    free_pages = _pragma(conn, 'freelist_count')
+    released = vacuum_free_pages(conn, config.RETENTION_VACUUM_PAGES, config.RETENTION_BATCH_PAUSE_SECONDS, sleep)
+    pages_after = _pragma(conn, 'page_count')
+    report.update({
+        'auto_vacuum': AUTO_VACUUM_MODES.get(_pragma(conn, 'auto_vacuum'), 'unknown'),
+        'free_pages': free_pages,
+        'reclaimed_pages': released,
+        'reclaimed_bytes': released * page_size,
+        'pages_before': pages_before,
+        'pages_after': pages_after,
+        'seconds': round(time.perf_counter() - start, 3),
+    })
+
+    print(f"[{datetime.now()}] Retention: deleted {report['deleted_readings']} readings "
+          f"({report['archived_readings']} archived) and "
+          f"{report['deleted_hourly_rollups']} hourly rollups in {report['batches']} batches, "
+          f"reclaimed {released} pages ({released * page_size / 1024 / 1024:.1f} MB) "
+          f"in {report['seconds']:.1f} s")
+    if report['auto_vacuum'] != 'incremental' and free_pages:
+        print(f"[{datetime.now()}] Retention: {free_pages} free pages will be reused but the file won't shrink; "
+              f"run `python retention.py --vacuum` once to enable incremental vacuum")
+    return report
+
+
+def convert_to_incremental_vacuum():
+    """Rebuild the database with auto_vacuum=INCREMENTAL (a full VACUUM: run it offline)"""
+    conn = get_db()
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+    return AUTO_VACUUM_MODES.get(_pragma(conn, 'auto_vacuum'), 'unknown')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Apply the health reading retention policy')
+    parser.add_argument('--vacuum', action='store_true',
+                        help='convert the database to incremental auto-vacuum first (full VACUUM)')
+    args = parser.parse_args()
+    if args.vacuum:
+        print(f"[{datetime.now()}] auto_vacuum is now {convert_to_incremental_vacuum()}")
+    print(run_retention())
@@ -0,0 +1,98 @@
+"""
+Scheduler leadership across worker processes.
+Every gunicorn worker runs a scheduler, but only the holder of a lease row
+in SQLite runs the readings job. The holder renews the lease on every
+heartbeat; if it dies the lease expires and the next worker to heartbeat
+takes over. Each cycle is also claimed against the lease row, so even a
+leader change can't run two cycles in one interval. The scheduler_lease
+table is created by init_db (see schema.py).
+The same table holds the reading_cycle lease that every reading cycle,
+scheduled or triggered, takes for its duration (see wait()).
+"""
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+
+from db import get_db
+
+# Take the lease if it is free, ours, or expired; otherwise leave it alone
+ACQUIRE_SQL = '''
+    INSERT INTO scheduler_lease (name, holder, expires_at)
+    VALUES (?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET
+        holder = excluded.holder,
+        expires_at = excluded.expires_at
+    WHERE scheduler_lease.holder = excluded.holder OR scheduler_lease.expires_at < ?
+'''
+
+
+class SchedulerLease:
+    """A named lease held by one process at a time"""
+
+    def __init__(self, name, ttl_seconds):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+
+    def acquire(self):
+        """Take or renew the lease. Returns True while this process is the leader."""
+        conn = get_db()
+        try:
+            now = time.time()
+            cursor = conn.execute(ACQUIRE_SQL, (self.name, self.holder, now + self.ttl_seconds, now))
+            conn.commit()
+            leader = cursor.rowcount == 1
+        except Exception as e:
+            conn.rollback()
+            print(f"[{datetime.now()}] Could not renew scheduler lease: {e}")
+            leader = False
+
+        if leader != self.is_leader:
+            print(f"[{datetime.now()}] {self.holder} {'took' if leader else 'lost'} the {self.name} lease")
+        self.is_leader = leader
+        return leader
+
+    def wait(self, timeout_seconds, poll_seconds=0.25):
+        """Acquire the lease, waiting for the holder to release it or let it expire.
+        Returns False if it is still held elsewhere after timeout_seconds."""
+        deadline = time.monotonic() + timeout_seconds
+        while not self.acquire():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_seconds)
+        return True
+
+    def claim_run(self, interval_seconds, slack_seconds=0):
+        """Claim the next cycle. Returns True if this leader should run it now;
+        False if it isn't the leader or a cycle already ran this interval."""
+        conn = get_db()
+        try:
+            now = time.time()
+            cursor = conn.execute('''
+                UPDATE scheduler_lease SET last_run_at = ?
+                WHERE name = ? AND holder = ? AND expires_at >= ?
+                AND (last_run_at IS NULL OR last_run_at <= ?)
+            ''', (now, self.name, self.holder, now, now - interval_seconds + slack_seconds))
+            conn.commit()
+            return cursor.rowcount == 1
+        except Exception as e:
+            conn.rollback()
+            print(f"[{datetime.now()}] Could not claim scheduler cycle: {e}")
+            return False
+
+    def release(self):
+        """Give the lease up (on shutdown) so another worker takes over at its next heartbeat"""
+        if not self.is_leader:
+            return
+        conn = get_db()
+        try:
+            conn.execute('UPDATE scheduler_lease SET expires_at = 0 WHERE name = ? AND holder = ?',
+                         (self.name, self.holder))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"[{datetime.now()}] Could not release scheduler lease: {e}")
+        self.is_leader = False
@@ -0,0 +1,391 @@
+"""
+Database schema: creating and migrating every table and index.
+Kept apart from app.py so gunicorn's master can migrate the database without
+importing the Flask app, the scheduler or the image model.
+"""
+import os
+import sqlite3
+from datetime import datetime
+
+import db
+from db import get_db
+from readings import rebuild_latest_readings, rebuild_rollups, ROLLUP_TABLES, READING_TS_COLUMN
+from response_cache import create_version_triggers
+from simulator_state import rebuild_simulator_state
+from user import init_animals_table
+
+# Composite indexes for the hot dashboard and vet queries (created by init_db)
+DB_INDEXES = [
+    ('idx_health_readings_tag_ts', 'health_readings(animal_tag, ts)'),
+    ('idx_health_reading_blocks_tag_time', 'health_reading_blocks(animal_tag, last_ts)'),
+    ('idx_notifications_user_read_created', 'notifications(user_email, is_read, created_at)'),
+    ('idx_appointment_queue_status_priority_time', 'appointment_queue(status, priority, appointment_time)'),
+    ('idx_treatment_history_vet_date', 'treatment_history(vet_email, treated_date)'),
+    ('idx_confirmed_appointments_vet', 'confirmed_appointments(vet_email)'),
+    ('idx_simulator_state_seq', 'simulator_state(seq)'),
+    ('idx_reading_jobs_user_created', 'reading_jobs(user_email, created_at)'),
+]
+
+
+def init_db():
+    # Initialize users.db
+    schema_path = os.path.join(os.path.dirname(__file__), 'schema.sql')
+    if not os.path.exists(db.DB_PATH):
+        conn1 = get_db()
+        if os.path.exists(schema_path):
+            with open(schema_path) as f:
+                conn1.executescript(f.read())
+        conn1.commit()
+    else:
+        # Add missing columns/tables if they don't exist
+        conn1 = get_db()
+        cursor1 = conn1.cursor()
+        try:
+            cursor1.execute("ALTER TABLE users ADD COLUMN age INTEGER")
+            conn1.commit()
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        try:
+            cursor1.execute("ALTER TABLE users ADD COLUMN gender TEXT")
+            conn1.commit()
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        
+        # Add is_active column to animals table if it doesn't exist
+        try:
+            cursor1.execute("ALTER TABLE animals ADD COLUMN is_active INTEGER DEFAULT 1")
+            conn1.commit()
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        
+        # Create animals table if it doesn't exist
+        cursor1.execute('''
+            CREATE TABLE IF NOT EXISTS animals (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tag TEXT NOT NULL UNIQUE,
+                name TEXT NOT NULL,
+                species TEXT NOT NULL,
+                weight REAL,
+                age INTEGER,
+                gender TEXT,
+                user_email TEXT NOT NULL,
+                date_added TEXT DEFAULT CURRENT_TIMESTAMP,
+                is_active INTEGER DEFAULT 1,
+                FOREIGN KEY (user_email) REFERENCES users(email)
+            )
+        ''')
+        
+        # Create health_readings table if it doesn't exist
+        cursor1.execute(f'''
+            CREATE TABLE IF NOT EXISTS health_readings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                animal_tag TEXT NOT NULL,
+                heart_rate REAL NOT NULL,
+                body_temp REAL NOT NULL,
+                blood_pressure INTEGER NOT NULL,
+                movement TEXT NOT NULL,
+                health_index REAL NOT NULL,
+                status TEXT NOT NULL,
+                timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+                {READING_TS_COLUMN},
+                FOREIGN KEY (animal_tag) REFERENCES animals(tag)
+            )
+        ''')
+        
+        # Migration: add the epoch-seconds ts column to older databases
+        try:
+            cursor1.execute(f"ALTER TABLE health_readings ADD COLUMN {READING_TS_COLUMN}")
+            conn1.commit()
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        
+        # Create removed_animals_history table if it doesn't exist
+        cursor1.execute('''
+            CREATE TABLE IF NOT EXISTS removed_animals_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                animal_tag TEXT NOT NULL,
+                animal_name TEXT NOT NULL,
+                species TEXT NOT NULL,
+                user_email TEXT NOT NULL,
+                removed_date TEXT DEFAULT CURRENT_TIMESTAMP,
+                last_temp REAL,
+                last_heart_rate REAL,
+                last_health_status TEXT,
+                last_health_index REAL
+            )
+        ''')
+        
+        # Create admin table if it doesn't exist
+        cursor1.execute('''
+            CREATE TABLE IF NOT EXISTS admin (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL UNIQUE,
+                password TEXT NOT NULL,
+                full_name TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Insert admin account if it doesn't exist
+        cursor1.execute("INSERT OR IGNORE INTO admin (username, password, full_name) VALUES (?, ?, ?)",
+                       ('Nikhil_jaroli', '8288', 'Admin'))
+        
+        # Create notifications table if it doesn't exist
+        cursor1.execute('''
+            CREATE TABLE IF NOT EXISTS notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_email TEXT NOT NULL,
+                animal_tag TEXT,
+                title TEXT NOT NULL,
+                message TEXT NOT NULL,
+                notification_type TEXT DEFAULT 'info',
+                is_read INTEGER DEFAULT 0,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_email) REFERENCES users(email)
+            )
+        ''')
+        
+        # Create appointment queue table if it doesn't exist
+        cursor1.execute('''
+            CREATE TABLE IF NOT EXISTS appointment_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                animal_tag TEXT NOT NULL,
+                user_email TEXT NOT NULL,
+                owner_name TEXT,
+                owner_mobile TEXT,
+                health_status TEXT NOT NULL,
+                health_index REAL,
+                appointment_time TEXT DEFAULT CURRENT_TIMESTAMP,
+                priority INTEGER DEFAULT 0,
+                status TEXT DEFAULT 'pending',
+                notes TEXT,
+                FOREIGN KEY (animal_tag) REFERENCES animals(tag),
+                FOREIGN KEY (user_email) REFERENCES users(email)
+            )
+        ''')
+        cursor1.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_appointment_pending_unique
+            ON appointment_queue(animal_tag, user_email, status)
+            WHERE status = 'pending'
+        ''')
+        conn1.commit()
+    
+    # Always ensure appointment_queue and vet_notifications tables exist (for existing databases)
+    conn1 = get_db()
+    cursor1 = conn1.cursor()
+    cursor1.execute('''
+        CREATE TABLE IF NOT EXISTS appointment_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            animal_tag TEXT NOT NULL,
+            user_email TEXT NOT NULL,
+            owner_name TEXT,
+            owner_mobile TEXT,
+            health_status TEXT NOT NULL,
+            health_index REAL,
+            appointment_time TEXT DEFAULT CURRENT_TIMESTAMP,
+            priority INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'pending',
+            notes TEXT
+        )
+    ''')
+    # Prevent duplicate pending appointments per animal/user
+    cursor1.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_appointment_pending_unique
+        ON appointment_queue(animal_tag, user_email, status)
+        WHERE status = 'pending'
+    ''')
+    
+    # Add mobile column to vets table if it doesn't exist
+    try:
+        cursor1.execute("ALTER TABLE vets ADD COLUMN mobile TEXT")
+        conn1.commit()
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+    
+    cursor1.execute('''
+        CREATE TABLE IF NOT EXISTS vet_notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            animal_tag TEXT,
+            owner_name TEXT,
+            owner_mobile TEXT,
+            title TEXT NOT NULL,
+            message TEXT NOT NULL,
+            notification_type TEXT DEFAULT 'info',
+            is_read INTEGER DEFAULT 0,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Create treatment_history table for storing vet treatments
+    cursor1.execute('''
+        CREATE TABLE IF NOT EXISTS treatment_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            animal_tag TEXT NOT NULL,
+            animal_name TEXT,
+            species TEXT,
+            user_email TEXT NOT NULL,
+            owner_name TEXT,
+            owner_mobile TEXT,
+            health_status TEXT,
+            health_index REAL,
+            treatment TEXT NOT NULL,
+            notes TEXT,
+            treated_date TEXT DEFAULT CURRENT_TIMESTAMP,
+            vet_email TEXT,
+            FOREIGN KEY (animal_tag) REFERENCES animals(tag),
+            FOREIGN KEY (user_email) REFERENCES users(email)
+        )
+    ''')
+    
+    # Create confirmed_appointments table for animals confirmed to visit vet
+    cursor1.execute('''
+        CREATE TABLE IF NOT EXISTS confirmed_appointments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            animal_tag TEXT NOT NULL,
+            animal_name TEXT,
+            species TEXT,
+            user_email TEXT NOT NULL,
+            owner_name TEXT,
+            owner_mobile TEXT,
+            health_status TEXT,
+            health_index REAL,
+            confirmed_date TEXT DEFAULT CURRENT_TIMESTAMP,
+            appointment_id INTEGER,
+            notes TEXT,
+            vet_email TEXT,
+            FOREIGN KEY (animal_tag) REFERENCES animals(tag),
+            FOREIGN KEY (user_email) REFERENCES users(email)
+        )
+    ''')
+    
+    # Latest reading per animal, upserted alongside every health_readings insert (see readings.py)
+    cursor1.execute('''
+        CREATE TABLE IF NOT EXISTS latest_health_reading (
+            animal_tag TEXT PRIMARY KEY,
+            reading_id INTEGER NOT NULL,
+            heart_rate REAL NOT NULL,
+            body_temp REAL NOT NULL,
+            blood_pressure INTEGER NOT NULL,
+            movement TEXT NOT NULL,
+            health_index REAL NOT NULL,
+            status TEXT NOT NULL,
+            timestamp TEXT
+        )
+    ''')
+    # Migration: backfill it once for databases that already have readings
+    cursor1.execute('SELECT COUNT(*) FROM latest_health_reading')
+    if cursor1.fetchone()[0] == 0:
+        backfilled = rebuild_latest_readings(cursor1)
+        if backfilled:
+            print(f"[{datetime.now()}] Backfilled latest readings for {backfilled} animals")
+
+    # Hourly and daily per-animal aggregates for the trend charts, also
+    # maintained on every health_readings insert (see readings.py)
+    for table, _ in ROLLUP_TABLES:
+        cursor1.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                animal_tag TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                reading_count INTEGER NOT NULL,
+                index_sum REAL NOT NULL,
+                index_min REAL NOT NULL,
+                index_max REAL NOT NULL,
+                temp_sum REAL NOT NULL,
+                temp_min REAL NOT NULL,
+                temp_max REAL NOT NULL,
+                hr_sum REAL NOT NULL,
+                hr_min REAL NOT NULL,
+                hr_max REAL NOT NULL,
+                PRIMARY KEY (animal_tag, bucket)
+            ) WITHOUT ROWID
+        ''')
+    # Migration: build them once for databases that already have readings.
+    # Checked on the daily table: retention trims the raw readings and hourly
+    # rollups, and rebuilding from what is left would lose history
+    cursor1.execute('SELECT COUNT(*) FROM health_rollup_daily')
+    if cursor1.fetchone()[0] == 0:
+        buckets = rebuild_rollups(cursor1)
+        if buckets:
+            print(f"[{datetime.now()}] Built {buckets} hourly trend rollups from existing readings")
+
+    # Compact archive of readings retention moved out of health_readings:
+    # packed per-animal column arrays, epoch-second first/last timestamps (see reading_store.py)
+    cursor1.execute('''
+        CREATE TABLE IF NOT EXISTS health_reading_blocks (
+            id INTEGER PRIMARY KEY,
+            animal_tag TEXT NOT NULL,
+            first_ts INTEGER NOT NULL,
+            last_ts INTEGER NOT NULL,
+            reading_count INTEGER NOT NULL,
+            payload BLOB NOT NULL
+        )
+    ''')
+
+    # Per-animal simulator state shared by every worker process (see simulator_state.py)
+    cursor1.execute('''
+        CREATE TABLE IF NOT EXISTS simulator_state (
+            animal_tag TEXT PRIMARY KEY,
+            heart_rate REAL,
+            body_temp REAL,
+            blood_pressure INTEGER,
+            movement TEXT,
+            recent_statuses TEXT,
+            seq INTEGER NOT NULL
+        )
+    ''')
+    # Migration: seed it from the latest readings, as load_previous_readings_from_db used to
+    cursor1.execute('SELECT COUNT(*) FROM simulator_state')
+    if cursor1.fetchone()[0] == 0:
+        seeded = rebuild_simulator_state(cursor1)
+        if seeded:
+            print(f"[{datetime.now()}] Seeded simulator state for {seeded} animals")
+
+    # Scheduler leases shared by every worker process (see scheduler_lease.py)
+    cursor1.execute('''
+        CREATE TABLE IF NOT EXISTS scheduler_lease (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            last_run_at REAL
+        )
+    ''')
+
+    # Background reading jobs, readable from every worker process (see reading_jobs.py)
+    cursor1.execute('''
+        CREATE TABLE IF NOT EXISTS reading_jobs (
+            id TEXT PRIMARY KEY,
+            user_email TEXT NOT NULL,
+            status TEXT NOT NULL,
+            done INTEGER NOT NULL DEFAULT 0,
+            total INTEGER,
+            count INTEGER,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+
+    # Data versions behind the API response cache, bumped by triggers on write (see response_cache.py)
+    create_version_triggers(cursor1)
+    conn1.commit()
+    
+    # Migration: create the query indexes (no-op once they exist). The
+    # (animal_tag, timestamp) index was replaced by (animal_tag, ts)
+    cursor1.execute('DROP INDEX IF EXISTS idx_health_readings_tag_time')
+    for index_name, index_columns in DB_INDEXES:
+        cursor1.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {index_columns}')
+    conn1.commit()
+    
+    # PRAGMAs are applied per connection in db.py; report what the file actually uses
+    journal_mode = conn1.execute('PRAGMA journal_mode').fetchone()[0]
+    print(f"[{datetime.now()}] Database ready at {db.DB_PATH} (journal_mode={journal_mode})")
+
+
+def prepare_database():
+    """Create or migrate the schema; idempotent. Runs once per start before any
+    request or scheduler tick: from app.py's __main__, or in gunicorn's master
+    (see gunicorn.conf.py)."""
+    init_db()
+    init_animals_table()
@@ -20,6 +20,7 @@ CREATE TABLE IF NOT EXISTS animals (
     gender TEXT,
     user_email TEXT NOT NULL,
     date_added TEXT DEFAULT CURRENT_TIMESTAMP,
+    is_active INTEGER DEFAULT 1,
     FOREIGN KEY (user_email) REFERENCES users(email)
 );
 
@@ -47,6 +48,8 @@ CREATE TABLE IF NOT EXISTS health_readings (
     health_index REAL NOT NULL,
     status TEXT NOT NULL,
     timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+    -- timestamp as epoch seconds, for indexed range queries (READING_TS_COLUMN in readings.py)
+    ts INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', timestamp) AS INTEGER)) VIRTUAL,
     FOREIGN KEY (animal_tag) REFERENCES animals(tag)
 );
 
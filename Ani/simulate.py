@@ -2,6 +2,9 @@ import numpy as np
 from sklearn.cluster import KMeans
 from datetime import datetime, timedelta
 import random
+import time
+from db import get_db
+from simulator_state import AnimalState, state_store
 
 # Species-specific health parameters
 SPECIES_PARAMS = {
@@ -77,6 +80,36 @@ WEIGHTS = {
 }
 
 
+# simulate_reading: how likely each health state is, how far each vital may
+# stray from normal in that state, and which movements it shows
+HEALTH_STATE_WEIGHTS = {'healthy': 0.50, 'warning': 0.30, 'ill': 0.20}
+HEALTH_STATE_SPREADS = {
+    'warning': {'heart_rate': 12, 'body_temp': 0.6, 'blood_pressure': 18},
+    'ill': {'heart_rate': 20, 'body_temp': 1.5, 'blood_pressure': 30}
+}
+HEALTH_STATE_MOVEMENTS = {
+    'healthy': ['Active', 'Normal'],
+    'warning': ['Normal', 'Inactive', 'Low'],
+    'ill': ['Inactive', 'Lying Down', 'Low']
+}
+# Realistic bounds every simulated reading is clamped to
+READING_BOUNDS = {'heart_rate': (20, 150), 'body_temp': (35.0, 42.0), 'blood_pressure': (70, 180)}
+
+# generate_gradual_reading: per vital (max change, max drift towards normal,
+# allowed margin outside the species' normal range) per 5-minute interval
+GRADUAL_STEPS = {
+    'heart_rate': (8, 2, 10),
+    'body_temp': (0.3, 0.1, 0.5),
+    'blood_pressure': (10, 3, 15)
+}
+GRADUAL_DRIFT_PROBABILITY = 0.7
+GRADUAL_MOVEMENT_HOLD_PROBABILITY = 0.8
+GRADUAL_MOVEMENTS = ['Active', 'Normal', 'Inactive', 'Low']
+
+# is_outlier_reading: maximum allowed change per 5-minute interval
+OUTLIER_LIMITS = {'heart_rate': 15, 'body_temp': 0.5, 'blood_pressure': 20}
+
+
 def get_species_params(species):
     """Get species-specific parameters"""
     return SPECIES_PARAMS.get(species, DEFAULT_PARAMS)
@@ -146,9 +179,9 @@ def simulate_reading(species, health_state='random'):
     if health_state == 'random':
         # 50% healthy, 30% warning, 20% ill
         rand = random.random()
-        if rand < 0.50:
+        if rand < HEALTH_STATE_WEIGHTS['healthy']:
             health_state = 'healthy'
-        elif rand < 0.80:
+        elif rand < HEALTH_STATE_WEIGHTS['healthy'] + HEALTH_STATE_WEIGHTS['warning']:
             health_state = 'warning'
         else:
             health_state = 'ill'
@@ -157,22 +190,18 @@ def simulate_reading(species, health_state='random'):
         heart_rate = np.random.uniform(params['heart_rate']['min'], params['heart_rate']['max'])
         body_temp = np.random.uniform(params['body_temp']['min'], params['body_temp']['max'])
         bp_systolic = np.random.uniform(params['blood_pressure']['min'], params['blood_pressure']['max'])
-        movement = random.choice(['Active', 'Normal'])
-    elif health_state == 'warning':
-        heart_rate = params['heart_rate']['normal'] + np.random.uniform(-12, 12)
-        body_temp = params['body_temp']['normal'] + np.random.uniform(-0.6, 0.6)
-        bp_systolic = params['blood_pressure']['normal'] + np.random.uniform(-18, 18)
-        movement = random.choice(['Normal', 'Inactive', 'Low'])
-    else:  # ill
-        heart_rate = params['heart_rate']['normal'] + np.random.uniform(-20, 20)
-        body_temp = params['body_temp']['normal'] + np.random.uniform(-1.5, 1.5)
-        bp_systolic = params['blood_pressure']['normal'] + np.random.uniform(-30, 30)
-        movement = random.choice(['Inactive', 'Lying Down', 'Low'])
+    else:  # warning or ill
+        spreads = HEALTH_STATE_SPREADS[health_state]
+        heart_rate = params['heart_rate']['normal'] + np.random.uniform(-spreads['heart_rate'], spreads['heart_rate'])
+        body_temp = params['body_temp']['normal'] + np.random.uniform(-spreads['body_temp'], spreads['body_temp'])
+        bp_systolic = params['blood_pressure']['normal'] + np.random.uniform(-spreads['blood_pressure'],
+                                                                             spreads['blood_pressure'])
+    movement = random.choice(HEALTH_STATE_MOVEMENTS[health_state])
     
     # Ensure values are within realistic bounds
-    heart_rate = max(20, min(150, heart_rate))
-    body_temp = max(35.0, min(42.0, body_temp))
-    bp_systolic = max(70, min(180, bp_systolic))
+    heart_rate = max(READING_BOUNDS['heart_rate'][0], min(READING_BOUNDS['heart_rate'][1], heart_rate))
+    body_temp = max(READING_BOUNDS['body_temp'][0], min(READING_BOUNDS['body_temp'][1], body_temp))
+    bp_systolic = max(READING_BOUNDS['blood_pressure'][0], min(READING_BOUNDS['blood_pressure'][1], bp_systolic))
     
     return {
         'heart_rate': round(heart_rate, 1),
@@ -255,6 +284,105 @@ def classify_health_status(health_index):
         return 'Ill'
 
 
+# Lookup tables for the batch scorer, built once from the per-species dicts.
+# Species code N (one past the last species) maps to DEFAULT_PARAMS.
+SPECIES_CODES = {species: code for code, species in enumerate(SPECIES_PARAMS)}
+DEFAULT_SPECIES_CODE = len(SPECIES_CODES)
+_VITALS = ('heart_rate', 'body_temp', 'blood_pressure')
+_PARAM_ROWS = list(SPECIES_PARAMS.values()) + [DEFAULT_PARAMS]
+SPECIES_NORMALS = np.array([[p[v]['normal'] for v in _VITALS] for p in _PARAM_ROWS], dtype=np.float64)
+SPECIES_MULTIPLIERS = np.array([[p[v]['multiplier'] for v in _VITALS] for p in _PARAM_ROWS], dtype=np.float64)
+
+# Movement code N (one past the last movement) is the unknown-movement score
+MOVEMENT_CODES = {movement: code for code, movement in enumerate(MOVEMENT_SCORES)}
+UNKNOWN_MOVEMENT_CODE = len(MOVEMENT_CODES)
+MOVEMENT_SCORE_TABLE = np.array(list(MOVEMENT_SCORES.values()) + [70], dtype=np.float64)
+
+STATUS_LABELS = np.array(['Ill', 'Warning', 'Healthy'])
+
+
+def encode_species(species_list):
+    """Map species names to codes for calculate_health_index_batch"""
+    return np.array([SPECIES_CODES.get(s, DEFAULT_SPECIES_CODE) for s in species_list], dtype=np.intp)
+
+
+def encode_movements(movements):
+    """Map movement labels to codes for calculate_health_index_batch"""
+    return np.array([MOVEMENT_CODES.get(m, UNKNOWN_MOVEMENT_CODE) for m in movements], dtype=np.intp)
+
+
+def _round1(values):
+    """
+    Round to 1 decimal exactly like Python's round(x, 1).
+    np.round scales by 10 first, which can create or hide a .5 tie, so
+    near-tie values are settled by comparing 20*x with the midpoint exactly
+    (16x and 4x are exact, and TwoSum recovers the error of their sum).
+    """
+    scaled = values * 10
+    rounded = np.round(scaled)
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        x = values[near_tie]
+        lower = np.floor(x * 10)
+        midpoint = 2 * lower + 1
+        a, b = 16 * x, 4 * x
+        total = a + b
+        b_virtual = total - a
+        error = (a - (total - b_virtual)) + (b - b_virtual)
+        diff = total - midpoint
+        above = (diff > 0) | ((diff == 0) & (error > 0))
+        exact_tie = (diff == 0) & (error == 0)
+        # Exact ties round half to even, as the builtin does
+        round_up = above | (exact_tie & (lower % 2 == 1))
+        rounded[near_tie] = lower + round_up
+    return rounded / 10
+
+
+def calculate_health_index_batch(arrays, species_codes):
+    """
+    Vectorized calculate_health_index for many readings at once.
+    arrays: dict of equal-length sequences for 'heart_rate', 'body_temp',
+            'blood_pressure' and 'movement' (labels or codes from encode_movements)
+    species_codes: codes from encode_species, one per reading
+    Returns a float64 array of health indexes identical to the scalar path.
+    """
+    species_codes = np.asarray(species_codes, dtype=np.intp)
+    normals = SPECIES_NORMALS[species_codes]
+    multipliers = SPECIES_MULTIPLIERS[species_codes]
+    
+    scores = []
+    for col, vital in enumerate(_VITALS):
+        values = np.asarray(arrays[vital], dtype=np.float64)
+        deviation = np.abs(values - normals[:, col])
+        scores.append(_round1(np.maximum(0, 100 - deviation * multipliers[:, col])))
+    hr_score, temp_score, bp_score = scores
+    
+    movement = np.asarray(arrays['movement'])
+    if movement.dtype.kind not in 'iu':
+        movement = encode_movements(movement)
+    move_score = MOVEMENT_SCORE_TABLE[movement]
+    
+    return _weighted_health_index(hr_score, temp_score, bp_score, move_score)
+
+
+def _weighted_health_index(hr_score, temp_score, bp_score, move_score):
+    """Combine score arrays into rounded health indexes"""
+    # Same term order as the scalar formula so the floating point result matches
+    health_index = (
+        WEIGHTS['heart_rate'] * hr_score +
+        WEIGHTS['body_temp'] * temp_score +
+        WEIGHTS['blood_pressure'] * bp_score +
+        WEIGHTS['movement'] * move_score
+    )
+    return _round1(health_index)
+
+
+def classify_health_status_batch(health_index):
+    """Vectorized classify_health_status; returns an array of status labels"""
+    health_index = np.asarray(health_index)
+    return STATUS_LABELS[(health_index >= 40).astype(np.intp) + (health_index >= 65)]
+
+
 def get_status_color(status):
     """Get color code for status"""
     colors = {
@@ -265,42 +393,22 @@ def get_status_color(status):
     return colors.get(status, 'gray')
 
 
-# Store for tracking consecutive readings (for alert logic)
-consecutive_readings = {}
-
-# Store for tracking previous readings (for gradual changes)
-previous_readings = {}
-
-
-def check_consecutive_alerts(animal_tag, status):
+def check_consecutive_alerts(recent_statuses):
     """
     Check for consecutive abnormal readings
+    recent_statuses: the animal's last statuses, newest last (see AnimalState)
     Returns alert level: None, 'Alert', or 'Critical'
     """
-    global consecutive_readings
-    
-    if animal_tag not in consecutive_readings:
-        consecutive_readings[animal_tag] = []
-    
-    # Add current status
-    consecutive_readings[animal_tag].append(status)
-    
-    # Keep only last 3 readings
-    if len(consecutive_readings[animal_tag]) > 3:
-        consecutive_readings[animal_tag] = consecutive_readings[animal_tag][-3:]
-    
-    readings = consecutive_readings[animal_tag]
-    
     # Need at least 3 readings for alert
-    if len(readings) < 3:
+    if len(recent_statuses) < 3:
         return None
     
     # Check for 3 consecutive warnings
-    if all(r == 'Warning' for r in readings[-3:]):
+    if all(r == 'Warning' for r in recent_statuses[-3:]):
         return 'Alert'
     
     # Check for 3 consecutive ill
-    if all(r == 'Ill' for r in readings[-3:]):
+    if all(r == 'Ill' for r in recent_statuses[-3:]):
         return 'Critical'
     
     return None
@@ -314,20 +422,10 @@ def is_outlier_reading(new_reading, prev_reading, species):
     if prev_reading is None:
         return False
     
-    params = get_species_params(species)
-    
-    # Maximum allowed changes per 5-minute interval
-    max_hr_change = 15  # bpm
-    max_temp_change = 0.5  # °C
-    max_bp_change = 20  # mmHg
-    
-    hr_change = abs(new_reading['heart_rate'] - prev_reading['heart_rate'])
-    temp_change = abs(new_reading['body_temp'] - prev_reading['body_temp'])
-    bp_change = abs(new_reading['blood_pressure'] - prev_reading['blood_pressure'])
-    
     # Check for drastic changes
-    if hr_change > max_hr_change or temp_change > max_temp_change or bp_change > max_bp_change:
-        return True
+    for vital, max_change in OUTLIER_LIMITS.items():
+        if abs(new_reading[vital] - prev_reading[vital]) > max_change:
+            return True
     
     return False
 
@@ -344,9 +442,9 @@ def generate_gradual_reading(species, prev_reading=None):
         return simulate_reading(species)
     
     # Maximum gradual changes per 5-minute interval
-    max_hr_change = 8  # bpm
-    max_temp_change = 0.3  # °C
-    max_bp_change = 10  # mmHg
+    max_hr_change, max_hr_drift, hr_margin = GRADUAL_STEPS['heart_rate']
+    max_temp_change, max_temp_drift, temp_margin = GRADUAL_STEPS['body_temp']
+    max_bp_change, max_bp_drift, bp_margin = GRADUAL_STEPS['blood_pressure']
     
     # Generate small changes from previous reading
     hr_delta = np.random.uniform(-max_hr_change, max_hr_change)
@@ -360,37 +458,37 @@ def generate_gradual_reading(species, prev_reading=None):
     
     # Add a small random drift towards normal or abnormal
     # 70% chance to drift toward normal, 30% chance to stay/worsen
-    if random.random() < 0.7:
+    if random.random() < GRADUAL_DRIFT_PROBABILITY:
         # Drift toward normal
         normal_hr = params['heart_rate']['normal']
         normal_temp = params['body_temp']['normal']
         normal_bp = params['blood_pressure']['normal']
         
         if new_hr > normal_hr:
-            new_hr -= random.uniform(0, 2)
+            new_hr -= random.uniform(0, max_hr_drift)
         elif new_hr < normal_hr:
-            new_hr += random.uniform(0, 2)
+            new_hr += random.uniform(0, max_hr_drift)
             
         if new_temp > normal_temp:
-            new_temp -= random.uniform(0, 0.1)
+            new_temp -= random.uniform(0, max_temp_drift)
         elif new_temp < normal_temp:
-            new_temp += random.uniform(0, 0.1)
+            new_temp += random.uniform(0, max_temp_drift)
             
         if new_bp > normal_bp:
-            new_bp -= random.uniform(0, 3)
+            new_bp -= random.uniform(0, max_bp_drift)
         elif new_bp < normal_bp:
-            new_bp += random.uniform(0, 3)
+            new_bp += random.uniform(0, max_bp_drift)
     
     # Ensure values are within realistic bounds
-    new_hr = max(params['heart_rate']['min'] - 10, min(params['heart_rate']['max'] + 10, new_hr))
-    new_temp = max(params['body_temp']['min'] - 0.5, min(params['body_temp']['max'] + 0.5, new_temp))
-    new_bp = max(params['blood_pressure']['min'] - 15, min(params['blood_pressure']['max'] + 15, new_bp))
+    new_hr = max(params['heart_rate']['min'] - hr_margin, min(params['heart_rate']['max'] + hr_margin, new_hr))
+    new_temp = max(params['body_temp']['min'] - temp_margin, min(params['body_temp']['max'] + temp_margin, new_temp))
+    new_bp = max(params['blood_pressure']['min'] - bp_margin, min(params['blood_pressure']['max'] + bp_margin, new_bp))
     
     # Movement tends to stay similar
-    if random.random() < 0.8:
+    if random.random() < GRADUAL_MOVEMENT_HOLD_PROBABILITY:
         movement = prev_reading['movement']
     else:
-        movements = ['Active', 'Normal', 'Inactive', 'Low']
+        movements = GRADUAL_MOVEMENTS
         current_idx = movements.index(prev_reading['movement']) if prev_reading['movement'] in movements else 1
         # Move at most 1 step
         new_idx = max(0, min(len(movements) - 1, current_idx + random.choice([-1, 0, 0, 1])))
@@ -404,23 +502,151 @@ def generate_gradual_reading(species, prev_reading=None):
     }
 
 
+# Constrained sampling.
+# A reading whose health index moves too far is redrawn at most READING_MAX_DRAWS
+# times; most land in the window on the first draw, so the loop costs about one
+# draw per reading. If every draw misses, the last one is moved into the window
+# in score space instead of drawing on: see repair_reading.
+READING_MAX_DRAWS = 10
+
+# Vitals in the order repair_reading fixes them: coarsest score steps first,
+# so heart rate (0.1 bpm steps) absorbs the rounding of the others
+REPAIR_ORDER = ('blood_pressure', 'body_temp', 'heart_rate')
+VALUE_STEPS = {'heart_rate': 0.1, 'body_temp': 0.1, 'blood_pressure': 1}
+# Aim this far inside the window, for the rounding of the last vital
+REPAIR_MARGIN = 0.15
+
+
+def _vital_score(value, normal, multiplier):
+    return max(0.0, 100 - abs(value - normal) * multiplier)
+
+
+def _values_scoring(low, high, normal, multiplier, score_low, score_high):
+    """The parts of [low, high] where the vital scores within [score_low, score_high]"""
+    near = (100 - score_high) / multiplier
+    far = (100 - score_low) / multiplier if score_low > 0 else float('inf')
+    parts = []
+    for start, end in ((normal - far, normal - near), (normal + near, normal + far)):
+        start, end = max(start, low), min(end, high)
+        if start <= end:
+            parts.append((start, end))
+    return parts
+
+
+def _uniform_over(parts):
+    """A uniform draw from the union of (start, end) intervals"""
+    total = sum(end - start for start, end in parts)
+    position = random.uniform(0, total)
+    for start, end in parts:
+        if position <= end - start:
+            return start + position
+        position -= end - start
+    return parts[-1][1]
+
+
+def _on_grid(value, low, high, step):
+    """Round value to the vital's stored precision, staying within [low, high] where the grid allows"""
+    if step == 1:
+        return int(min(max(round(value), np.ceil(low)), max(np.floor(high), np.ceil(low))))
+    return min(max(round(value, 1), np.ceil(low * 10) / 10), max(np.floor(high * 10) / 10, np.ceil(low * 10) / 10))
+
+
+def repair_reading(reading, ranges, movements, normals, multipliers, window):
+    """
+    Move a reading into the health-index window by clipping each vital's score
+    interval and inverting it, one vital at a time.
+    ranges: vital -> (low, high) values the vital can take here
+    movements: movement -> score, for the movements it can take here
+    normals, multipliers: vital -> the score's normal value and multiplier
+    (score = max(0, 100 - |value - normal| * multiplier))
+    window: (low, high) health indexes
+    Each vital keeps its value if its score still leaves the window reachable
+    by the vitals after it, and is otherwise drawn uniformly from the values
+    that do. Returns None if the window is out of reach; callers check the
+    result with their exact formula.
+    """
+    low, high = window[0] + REPAIR_MARGIN, window[1] - REPAIR_MARGIN
+    spans = {}
+    for vital in REPAIR_ORDER:
+        vital_low, vital_high = ranges[vital]
+        nearest = min(max(normals[vital], vital_low), vital_high)
+        spans[vital] = (min(_vital_score(vital_low, normals[vital], multipliers[vital]),
+                            _vital_score(vital_high, normals[vital], multipliers[vital])),
+                        _vital_score(nearest, normals[vital], multipliers[vital]))
+    rest_min = sum(WEIGHTS[vital] * spans[vital][0] for vital in REPAIR_ORDER)
+    rest_max = sum(WEIGHTS[vital] * spans[vital][1] for vital in REPAIR_ORDER)
+    
+    # Movement first: kept unless the vitals can't make up for it
+    reachable = [movement for movement, score in movements.items()
+                 if WEIGHTS['movement'] * score + rest_min <= high and WEIGHTS['movement'] * score + rest_max >= low]
+    if not reachable:
+        return None
+    movement = reading['movement'] if reading['movement'] in reachable else random.choice(reachable)
+    total = WEIGHTS['movement'] * movements[movement]
+    repaired = {'movement': movement}
+    
+    for vital in REPAIR_ORDER:
+        weight, (span_min, span_max) = WEIGHTS[vital], spans[vital]
+        rest_min -= weight * span_min
+        rest_max -= weight * span_max
+        # The scores that leave the window reachable, clipped to what the vital can score
+        score_low = max(span_min, (low - total - rest_max) / weight)
+        score_high = min(span_max, (high - total - rest_min) / weight)
+        vital_low, vital_high = ranges[vital]
+        value = reading[vital]
+        score = _vital_score(value, normals[vital], multipliers[vital])
+        if not (vital_low <= value <= vital_high and score_low <= score <= score_high):
+            parts = _values_scoring(vital_low, vital_high, normals[vital], multipliers[vital], score_low, score_high)
+            if not parts:
+                return None
+            value = _on_grid(_uniform_over(parts), vital_low, vital_high, VALUE_STEPS[vital])
+        repaired[vital] = value
+        total += weight * _vital_score(value, normals[vital], multipliers[vital])
+    return repaired
+
+
+def gradual_reading_ranges(species, prev_reading):
+    """
+    (ranges, movements) that generate_gradual_reading(species, prev_reading) can
+    produce without an outlier, for repair_reading; with no previous reading,
+    those of simulate_reading
+    """
+    params = get_species_params(species)
+    ranges = {}
+    if prev_reading is None:
+        for vital, (clamp_min, clamp_max) in READING_BOUNDS.items():
+            spread = max(spreads[vital] for spreads in HEALTH_STATE_SPREADS.values())
+            ranges[vital] = (max(clamp_min, min(params[vital]['min'], params[vital]['normal'] - spread)),
+                             min(clamp_max, max(params[vital]['max'], params[vital]['normal'] + spread)))
+        labels = {movement for state_movements in HEALTH_STATE_MOVEMENTS.values() for movement in state_movements}
+    else:
+        for vital, (max_change, _, margin) in GRADUAL_STEPS.items():
+            # Steps without the drift: every value in here can be drawn, and none is an outlier
+            clamp_min, clamp_max = params[vital]['min'] - margin, params[vital]['max'] + margin
+            ranges[vital] = (min(max(prev_reading[vital] - max_change, clamp_min), clamp_max),
+                             min(max(prev_reading[vital] + max_change, clamp_min), clamp_max))
+        current_idx = (GRADUAL_MOVEMENTS.index(prev_reading['movement'])
+                       if prev_reading['movement'] in GRADUAL_MOVEMENTS else 1)
+        labels = {prev_reading['movement']} | {
+            GRADUAL_MOVEMENTS[max(0, min(len(GRADUAL_MOVEMENTS) - 1, current_idx + step))] for step in (-1, 0, 1)}
+    movements = {movement: calculate_movement_score(movement) for movement in labels}
+    return ranges, movements
+
+
 def generate_readings_history(species, num_readings=10):
     """Generate a history of readings for display in table"""
     readings = []
     current_time = datetime.now()
     
-    for i in range(num_readings):
-        # Generate reading
-        reading_data = simulate_reading(species)
-        
-        # Calculate health index
-        health_index = calculate_health_index(
-            reading_data['heart_rate'],
-            reading_data['body_temp'],
-            reading_data['blood_pressure'],
-            reading_data['movement'],
-            species
-        )
+    # Generate the readings, then score them all in one pass
+    samples = [simulate_reading(species) for _ in range(num_readings)]
+    health_indexes = calculate_health_index_batch(
+        {key: [r[key] for r in samples] for key in ('heart_rate', 'body_temp', 'blood_pressure', 'movement')},
+        encode_species([species] * num_readings)
+    ).tolist()
+    
+    for i, reading_data in enumerate(samples):
+        health_index = health_indexes[i]
         
         # Classify status
         status = classify_health_status(health_index)
@@ -449,39 +675,77 @@ def get_current_health_data(animal_tag, species):
     Get current health data for an animal with gradual changes.
     Constraint: Max 10% difference from last reading's health index
     """
-    global previous_readings
-    
-    # Get previous reading from memory
-    prev_reading = previous_readings.get(animal_tag)
-    
     # Get last health index from database
     last_health_index_db = None
+    conn = get_db()
     try:
-        import sqlite3
-        conn = sqlite3.connect('users.db')
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT health_index FROM health_readings
-            WHERE animal_tag = ?
-            ORDER BY timestamp DESC
-            LIMIT 1
-        ''', (animal_tag,))
+        cursor.execute('SELECT health_index FROM latest_health_reading WHERE animal_tag = ?', (animal_tag,))
         result = cursor.fetchone()
-        conn.close()
         if result:
             last_health_index_db = result[0]
     except:
         pass
     
-    # Try to generate a reading that respects the constraint
-    for attempt in range(30):
+    state = state_store.get(animal_tag)
+    health_data = generate_health_data(animal_tag, species, last_health_index_db, state)
+    try:
+        state_store.save(conn.cursor(), animal_tag, state)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Could not save simulator state for {animal_tag}: {e}")
+    return health_data
+
+
+def generate_health_data_batch(animals, last_health_indexes, states):
+    """
+    Generate current health data for many animals without touching the database.
+    animals: iterable of (animal_tag, species)
+    last_health_indexes: dict of animal_tag -> last stored health index
+    states: dict of animal_tag -> AnimalState, advanced in place (missing ones are added)
+    """
+    return [
+        generate_health_data(animal_tag, species, last_health_indexes.get(animal_tag),
+                             states.setdefault(animal_tag, AnimalState()))
+        for animal_tag, species in animals
+    ]
+
+
+def generate_shard(shard, animals, states, timestamp):
+    """
+    Generate the readings for one shard of animals (the process pool entry point).
+    animals: (animal_tag, species, last_health_index) tuples
+    states: animal_tag -> AnimalState for the animals in this shard; a worker
+    process gets a copy, so the advanced states are handed back to the caller.
+    Returns (shard, rows, states, seconds) where rows are ready for save_health_readings.
+    """
+    start = time.perf_counter()
+    rows = []
+    for animal_tag, species, last_health_index in animals:
+        state = states.setdefault(animal_tag, AnimalState())
+        h = generate_health_data(animal_tag, species, last_health_index, state)
+        rows.append((animal_tag, h['heart_rate'], h['body_temp'], h['blood_pressure'], h['movement'],
+                     h['health_index'], h['status'], timestamp))
+    return shard, rows, states, time.perf_counter() - start
+
+
+def generate_health_data(animal_tag, species, last_health_index_db=None, state=None):
+    """
+    Generate the next reading for an animal given its last stored health index.
+    Constraint: Max 10% difference from last_health_index_db
+    state: the animal's AnimalState, advanced in place (None for a one-off reading)
+    """
+    if state is None:
+        state = AnimalState()
+    prev_reading = state.previous_reading()
+    
+    # Draw until the reading is not an outlier and stays within 10 of the last
+    # database health index; after READING_MAX_DRAWS misses, repair the last draw
+    for draw in range(READING_MAX_DRAWS):
         reading = generate_gradual_reading(species, prev_reading)
-        
-        # Check if this reading is an outlier (too different from previous in-memory reading)
-        if prev_reading and is_outlier_reading(reading, prev_reading, species):
-            continue  # Try again
-        
-        # Calculate health index for this reading
+        if prev_reading is not None and is_outlier_reading(reading, prev_reading, species):
+            continue
         health_index = calculate_health_index(
             reading['heart_rate'],
             reading['body_temp'],
@@ -489,79 +753,29 @@ def get_current_health_data(animal_tag, species):
             reading['movement'],
             species
         )
-        
-        # Check constraint: max 10% difference from last database reading
-        if last_health_index_db is not None:
-            health_change = abs(health_index - last_health_index_db)
-            if health_change > 10:
-                continue  # Try again - change is too large
-        
-        # This reading is valid
-        previous_readings[animal_tag] = reading
-        
-        status = classify_health_status(health_index)
-        alert = check_consecutive_alerts(animal_tag, status)
-        
-        return {
-            'animal_tag': animal_tag,
-            'species': species,
-            'heart_rate': reading['heart_rate'],
-            'body_temp': reading['body_temp'],
-            'blood_pressure': reading['blood_pressure'],
-            'movement': reading['movement'],
-            'health_index': health_index,
-            'status': status,
-            'status_color': get_status_color(status),
-            'alert': alert,
-            'timestamp': datetime.now().isoformat()
-        }
-    
-    # Fallback: if we couldn't find a valid reading after 30 attempts,
-    # generate one close to the last database value
-    if last_health_index_db is not None:
-        # Constrain to ±10% of last reading
-        target_min = max(0, last_health_index_db - 10)
-        target_max = min(100, last_health_index_db + 10)
-        
-        # Generate reading targeting this range
-        for attempt in range(20):
-            reading = generate_gradual_reading(species, prev_reading)
-            health_index = calculate_health_index(
-                reading['heart_rate'],
-                reading['body_temp'],
-                reading['blood_pressure'],
-                reading['movement'],
+        if last_health_index_db is None or abs(health_index - last_health_index_db) <= 10:
+            break
+    else:
+        params = get_species_params(species)
+        window = (0, 100) if last_health_index_db is None else (last_health_index_db - 10, last_health_index_db + 10)
+        repaired = repair_reading(reading, *gradual_reading_ranges(species, prev_reading),
+                                  {vital: params[vital]['normal'] for vital in REPAIR_ORDER},
+                                  {vital: params[vital]['multiplier'] for vital in REPAIR_ORDER}, window)
+        if repaired is not None:
+            repaired_index = calculate_health_index(
+                repaired['heart_rate'],
+                repaired['body_temp'],
+                repaired['blood_pressure'],
+                repaired['movement'],
                 species
             )
-            if target_min <= health_index <= target_max:
-                previous_readings[animal_tag] = reading
-                status = classify_health_status(health_index)
-                alert = check_consecutive_alerts(animal_tag, status)
-                return {
-                    'animal_tag': animal_tag,
-                    'species': species,
-                    'heart_rate': reading['heart_rate'],
-                    'body_temp': reading['body_temp'],
-                    'blood_pressure': reading['blood_pressure'],
-                    'movement': reading['movement'],
-                    'health_index': health_index,
-                    'status': status,
-                    'status_color': get_status_color(status),
-                    'alert': alert,
-                    'timestamp': datetime.now().isoformat()
-                }
-    
-    # Last resort: return what we have (should rarely reach here)
-    health_index = calculate_health_index(
-        reading['heart_rate'],
-        reading['body_temp'],
-        reading['blood_pressure'],
-        reading['movement'],
-        species
-    )
-    previous_readings[animal_tag] = reading
+            if last_health_index_db is None or abs(repaired_index - last_health_index_db) <= 10:
+                reading, health_index = repaired, repaired_index
+        # Last resort (window out of reach): keep the last draw
+    
     status = classify_health_status(health_index)
-    alert = check_consecutive_alerts(animal_tag, status)
+    state.advance(reading, status)
+    alert = check_consecutive_alerts(state.recent_statuses)
     
     return {
         'animal_tag': animal_tag,
@@ -578,42 +792,6 @@ def get_current_health_data(animal_tag, species):
     }
 
 
-def load_previous_readings_from_db():
-    """Load the most recent readings from database to initialize previous_readings"""
-    global previous_readings
-    import sqlite3
-    
-    try:
-        conn = sqlite3.connect('users.db')
-        cursor = conn.cursor()
-        
-        # Get the latest reading for each animal
-        cursor.execute('''
-            SELECT animal_tag, heart_rate, body_temp, blood_pressure, movement 
-            FROM health_readings 
-            WHERE (animal_tag, timestamp) IN (
-                SELECT animal_tag, MAX(timestamp) 
-                FROM health_readings 
-                GROUP BY animal_tag
-            )
-        ''')
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        for row in rows:
-            previous_readings[row[0]] = {
-                'heart_rate': row[1],
-                'body_temp': row[2],
-                'blood_pressure': row[3],
-                'movement': row[4]
-            }
-        
-        print(f"Loaded previous readings for {len(previous_readings)} animals")
-    except Exception as e:
-        print(f"Could not load previous readings: {e}")
-
-
 def get_species_normal_ranges(species):
     """Get normal ranges for a species for display"""
     params = get_species_params(species)
@@ -0,0 +1,204 @@
+"""
+Simulator state store.
+The per-animal state the simulator carries from one reading to the next
+(the previous vitals for gradual changes and the last three statuses for
+consecutive alerts) lives in the simulator_state table, so every worker
+process sees the same state. Each process keeps a bounded LRU cache in
+front of it, filled lazily on first access and written through when a
+cycle commits.
+"""
+import threading
+from collections import OrderedDict
+
+from config import Config
+from db import get_db
+
+# SQLite caps bound parameters per statement; load misses in chunks below it
+LOAD_CHUNK_SIZE = 500
+# Statuses kept for the consecutive-alert check
+RECENT_STATUS_COUNT = 3
+
+# seq orders every write: each upsert takes the next value while holding the
+# write lock, so other processes can pick up exactly the rows that changed
+UPSERT_STATE_SQL = '''
+    INSERT INTO simulator_state (animal_tag, heart_rate, body_temp, blood_pressure, movement, recent_statuses, seq)
+    VALUES (?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM simulator_state))
+    ON CONFLICT(animal_tag) DO UPDATE SET
+        heart_rate = excluded.heart_rate,
+        body_temp = excluded.body_temp,
+        blood_pressure = excluded.blood_pressure,
+        movement = excluded.movement,
+        recent_statuses = excluded.recent_statuses,
+        seq = excluded.seq
+'''
+
+STATE_COLUMNS = 'animal_tag, heart_rate, body_temp, blood_pressure, movement, recent_statuses, seq'
+
+
+class AnimalState:
+    """Simulator state for one animal; heart_rate is None until its first reading"""
+    __slots__ = ('heart_rate', 'body_temp', 'blood_pressure', 'movement', 'recent_statuses')
+
+    def __init__(self, heart_rate=None, body_temp=None, blood_pressure=None, movement=None, recent_statuses=()):
+        self.heart_rate = heart_rate
+        self.body_temp = body_temp
+        self.blood_pressure = blood_pressure
+        self.movement = movement
+        self.recent_statuses = recent_statuses
+
+    def previous_reading(self):
+        """The previous reading as the simulator expects it, or None for a new animal"""
+        if self.heart_rate is None:
+            return None
+        return {
+            'heart_rate': self.heart_rate,
+            'body_temp': self.body_temp,
+            'blood_pressure': self.blood_pressure,
+            'movement': self.movement
+        }
+
+    def advance(self, reading, status):
+        """Move the state on by one reading"""
+        self.heart_rate = reading['heart_rate']
+        self.body_temp = reading['body_temp']
+        self.blood_pressure = reading['blood_pressure']
+        self.movement = reading['movement']
+        self.recent_statuses = (self.recent_statuses + (status,))[-RECENT_STATUS_COUNT:]
+
+    def copy(self):
+        return AnimalState(self.heart_rate, self.body_temp, self.blood_pressure, self.movement, self.recent_statuses)
+
+    def to_row(self, animal_tag):
+        return (animal_tag, self.heart_rate, self.body_temp, self.blood_pressure, self.movement,
+                ','.join(self.recent_statuses))
+
+    @classmethod
+    def from_row(cls, row):
+        statuses = tuple(row['recent_statuses'].split(',')) if row['recent_statuses'] else ()
+        return cls(row['heart_rate'], row['body_temp'], row['blood_pressure'], row['movement'], statuses)
+
+
+class StateStore:
+    """LRU cache over the simulator_state table.
+    Writes go to SQLite in the caller's transaction and drop the cached entry;
+    reads pick up other connections' commits before using the cache."""
+
+    def __init__(self, max_entries=Config.SIMULATOR_STATE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._seq = None
+        # Per thread: the connection and PRAGMA data_version last synced against
+        self._local = threading.local()
+
+    def _sync(self, conn):
+        """Refresh cached entries that another connection has changed since the last look.
+        data_version only moves when a different connection commits, so this is
+        usually a single PRAGMA."""
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if getattr(self._local, 'conn', None) is conn and self._local.version == version:
+            return
+        self._local.conn = conn
+        self._local.version = version
+
+        if self._seq is None:
+            # Nothing is cached before the first sync, so only the high-water mark matters
+            self._seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM simulator_state').fetchone()[0]
+            return
+        rows = conn.execute(f'SELECT {STATE_COLUMNS} FROM simulator_state WHERE seq > ? ORDER BY seq',
+                            (self._seq,)).fetchall()
+        with self._lock:
+            for row in rows:
+                if row['animal_tag'] in self._cache:
+                    self._cache[row['animal_tag']] = AnimalState.from_row(row)
+                self._seq = max(self._seq, row['seq'])
+
+    def _put(self, animal_tag, state):
+        self._cache[animal_tag] = state
+        self._cache.move_to_end(animal_tag)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def get_many(self, animal_tags):
+        """Return animal_tag -> AnimalState for every tag, loading misses in bulk.
+        Animals without stored state get a fresh AnimalState. The states are copies,
+        so advancing them never touches the cache before they are saved."""
+        conn = get_db()
+        self._sync(conn)
+
+        states = {}
+        with self._lock:
+            for animal_tag in animal_tags:
+                state = self._cache.get(animal_tag)
+                if state is not None:
+                    self._cache.move_to_end(animal_tag)
+                    states[animal_tag] = state.copy()
+        missing = [animal_tag for animal_tag in animal_tags if animal_tag not in states]
+
+        loaded = {}
+        for i in range(0, len(missing), LOAD_CHUNK_SIZE):
+            chunk = missing[i:i + LOAD_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            for row in conn.execute(f'SELECT {STATE_COLUMNS} FROM simulator_state WHERE animal_tag IN ({placeholders})',
+                                    chunk):
+                loaded[row['animal_tag']] = AnimalState.from_row(row)
+
+        with self._lock:
+            for animal_tag, state in loaded.items():
+                self._put(animal_tag, state.copy())
+        for animal_tag in missing:
+            states[animal_tag] = loaded.get(animal_tag) or AnimalState()
+        return states
+
+    def get(self, animal_tag):
+        """Return the state for one animal (a fresh AnimalState if it has none yet)"""
+        return self.get_many([animal_tag])[animal_tag]
+
+    def save_many(self, cursor, states):
+        """Write animal_tag -> AnimalState in the caller's transaction; the caller commits,
+        then calls remember(states). After a rollback the cache is still right, as
+        get_many hands out copies."""
+        if not states:
+            return 0
+        cursor.executemany(UPSERT_STATE_SQL, [state.to_row(animal_tag) for animal_tag, state in states.items()])
+        return len(states)
+
+    def save(self, cursor, animal_tag, state):
+        return self.save_many(cursor, {animal_tag: state})
+
+    def remember(self, states):
+        """Cache states that were just committed, so the next cycle needn't reload them"""
+        with self._lock:
+            for animal_tag, state in states.items():
+                self._put(animal_tag, state.copy())
+
+    def forget(self, animal_tags):
+        """Drop animals from this process's cache"""
+        with self._lock:
+            for animal_tag in animal_tags:
+                self._cache.pop(animal_tag, None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+        self._seq = None
+        self._local = threading.local()
+
+    def __len__(self):
+        return len(self._cache)
+
+
+# Process-wide store used by the simulator and the scheduler
+state_store = StateStore()
+
+
+def rebuild_simulator_state(cursor):
+    """Seed simulator state from each animal's latest reading (used by the init_db migration)"""
+    cursor.execute('''
+        INSERT INTO simulator_state (animal_tag, heart_rate, body_temp, blood_pressure, movement, recent_statuses, seq)
+        SELECT animal_tag, heart_rate, body_temp, blood_pressure, movement, status, reading_id
+        FROM latest_health_reading
+        WHERE true
+        ON CONFLICT(animal_tag) DO NOTHING
+    ''')
+    return cursor.rowcount
@@ -1,13 +1,14 @@
 #!/usr/bin/env python3
 """Test the admin_user route logic directly"""
 import sqlite3
+from db import DB_PATH
 
 def test_admin_user_logic():
     print("Testing admin_user route logic...")
     
     total_animals_treated = 0
     try:
-        conn = sqlite3.connect('users.db')
+        conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         cursor.execute('SELECT COUNT(*) FROM treatment_history')
         result = cursor.fetchone()
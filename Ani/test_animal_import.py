@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Test the streaming bulk import: CSV and Excel, tag reservation, row errors and speed"""
+import io
+import time
+
+import openpyxl
+
+import db
+import app as app_module
+from animal_import import AnimalImporter, iter_csv_rows
+from conftest import fresh_db
+
+
+def _setup_app():
+    fresh_db()
+    app_module.init_db()
+    app_module.init_animals_table()
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user'] = 'Farmer'
+        sess['user_email'] = 'farmer@test.com'
+    return client
+
+
+def _upload(client, data, filename):
+    return client.post('/api/animals/bulk/upload', data={'file': (io.BytesIO(data), filename)},
+                       content_type='multipart/form-data')
+
+
+def _tags(species):
+    rows = db.get_db().execute('SELECT tag FROM animals WHERE species = ? ORDER BY id', (species,))
+    return [row['tag'] for row in rows]
+
+
+def test_csv_import_with_row_errors():
+    client = _setup_app()
+    csv_data = ('\ufeffName,Species,Weight (kg),Age (years),Gender\n'
+                'Bella,cow,510,4,f\n'
+                ',Cow,400,2,Female\n'
+                'Rex,Dragon,1,1,m\n'
+                '\n'
+                'Nanny,Goat,,,\n'
+                'Bessie,COW,abc,3.5,male\n').encode('utf-8')
+    data = _upload(client, csv_data, 'herd.csv').get_json()
+    assert data['success_count'] == 3 and data['error_count'] == 2
+    assert data['errors'] == [
+        {'row': 3, 'message': 'Name is required'},
+        {'row': 4, 'message': 'Invalid species: Dragon. Valid options: Cow, Buffalo, Sheep, Goat, Horse, Pig'},
+    ]
+
+    # Tags continue after the sample animals (C-001, C-002, G-001)
+    assert _tags('Cow')[-2:] == ['C-003', 'C-004']
+    assert _tags('Goat')[-1] == 'G-002'
+    bessie = db.get_db().execute("SELECT weight, age, gender FROM animals WHERE name = 'Bessie'").fetchone()
+    assert tuple(bessie) == (None, None, 'Male')
+
+    # Single adds and imports draw from the same counter
+    app_module.add_animal('Solo', 'Cow', 300, 2, 'Female', 'farmer@test.com')
+    _upload(client, b'Name,Species\nNext,Cow\n', 'more.csv')
+    assert _tags('Cow')[-2:] == ['C-005', 'C-006']
+
+
+def test_xlsx_import():
+    client = _setup_app()
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(['Name', 'Species', 'Weight (kg)', 'Age (years)', 'Gender'])
+    for i in range(50):
+        sheet.append([f'Sheep {i}', 'Sheep', 40.5, 2, 'Male'])
+    sheet.append([None, None, None, None, None])
+    sheet.append(['No species', None, 1, 1, 'f'])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    data = _upload(client, buffer.getvalue(), 'flock.xlsx').get_json()
+    assert data['success_count'] == 50
+    assert data['errors'] == [{'row': 53, 'message': 'Species is required'}]
+    tags = _tags('Sheep')
+    assert len(set(tags)) == len(tags) == 51 and tags[-1] == 'S-051'
+
+
+def test_failed_chunk_is_retried_row_by_row():
+    _setup_app()
+    conn = db.get_db()
+    # A counter that has fallen behind the table makes one insert collide
+    conn.execute("INSERT INTO animals (tag, name, species, user_email) VALUES ('C-004', 'Old', 'Cow', 'x@test.com')")
+    conn.execute("UPDATE tag_sequences SET last_value = 2 WHERE prefix = 'C'")
+    conn.commit()
+
+    importer = AnimalImporter('farmer@test.com', chunk_size=10)
+    rows = iter_csv_rows(io.BytesIO(b'Name,Species\nA,Cow\nB,Cow\nC,Cow\n'))
+    importer.run(rows)
+    assert importer.added == 2
+    assert importer.errors[0]['row'] == 3 and 'UNIQUE' in importer.errors[0]['message']
+
+
+def benchmark(rows=100_000):
+    """Import a large CSV through the endpoint"""
+    client = _setup_app()
+    species = ['Cow', 'Buffalo', 'Sheep', 'Goat', 'Horse', 'Pig']
+    lines = ['Name,Species,Weight (kg),Age (years),Gender']
+    lines += [f'Animal {i},{species[i % 6]},{300 + i % 200},{i % 12},{"Male" if i % 2 else "Female"}'
+              for i in range(rows)]
+    data = '\n'.join(lines).encode('utf-8')
+    start = time.perf_counter()
+    result = _upload(client, data, 'big.csv').get_json()
+    elapsed = time.perf_counter() - start
+    print(f"{result['success_count']:,} rows ({len(data) / 1024 / 1024:.1f} MB) imported in {elapsed:.2f} s "
+          f"({result['success_count'] / elapsed:,.0f} rows/s)")
+    assert result['success_count'] == rows
+
+
+if __name__ == "__main__":
+    test_csv_import_with_row_errors()
+    test_xlsx_import()
+    test_failed_chunk_is_retried_row_by_row()
+    benchmark()
+    print("✓ Bulk imports stream into one transaction")
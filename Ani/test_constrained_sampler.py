@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""Test the capped draw loop and its score-space repair against the old retry loops"""
+import random
+import time
+import timeit
+from datetime import datetime
+
+import numpy as np
+
+import simulate
+from simulator_state import AnimalState
+from simulate import (SPECIES_PARAMS, calculate_health_index, generate_gradual_reading, is_outlier_reading,
+                      gradual_reading_ranges, repair_reading, OUTLIER_LIMITS, REPAIR_ORDER)
+
+# A Cow that drifted well above normal, and a last stored index it has to stay near
+PREV = {'heart_rate': 80.0, 'body_temp': 39.4, 'blood_pressure': 150, 'movement': 'Inactive'}
+LAST_HEALTH_INDEX = 72.0
+
+
+def _health_index(reading, species):
+    return calculate_health_index(reading['heart_rate'], reading['body_temp'], reading['blood_pressure'],
+                                  reading['movement'], species)
+
+
+def _retry_loop_reading(species, prev_reading, last_health_index, max_draws=50):
+    """The old get_current_health_data loop: draw until the reading is accepted.
+    Returns (reading, health_index, draws); draws is None if it gave up."""
+    for draw in range(1, max_draws + 1):
+        reading = generate_gradual_reading(species, prev_reading)
+        if draw <= 30 and prev_reading and is_outlier_reading(reading, prev_reading, species):
+            continue
+        health_index = _health_index(reading, species)
+        if last_health_index is None or abs(health_index - last_health_index) <= 10:
+            return reading, health_index, draw
+    return reading, health_index, None
+
+
+def _retry_loop_health_data(animal_tag, species, last_health_index, state):
+    """generate_health_data as it was around the retry loop, for like-for-like timings.
+    Returns (data, draws)"""
+    reading, health_index, draws = _retry_loop_reading(species, state.previous_reading(), last_health_index)
+    status = simulate.classify_health_status(health_index)
+    state.advance(reading, status)
+    return {
+        'animal_tag': animal_tag,
+        'species': species,
+        **reading,
+        'health_index': health_index,
+        'status': status,
+        'status_color': simulate.get_status_color(status),
+        'alert': simulate.check_consecutive_alerts(state.recent_statuses),
+        'timestamp': datetime.now().isoformat()
+    }, draws or 50
+
+
+def _next_reading(species, prev_reading, last_health_index):
+    state = AnimalState(**prev_reading) if prev_reading else AnimalState()
+    return simulate.generate_health_data('T-1', species, last_health_index, state)
+
+
+def _repair(species, reading, prev_reading, last_health_index):
+    params = simulate.get_species_params(species)
+    return repair_reading(reading, *gradual_reading_ranges(species, prev_reading),
+                          {vital: params[vital]['normal'] for vital in REPAIR_ORDER},
+                          {vital: params[vital]['multiplier'] for vital in REPAIR_ORDER},
+                          (last_health_index - 10, last_health_index + 10))
+
+
+def _histogram(values):
+    counts = np.bincount(np.floor(np.asarray(values)).astype(int), minlength=101)
+    return counts / counts.sum()
+
+
+def test_matches_retry_loop_distribution():
+    """With the retry cap removed, the old loop samples the exact target distribution"""
+    random.seed(11)
+    np.random.seed(11)
+    n = 6000
+
+    expected, draws = [], 0
+    while len(expected) < n:
+        reading, health_index, used = _retry_loop_reading('Cow', PREV, LAST_HEALTH_INDEX, max_draws=10 ** 6)
+        expected.append(health_index)
+        draws += used
+    actual = [_next_reading('Cow', PREV, LAST_HEALTH_INDEX)['health_index'] for _ in range(n)]
+
+    # Total variation distance between the two health index histograms
+    distance = np.abs(_histogram(expected) - _histogram(actual)).sum() / 2
+    print(f"acceptance {n / draws:.0%}, total variation {distance:.3f}")
+    assert draws > 2 * n, "scenario should make the retry loop reject often"
+    assert distance < 0.04
+
+
+def test_repair_lands_inside_window():
+    random.seed(5)
+    np.random.seed(5)
+    repaired = 0
+    for species in list(SPECIES_PARAMS) + ['Llama']:
+        for _ in range(200):
+            prev = simulate.simulate_reading(species)
+            # Somewhere the draw can miss by a lot, but the range can reach
+            last = _health_index(generate_gradual_reading(species, prev), species) + random.uniform(-20, 20)
+            reading = _repair(species, generate_gradual_reading(species, prev), prev, last)
+            if reading is None:
+                continue
+            repaired += 1
+            assert abs(_health_index(reading, species) - last) <= 10, (species, prev, last, reading)
+            # Unless the clamp leaves nothing within the outlier limit of prev, as it does for every draw
+            ranges, _ = gradual_reading_ranges(species, prev)
+            if all(min(abs(value - prev[vital]) for value in ranges[vital]) <= limit or
+                   ranges[vital][0] <= prev[vital] <= ranges[vital][1]
+                   for vital, limit in OUTLIER_LIMITS.items()):
+                assert not is_outlier_reading(reading, prev, species)
+            assert isinstance(reading['blood_pressure'], int)
+    assert repaired > 1300
+
+
+def test_repair_keeps_what_already_fits():
+    reading = {'heart_rate': 81.0, 'body_temp': 39.3, 'blood_pressure': 148, 'movement': 'Inactive'}
+    last = _health_index(reading, 'Cow')
+    assert _repair('Cow', reading, PREV, last) == reading
+
+
+def test_generate_health_data_respects_window():
+    random.seed(3)
+    np.random.seed(3)
+    last, states = {}, {}
+    for cycle in range(20):
+        for i, species in enumerate(SPECIES_PARAMS):
+            tag = f'T-{i}'
+            data = simulate.generate_health_data(tag, species, last.get(tag), states.setdefault(tag, AnimalState()))
+            if tag in last:
+                assert abs(data['health_index'] - last[tag]) <= 10
+            last[tag] = data['health_index']
+
+
+def benchmark(animals=300, cycles=30):
+    """CPU and draws per accepted reading: the old retry loops against the capped loop with repair"""
+    species = list(SPECIES_PARAMS)
+    herd = [(f'B-{i}', species[i % len(species)]) for i in range(animals)]
+    states = {}
+
+    def run(step):
+        random.seed(1)
+        np.random.seed(1)
+        states.clear()
+        last, draws, violations = {}, [], 0
+        start = time.perf_counter()
+        for cycle in range(cycles):
+            for tag, sp in herd:
+                health_index, used = step(tag, sp, last.get(tag))
+                if tag in last and abs(health_index - last[tag]) > 10:
+                    violations += 1
+                last[tag] = health_index
+                draws.append(used)
+        elapsed = time.perf_counter() - start
+        return np.array(draws), violations, elapsed / len(draws) * 1e6
+
+    def old_step(tag, sp, last_index):
+        data, used = _retry_loop_health_data(tag, sp, last_index, states.setdefault(tag, AnimalState()))
+        return data['health_index'], used
+
+    calls = [0]
+    draw = simulate.generate_gradual_reading
+
+    def counting_draw(*args, **kwargs):
+        calls[0] += 1
+        return draw(*args, **kwargs)
+
+    def new_step(tag, sp, last_index):
+        calls[0] = 0
+        data = simulate.generate_health_data(tag, sp, last_index, states.setdefault(tag, AnimalState()))
+        return data['health_index'], calls[0]
+
+    results = {'retry loop': run(old_step)}
+    simulate.generate_gradual_reading = counting_draw
+    try:
+        counted = run(new_step)
+    finally:
+        simulate.generate_gradual_reading = draw
+    # Timed again without the counting wrapper
+    results['capped'] = (counted[0], counted[1], run(new_step)[2])
+
+    print(f"{animals} animals x {cycles} cycles")
+    for name, (draws, violations, us) in results.items():
+        print(f"  {name:<12} draws/reading mean {draws.mean():.2f}  p99 {np.percentile(draws, 99):.0f}  "
+              f"max {draws.max()}  window violations {violations}  {us:.0f} us/reading")
+
+    # A hard case: far from the last stored index, where the old loop rejects most draws
+    random.seed(2)
+    np.random.seed(2)
+    for name, reading_of in (('retry loop', lambda: _retry_loop_health_data('T-1', 'Cow', LAST_HEALTH_INDEX,
+                                                                             AnimalState(**PREV))),
+                             ('capped', lambda: _next_reading('Cow', PREV, LAST_HEALTH_INDEX))):
+        # Best of five runs, the timing least disturbed by the rest of the machine
+        best = min(timeit.repeat(reading_of, number=1000, repeat=5))
+        print(f"  hard case {name:<12} {best / 1000 * 1e6:.0f} us/reading")
+    draws = [_retry_loop_reading('Cow', PREV, LAST_HEALTH_INDEX)[2] or 50 for _ in range(2000)]
+    print(f"  hard case retry loop draws mean {np.mean(draws):.1f}, max {max(draws)}; "
+          f"capped at most {simulate.READING_MAX_DRAWS} + one repair")
+
+
+if __name__ == "__main__":
+    test_matches_retry_loop_distribution()
+    test_repair_lands_inside_window()
+    test_repair_keeps_what_already_fits()
+    test_generate_health_data_respects_window()
+    benchmark()
+    print("✓ Readings stay in the health-index window within a bounded number of draws")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Test PDF health reports: SQL aggregates, date bounds, spooling and memory on a large herd"""
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import db
+import app as app_module
+import health_report
+from health_report import fetch_report_data, render_report
+from conftest import fresh_db
+
+STATUSES = ['Healthy', 'Under Observation', 'Critical']
+
+
+def _setup_app():
+    fresh_db()
+    app_module.init_db()
+    app_module.init_animals_table()
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user'] = 'Farmer'
+        sess['user_email'] = 'farmer@test.com'
+    return client
+
+
+def _add_herd(animals, days, per_day, user_email='farmer@test.com', seed=0):
+    """Insert animals with per_day readings a day from 2025-01-01 on; returns their tags"""
+    rng = random.Random(seed)
+    conn = db.get_db()
+    tags = [f'R-{user_email[0]}{i:05d}' for i in range(animals)]
+    conn.executemany("INSERT INTO animals (tag, name, species, weight, age, gender, user_email) "
+                     "VALUES (?, ?, 'Cow', 500, 4, 'Female', ?)",
+                     [(tag, f'Cow {tag}', user_email) for tag in tags])
+    start = datetime(2025, 1, 1)
+    step = timedelta(days=1) / per_day
+    conn.executemany('''
+        INSERT INTO health_readings (animal_tag, heart_rate, body_temp, blood_pressure, movement, health_index, status, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', ((tag, rng.uniform(50, 90), rng.uniform(37.5, 40), rng.randint(100, 140), 'Normal',
+           rng.uniform(20, 100), rng.choice(STATUSES), (start + step * n).strftime('%Y-%m-%d %H:%M:%S'))
+          for tag in tags for n in range(days * per_day)))
+    conn.commit()
+    return tags
+
+
+def legacy_stats(cursor, tags, date_from, date_to):
+    """The pre-aggregation code path: every reading into Python, stats from lists"""
+    readings = []
+    for tag in tags:
+        cursor.execute('''
+            SELECT * FROM health_readings
+            WHERE animal_tag = ?
+            AND date(timestamp) >= date(?)
+            AND date(timestamp) <= date(?)
+            ORDER BY timestamp DESC
+        ''', (tag, date_from, date_to))
+        readings.extend(cursor.fetchall())
+    stats = {}
+    for reading in readings:
+        entry = stats.setdefault(reading['animal_tag'], {'temps': [], 'hrs': [], 'indexes': [], 'statuses': []})
+        entry['temps'].append(reading['body_temp'])
+        entry['hrs'].append(reading['heart_rate'])
+        entry['indexes'].append(reading['health_index'])
+        entry['statuses'].append(reading['status'])
+    return {tag: (sum(s['temps']) / len(s['temps']), sum(s['hrs']) / len(s['hrs']),
+                  sum(s['indexes']) / len(s['indexes']), s['statuses'], len(s['temps']))
+            for tag, s in stats.items()}
+
+
+def test_aggregates_match_python():
+    _setup_app()
+    tags = _add_herd(animals=5, days=10, per_day=24)
+    cursor = db.get_db().cursor()
+    animals, stats, recent = fetch_report_data(cursor, 'farmer@test.com', 'all', '2025-01-03', '2025-01-07')
+    expected = legacy_stats(cursor, tags, '2025-01-03', '2025-01-07')
+
+    assert set(stats) == set(tags) and [a['tag'] for a in animals] == tags
+    for tag, (temp, hr, index, statuses, count) in expected.items():
+        row = stats[tag]
+        # Whole days, both ends included
+        assert row['readings'] == count == 5 * 24
+        assert abs(row['avg_temp'] - temp) < 1e-9 and abs(row['avg_hr'] - hr) < 1e-9
+        assert abs(row['avg_index'] - index) < 1e-9
+        assert statuses.count(row['common_status']) == max(statuses.count(s) for s in STATUSES)
+
+    # Only the listed rows are fetched: the newest across the whole herd
+    assert len(recent) == 20
+    assert recent[0]['timestamp'].startswith('2025-01-07 23')
+    assert [r['timestamp'] for r in recent] == sorted((r['timestamp'] for r in recent), reverse=True)
+
+
+def test_export_endpoint_streams_pdf():
+    client = _setup_app()
+    _add_herd(animals=3, days=2, per_day=24)
+    _add_herd(animals=2, days=2, per_day=24, user_email='other@test.com')
+
+    response = client.post('/api/export-pdf', json={'animal_tag': 'all', 'date_from': '2025-01-01',
+                                                    'date_to': '2025-01-02'})
+    body = response.get_data()
+    assert response.status_code == 200 and response.mimetype == 'application/pdf'
+    assert body.startswith(b'%PDF') and int(response.headers['Content-Length']) == len(body)
+
+    assert client.post('/api/export-pdf', json={'animal_tag': 'R-o00000', 'date_from': '2025-01-01',
+                                                'date_to': '2025-01-02'}).status_code == 404
+    assert client.post('/api/export-pdf', json={'animal_tag': 'all', 'date_from': '01/01/2025',
+                                                'date_to': '2025-01-02'}).status_code == 400
+
+    # Another user's animals are never in scope
+    _, stats, recent = fetch_report_data(db.get_db().cursor(), 'farmer@test.com', 'all', '2025-01-01', '2025-01-02')
+    assert all(tag.startswith('R-f') for tag in stats) and all(r['animal_tag'].startswith('R-f') for r in recent)
+
+
+def test_large_report_spills_to_disk():
+    _setup_app()
+    _add_herd(animals=300, days=1, per_day=4)
+    report = fetch_report_data(db.get_db().cursor(), 'farmer@test.com', 'all', '2025-01-01', '2025-01-01')
+    real = health_report.Config.REPORT_SPOOL_MAX_BYTES
+    health_report.Config.REPORT_SPOOL_MAX_BYTES = 16 * 1024
+    try:
+        pdf_file, size = render_report(*report, '2025-01-01', '2025-01-01', 'farmer@test.com')
+        with pdf_file:
+            assert pdf_file._rolled and size > 16 * 1024
+            assert pdf_file.read(5) == b'%PDF-'
+    finally:
+        health_report.Config.REPORT_SPOOL_MAX_BYTES = real
+
+
+def benchmark(animals=1000, days=365, per_day=2):
+    """Year report for a large herd: per-tag fetch + Python stats against the SQL aggregates"""
+    client = _setup_app()
+    tags = _add_herd(animals, days, per_day)
+    print(f"{animals} animals, {animals * days * per_day:,} readings")
+    cursor = db.get_db().cursor()
+    for name, run in (('legacy stats', lambda: legacy_stats(cursor, tags, '2025-01-01', '2025-12-31')),
+                      ('sql stats', lambda: fetch_report_data(cursor, 'farmer@test.com', 'all',
+                                                              '2025-01-01', '2025-12-31'))):
+        tracemalloc.start()
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name:>14}: {elapsed:6.2f} s, peak {peak / 1024 / 1024:7.1f} MB")
+
+    start = time.perf_counter()
+    response = client.post('/api/export-pdf', json={'animal_tag': 'all', 'date_from': '2025-01-01',
+                                                    'date_to': '2025-12-31'})
+    size = len(response.get_data())
+    print(f"{'full export':>14}: {time.perf_counter() - start:6.2f} s, {size / 1024:.0f} KB PDF")
+
+
+if __name__ == "__main__":
+    test_aggregates_match_python()
+    test_export_endpoint_streams_pdf()
+    test_large_report_spills_to_disk()
+    benchmark()
+    print("✓ Reports aggregate in SQL and stream from a spooled file")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Test that the vectorized health scorer matches the scalar one exactly"""
+import random
+import time
+
+import numpy as np
+
+from simulate import (SPECIES_PARAMS, MOVEMENT_SCORES, calculate_health_index, calculate_health_index_batch,
+                      classify_health_status, classify_health_status_batch, encode_species, encode_movements,
+                      simulate_reading)
+
+
+def _random_readings(n):
+    species_names = list(SPECIES_PARAMS) + ['Llama']  # Llama exercises DEFAULT_PARAMS
+    movements = list(MOVEMENT_SCORES) + ['Unknown']
+    species, readings = [], []
+    for _ in range(n):
+        sp = random.choice(species_names)
+        reading = simulate_reading(sp, random.choice(['healthy', 'warning', 'ill']))
+        reading['movement'] = random.choice(movements)
+        species.append(sp)
+        readings.append(reading)
+    return species, readings
+
+
+def test_batch_matches_scalar():
+    random.seed(7)
+    np.random.seed(7)
+    species, readings = _random_readings(20000)
+
+    arrays = {key: [r[key] for r in readings] for key in ('heart_rate', 'body_temp', 'blood_pressure', 'movement')}
+    batch = calculate_health_index_batch(arrays, encode_species(species))
+    scalar = [calculate_health_index(r['heart_rate'], r['body_temp'], r['blood_pressure'], r['movement'], sp)
+              for r, sp in zip(readings, species)]
+
+    assert batch.tolist() == scalar
+    assert classify_health_status_batch(batch).tolist() == [classify_health_status(h) for h in scalar]
+
+    # Movement codes and labels are interchangeable
+    arrays['movement'] = encode_movements(arrays['movement'])
+    assert calculate_health_index_batch(arrays, encode_species(species)).tolist() == scalar
+
+
+def test_status_boundaries():
+    assert classify_health_status_batch([0, 39.9, 40, 64.9, 65, 100]).tolist() == \
+        ['Ill', 'Ill', 'Warning', 'Warning', 'Healthy', 'Healthy']
+
+
+def benchmark(n=50000):
+    species, readings = _random_readings(n)
+    arrays = {key: np.array([r[key] for r in readings]) for key in ('heart_rate', 'body_temp', 'blood_pressure')}
+    arrays['movement'] = encode_movements([r['movement'] for r in readings])
+    codes = encode_species(species)
+
+    start = time.perf_counter()
+    for r, sp in zip(readings, species):
+        calculate_health_index(r['heart_rate'], r['body_temp'], r['blood_pressure'], r['movement'], sp)
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    calculate_health_index_batch(arrays, codes)
+    batch_time = time.perf_counter() - start
+
+    print(f"{n} readings: scalar {scalar_time * 1000:.1f} ms, batch {batch_time * 1000:.1f} ms "
+          f"({scalar_time / batch_time:.0f}x)")
+
+
+if __name__ == "__main__":
+    test_batch_matches_scalar()
+    test_status_boundaries()
+    benchmark()
+    print("✓ Batch scoring matches the scalar path")
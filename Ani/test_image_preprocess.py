@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Test image preprocessing: draft decoding, in-place batches, rejections and multi-image uploads"""
+import io
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+import app as app_module
+from image_preprocess import preprocess_image, preprocess_uploads, INPUT_SHAPE
+from prediction_cache import PredictionCache
+from test_inference import StubLoader, TimedModel
+
+
+def _photo_bytes(size=(4032, 3024), seed=0, format='JPEG'):
+    rng = np.random.default_rng(seed)
+    small = Image.fromarray(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8))
+    buffer = io.BytesIO()
+    small.resize(size, Image.BICUBIC).save(buffer, format=format, quality=90)
+    return buffer.getvalue()
+
+
+def _upload(data, name='photo.jpg'):
+    return FileStorage(stream=io.BytesIO(data), filename=name)
+
+
+def legacy_preprocess(stream):
+    """The pipeline before this module, for comparison"""
+    img = Image.open(stream).convert('RGB')
+    img = img.resize((224, 224), Image.BILINEAR)
+    img_array = np.array(img, dtype=np.float32) / 255.0
+    return np.expand_dims(img_array, axis=0)
+
+
+def test_matches_legacy_pipeline():
+    # PNG has no draft mode, so the pixels go through the same resize
+    data = _photo_bytes((800, 600), format='PNG')
+    new = preprocess_image(io.BytesIO(data))
+    old = legacy_preprocess(io.BytesIO(data))[0]
+    assert new.shape == INPUT_SHAPE and new.dtype == np.float32
+    assert np.abs(new - old).max() < 1e-6
+
+    # JPEG is decoded at reduced scale: close, not identical
+    data = _photo_bytes()
+    difference = np.abs(preprocess_image(io.BytesIO(data)) - legacy_preprocess(io.BytesIO(data))[0])
+    assert difference.mean() < 0.02
+
+
+def test_batch_rows_and_rejections():
+    files = [
+        _upload(_photo_bytes((640, 480), seed=1)),
+        _upload(b'not an image', 'notes.txt'),
+        _upload(_photo_bytes((9000, 6000), format='PNG'), 'huge.png'),
+        _upload(_photo_bytes((640, 480), seed=2)),
+    ]
+    batch, results = preprocess_uploads(files, max_bytes=64 * 1024 * 1024, max_pixels=40_000_000)
+    assert results[0] == 0 and results[3] == 1
+    assert results[1][0] == 400
+    assert results[2][0] == 413 and 'megapixels' in results[2][1]
+    assert batch.shape == (2,) + INPUT_SHAPE
+    assert 0 <= batch.min() and batch.max() <= 1
+
+    # Too many bytes is refused without opening the file
+    batch, results = preprocess_uploads([_upload(b'\xff' * 2048)], max_bytes=1024)
+    assert results[0][0] == 413 and len(batch) == 0
+
+
+def test_multi_image_upload():
+    client = app_module.app.test_client()
+    real_loader, real_cache = app_module.model_loader, app_module.prediction_cache
+    model = TimedModel()
+    app_module.model_loader = StubLoader(model, ['Cow - Healthy', 'Cow - Lumpy Skin', 'Goat - Healthy'])
+    app_module.prediction_cache = PredictionCache(max_entries=10, ttl_seconds=60)
+    try:
+        data = {'image': [(io.BytesIO(_photo_bytes((640, 480), seed=seed)), f'{seed}.jpg') for seed in range(3)]
+                + [(io.BytesIO(b'junk'), 'junk.jpg')]}
+        app_module.model_loader.load()
+        calls = len(model.batch_sizes)
+        response = client.post('/predict-image', data=data, content_type='multipart/form-data')
+        results = response.get_json()['results']
+        assert response.status_code == 200 and len(results) == 4
+        assert all('species' in result for result in results[:3])
+        assert results[3]['status'] == 400
+        # The three images shared one predict call
+        assert model.batch_sizes[calls:] == [3]
+    finally:
+        app_module.model_loader, app_module.prediction_cache = real_loader, real_cache
+
+
+def benchmark():
+    """Bytes allocated and latency per image, legacy pipeline against this one"""
+    print(f"{'upload':>12} {'pipeline':>8} {'decoded px':>11} {'numpy alloc':>12} {'ms/image':>9}")
+    for size in ((640, 480), (1920, 1080), (4032, 3024)):
+        data = _photo_bytes(size)
+        with Image.open(io.BytesIO(data)) as img:
+            img.draft('RGB', (224, 224))
+            draft_pixels = img.size[0] * img.size[1]
+        pipelines = [
+            ('legacy', lambda: legacy_preprocess(io.BytesIO(data)), size[0] * size[1]),
+            ('new', lambda: preprocess_uploads([_upload(data)]), draft_pixels),
+        ]
+        for name, run, decoded in pipelines:
+            run()
+            tracemalloc.start()
+            run()
+            allocated = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            start = time.perf_counter()
+            for _ in range(10):
+                run()
+            ms = (time.perf_counter() - start) * 100
+            print(f"{size[0]:>6}x{size[1]:<5} {name:>8} {decoded:>11,} {allocated / 1024:>10.0f} K {ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    test_matches_legacy_pipeline()
+    test_batch_rows_and_rejections()
+    test_multi_image_upload()
+    benchmark()
+    print("✓ Uploads are decoded straight into the batch")
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Test micro-batched inference: batching, failures and the /predict-image endpoint"""
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import app as app_module
+from inference import InferenceBatcher
+from model_loader import ModelLoader
+
+
+class StubLoader(ModelLoader):
+    """ModelLoader whose 'model file' is a TimedModel (None: the model can't be loaded)"""
+
+    def __init__(self, model, labels):
+        super().__init__()
+        self.model = model
+        self.stub_labels = labels
+
+    def _open(self):
+        if self.model is None:
+            raise FileNotFoundError('keras_model.h5')
+        return self.model.predict, 'stub'
+
+    def load(self):
+        if not super().load():
+            return False
+        self.labels = self.stub_labels
+        return True
+
+
+class TimedModel:
+    """Stands in for the Keras model: a fixed cost per predict call plus a cost per image"""
+
+    def __init__(self, classes=3, call_seconds=0.02, image_seconds=0.001):
+        self.classes = classes
+        self.call_seconds = call_seconds
+        self.image_seconds = image_seconds
+        self.batch_sizes = []
+        self._lock = threading.Lock()
+
+    def predict(self, batch, verbose=0):
+        with self._lock:
+            self.batch_sizes.append(len(batch))
+            time.sleep(self.call_seconds + self.image_seconds * len(batch))
+        # Score each image by its mean pixel so results can be matched to inputs
+        scores = np.zeros((len(batch), self.classes), dtype=np.float32)
+        for i, image in enumerate(batch):
+            scores[i, int(image.mean() * self.classes) % self.classes] = 1.0
+        return scores
+
+
+def _image(value):
+    return np.full((224, 224, 3), value, dtype=np.float32)
+
+
+def test_concurrent_requests_share_a_batch():
+    model = TimedModel()
+    batcher = InferenceBatcher(model.predict, max_batch=8, max_wait_ms=50)
+    values = [0.1, 0.5, 0.9] * 4
+    with ThreadPoolExecutor(len(values)) as pool:
+        rows = list(pool.map(lambda v: batcher.submit(_image(v)).result(timeout=5), values))
+
+    # Every caller gets its own row back
+    for value, row in zip(values, rows):
+        assert int(np.argmax(row)) == int(value * 3)
+    assert max(model.batch_sizes) > 1
+    assert all(size <= 8 for size in model.batch_sizes)
+    assert sum(model.batch_sizes) == len(values)
+
+
+def test_failures_reach_every_caller():
+    def broken(batch):
+        raise RuntimeError('model exploded')
+
+    batcher = InferenceBatcher(broken, max_batch=4, max_wait_ms=20)
+    futures = [batcher.submit(_image(0.5)) for _ in range(3)]
+    for future in futures:
+        assert isinstance(future.exception(timeout=5), RuntimeError)
+
+    # The worker keeps going after a failed batch
+    batcher.predict = TimedModel().predict
+    assert batcher.submit(_image(0.5)).result(timeout=5).shape == (3,)
+
+
+def _upload(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (640, 480), color).save(buffer, format='JPEG')
+    buffer.seek(0)
+    return {'image': (buffer, 'cow.jpg')}
+
+
+def test_predict_image_endpoint():
+    client = app_module.app.test_client()
+    real_loader = app_module.model_loader
+    labels = ['Cow - Healthy', 'Cow - Lumpy Skin', 'Goat - Healthy']
+    try:
+        app_module.model_loader = StubLoader(None, labels)
+        response = client.post('/predict-image', data=_upload('white'), content_type='multipart/form-data')
+        assert response.status_code == 503
+        assert 'keras_model.h5' in response.get_json()['error']
+
+        # Loaded on first use, no background thread needed
+        app_module.model_loader = StubLoader(TimedModel(), labels)
+        start = time.perf_counter()
+        response = client.post('/predict-image', data=_upload((200, 200, 200)), content_type='multipart/form-data')
+        elapsed = time.perf_counter() - start
+        data = response.get_json()
+        assert response.status_code == 200, data
+        assert data['species'] == 'Goat' and data['disease'] == 'Healthy'
+        assert data['predictions'][0]['probability'] == 1.0
+        # No artificial delay on the server any more
+        assert elapsed < 2
+
+        bad = client.post('/predict-image', data={'image': (io.BytesIO(b'not an image'), 'x.jpg')},
+                          content_type='multipart/form-data')
+        assert bad.status_code == 400
+    finally:
+        app_module.model_loader = real_loader
+
+
+def benchmark():
+    """Images/sec at several concurrency levels, one predict per image against batched"""
+    print(f"{'concurrency':>11} {'unbatched':>10} {'batched':>10} {'mean batch':>11}")
+    for concurrency in (1, 4, 16, 64):
+        results = []
+        for max_batch in (1, 16):
+            model = TimedModel()
+            batcher = InferenceBatcher(model.predict, max_batch=max_batch, max_wait_ms=10)
+            images = concurrency * 4
+            start = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as pool:
+                list(pool.map(lambda _: batcher.submit(_image(0.5)).result(timeout=60), range(images)))
+            results.append((images / (time.perf_counter() - start), np.mean(model.batch_sizes)))
+        print(f"{concurrency:>11} {results[0][0]:>10.0f} {results[1][0]:>10.0f} {results[1][1]:>11.1f}")
+
+
+if __name__ == "__main__":
+    test_concurrent_requests_share_a_batch()
+    test_failures_reach_every_caller()
+    test_predict_image_endpoint()
+    benchmark()
+    print("✓ Concurrent image predictions are batched")
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Test image model loading: once per process, runtime selection and fallback"""
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import model_loader
+from model_loader import ModelLoader
+
+
+def _model_dir(tflite=False):
+    model_dir = tempfile.mkdtemp()
+    with open(os.path.join(model_dir, 'labels.txt'), 'w') as f:
+        f.write('0 Cow - Healthy\n1 Goat - Healthy\n')
+    if tflite:
+        with open(os.path.join(model_dir, 'model.tflite'), 'wb') as f:
+            f.write(b'TFL3')
+    return model_dir
+
+
+class FakePredictor:
+    """A runtime that opens any model file"""
+    opened = []
+    contents = []
+
+    def __init__(self, path, content=None):
+        FakePredictor.opened.append(os.path.basename(path))
+        FakePredictor.contents.append(content)
+        time.sleep(0.05)
+
+    def __call__(self, batch):
+        return np.ones((len(batch), 2), dtype=np.float32)
+
+
+class MissingRuntime:
+    """A runtime whose package isn't installed"""
+
+    def __init__(self, path, content=None):
+        raise ImportError(f'no runtime for {os.path.basename(path)}')
+
+
+def _patch(tflite_class=MissingRuntime, keras_class=FakePredictor):
+    FakePredictor.opened, FakePredictor.contents = [], []
+    saved = model_loader.TFLitePredictor, model_loader.KerasPredictor
+    model_loader.TFLitePredictor, model_loader.KerasPredictor = tflite_class, keras_class
+    return saved
+
+
+def _restore(saved):
+    model_loader.TFLitePredictor, model_loader.KerasPredictor = saved
+
+
+def test_loads_once_under_concurrent_first_use():
+    saved = _patch()
+    try:
+        loader = ModelLoader(_model_dir(), backend='auto')
+        assert not loader.ready
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(loader.load())) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == [True] * 8
+        assert FakePredictor.opened == ['keras_model.h5']
+        assert loader.runtime == 'keras'
+        assert loader.labels == ['Cow - Healthy', 'Goat - Healthy']
+    finally:
+        _restore(saved)
+
+
+def test_tflite_preferred_with_keras_fallback():
+    # model.tflite exists and its runtime opens: TFLite is used
+    saved = _patch(tflite_class=FakePredictor)
+    try:
+        loader = ModelLoader(_model_dir(tflite=True), backend='auto')
+        assert loader.load() and loader.runtime == 'tflite'
+        assert FakePredictor.opened == ['model.tflite']
+    finally:
+        _restore(saved)
+
+    # No TFLite runtime installed: auto falls back to tf_keras, tflite fails
+    saved = _patch()
+    try:
+        loader = ModelLoader(_model_dir(tflite=True), backend='auto')
+        assert loader.load() and loader.runtime == 'keras'
+        strict = ModelLoader(_model_dir(tflite=True), backend='tflite')
+        assert not strict.load() and 'no runtime' in strict.error
+    finally:
+        _restore(saved)
+
+
+def test_preload_only_reads_the_tflite_file():
+    saved = _patch(tflite_class=FakePredictor)
+    try:
+        # Without model.tflite the master leaves loading to the workers
+        assert not ModelLoader(_model_dir(), backend='auto').preload()
+        # With it, the master only reads the bytes: no interpreter before fork
+        loader = ModelLoader(_model_dir(tflite=True), backend='auto')
+        assert loader.preload() and loader.model_content == b'TFL3'
+        assert FakePredictor.opened == [] and not loader.ready
+        # The worker builds its interpreter from those bytes
+        assert loader.load() and loader.runtime == 'tflite'
+        assert FakePredictor.contents == [b'TFL3']
+    finally:
+        _restore(saved)
+
+
+def test_failed_load_is_retried():
+    saved = _patch(keras_class=MissingRuntime)
+    try:
+        model_dir = _model_dir()
+        loader = ModelLoader(model_dir, backend='keras')
+        assert not loader.load() and not loader.ready
+        model_loader.KerasPredictor = FakePredictor
+        assert loader.load() and loader.error is None
+    finally:
+        _restore(saved)
+
+
+if __name__ == "__main__":
+    test_loads_once_under_concurrent_first_use()
+    test_tflite_preferred_with_keras_fallback()
+    test_preload_only_reads_the_tflite_file()
+    test_failed_load_is_retried()
+    print("✓ The image model loads once, preferring TFLite")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Test /api/predict/batch: top-k per image, test-time augmentation and throughput"""
+import io
+import time
+
+import numpy as np
+
+import app as app_module
+from image_preprocess import preprocess_uploads, TTA_VIEWS
+from prediction_cache import PredictionCache
+from test_image_preprocess import _photo_bytes, _upload
+from test_inference import StubLoader
+
+LABELS = ['Cow - Healthy', 'Cow - Lumpy Skin', 'Goat - Healthy', 'Goat - Mange', 'Sheep - Healthy']
+
+
+class RankingModel:
+    """Scores every class, highest for the one picked by the image's mean brightness"""
+
+    def __init__(self, call_seconds=0.02, image_seconds=0.001):
+        self.call_seconds = call_seconds
+        self.image_seconds = image_seconds
+        self.batch_sizes = []
+
+    def predict(self, batch, verbose=0):
+        self.batch_sizes.append(len(batch))
+        time.sleep(self.call_seconds + self.image_seconds * len(batch))
+        scores = np.tile(np.array([0.05, 0.1, 0.15, 0.2, 0.5], dtype=np.float32), (len(batch), 1))
+        for i, image in enumerate(batch):
+            scores[i] = np.roll(scores[i], int(image.mean() * 10))
+        return scores
+
+
+def _client(model):
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user'] = 'Farmer'
+        sess['user_email'] = 'farmer@test.com'
+    app_module.model_loader = StubLoader(model, LABELS)
+    app_module.model_loader.load()
+    app_module.prediction_cache = PredictionCache(max_entries=100, ttl_seconds=60)
+    return client
+
+
+def _images(count, seed=0):
+    return [(io.BytesIO(_photo_bytes((640, 480), seed=seed + i)), f'cow{seed + i}.jpg') for i in range(count)]
+
+
+def test_top_k_for_every_image():
+    real = app_module.model_loader, app_module.prediction_cache
+    try:
+        model = RankingModel()
+        client = _client(model)
+        calls = len(model.batch_sizes)
+        response = client.post('/api/predict/batch', data={'images': _images(5) + [(io.BytesIO(b'junk'), 'x.jpg')],
+                                                           'top_k': '3'},
+                               content_type='multipart/form-data')
+        data = response.get_json()
+        assert response.status_code == 200, data
+        assert data['count'] == 6 and data['top_k'] == 3 and not data['tta']
+        for result in data['results'][:5]:
+            probabilities = [p['probability'] for p in result['predictions']]
+            assert len(probabilities) == 3 and probabilities == sorted(probabilities, reverse=True)
+            assert probabilities[0] == 0.5
+            assert {'species', 'disease', 'className'} <= set(result['predictions'][0])
+        assert data['results'][5]['status'] == 400 and data['results'][5]['filename'] == 'x.jpg'
+        # Five images, one predict call
+        assert model.batch_sizes[calls:] == [5]
+
+        # top_k is clamped to the number of classes
+        data = client.post('/api/predict/batch', data={'images': _images(1), 'top_k': '50'},
+                           content_type='multipart/form-data').get_json()
+        assert data['top_k'] == len(LABELS) and len(data['results'][0]['predictions']) == len(LABELS)
+
+        assert app_module.app.test_client().post('/api/predict/batch').status_code == 401
+    finally:
+        app_module.model_loader, app_module.prediction_cache = real
+
+
+def test_tta_views_share_the_batch():
+    files = [_upload(_photo_bytes((800, 600), seed=7))]
+    batch, rows = preprocess_uploads(files, tta=True)
+    assert batch.shape[0] == TTA_VIEWS and rows == [0]
+    # The second view is the mirror image of the first
+    assert np.array_equal(batch[1], batch[0][:, ::-1])
+    assert not np.array_equal(batch[2], batch[0])
+
+    real = app_module.model_loader, app_module.prediction_cache
+    try:
+        model = RankingModel()
+        client = _client(model)
+        calls = len(model.batch_sizes)
+        data = client.post('/api/predict/batch', data={'images': _images(4), 'tta': 'true', 'top_k': '5'},
+                           content_type='multipart/form-data').get_json()
+        assert data['tta'] and model.batch_sizes[calls:] == [4 * TTA_VIEWS]
+        # Averaged over the views, probabilities still sum to one
+        for result in data['results']:
+            assert abs(sum(p['probability'] for p in result['predictions']) - 1) < 1e-6
+
+        # Plain and augmented results are cached separately
+        again = client.post('/api/predict/batch', data={'images': _images(4), 'tta': 'true'},
+                            content_type='multipart/form-data').get_json()
+        assert all(result['cached'] for result in again['results'])
+        plain = client.post('/api/predict/batch', data={'images': _images(4)},
+                            content_type='multipart/form-data').get_json()
+        assert not any(result['cached'] for result in plain['results'])
+    finally:
+        app_module.model_loader, app_module.prediction_cache = real
+
+
+def benchmark():
+    """Per-image time: N separate /predict-image calls against one /api/predict/batch call"""
+    real = app_module.model_loader, app_module.prediction_cache
+    try:
+        print(f"{'images':>6} {'separate ms/img':>16} {'batch ms/img':>13} {'batch+tta ms/img':>17}")
+        for count in (4, 16, 32):
+            timings = []
+            client = _client(RankingModel())
+            start = time.perf_counter()
+            for image in _images(count, seed=100):
+                client.post('/predict-image', data={'image': image}, content_type='multipart/form-data')
+            timings.append((time.perf_counter() - start) * 1000 / count)
+            for form in ({}, {'tta': 'true'}):
+                client = _client(RankingModel())
+                start = time.perf_counter()
+                client.post('/api/predict/batch', data={'images': _images(count, seed=100), **form},
+                            content_type='multipart/form-data')
+                timings.append((time.perf_counter() - start) * 1000 / count)
+            print(f"{count:>6} {timings[0]:>16.1f} {timings[1]:>13.1f} {timings[2]:>17.1f}")
+    finally:
+        app_module.model_loader, app_module.prediction_cache = real
+
+
+if __name__ == "__main__":
+    test_top_k_for_every_image()
+    test_tta_views_share_the_batch()
+    benchmark()
+    print("✓ Batch predictions return top-k per image")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Test the prediction cache: exact-match keys, LRU/TTL eviction and the endpoint"""
+import io
+import time
+
+import numpy as np
+from PIL import Image
+
+import app as app_module
+from prediction_cache import PredictionCache, cache_key
+from test_inference import StubLoader, TimedModel
+
+
+def _photo(seed, size=(640, 480)):
+    """A smooth random 'photo' (noise alone has no structure to survive resizing)"""
+    rng = np.random.default_rng(seed)
+    small = Image.fromarray(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8))
+    return small.resize(size, Image.BICUBIC)
+
+
+def _jpeg(img, quality=90):
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=quality)
+    buffer.seek(0)
+    return buffer
+
+
+def _key(buffer):
+    return cache_key(app_module.preprocess_image(buffer))
+
+
+def test_key_matches_same_picture():
+    original = _photo(1)
+    key = _key(_jpeg(original))
+    assert len(key) == 32
+    # The same file uploaded again
+    assert _key(_jpeg(original)) == key
+    # Different pictures get different keys
+    keys = {_key(_jpeg(_photo(seed))) for seed in range(20)}
+    assert len(keys) == 20
+
+
+def test_key_tells_lookalikes_apart():
+    image = app_module.preprocess_image(_jpeg(_photo(1)))
+    assert cache_key(image) == cache_key(image.copy())
+    # Evenly brighter, or re-encoded: another picture as far as the cache goes
+    assert cache_key(image + 0.01) != cache_key(image)
+    assert _key(_jpeg(_photo(1), quality=75)) != cache_key(image)
+
+
+def test_lru_ttl_and_counters():
+    cache = PredictionCache(max_entries=2, ttl_seconds=0.2)
+    cache.put(b'a', {'species': 'Cow'})
+    cache.put(b'b', {'species': 'Goat'})
+    assert cache.get(b'a') == {'species': 'Cow'}
+    cache.put(b'c', {'species': 'Sheep'})  # evicts b, the least recently used
+    assert cache.get(b'b') is None
+    assert cache.get(b'c') == {'species': 'Sheep'}
+    time.sleep(0.25)
+    assert cache.get(b'a') is None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['expirations']) == (2, 2, 1, 1)
+    assert stats['entries'] == 1 and stats['hit_rate'] == 0.5
+
+
+def test_repeat_upload_skips_the_model():
+    client = app_module.app.test_client()
+    real_loader, real_cache = app_module.model_loader, app_module.prediction_cache
+    model = TimedModel()
+    app_module.model_loader = StubLoader(model, ['Cow - Healthy', 'Cow - Lumpy Skin', 'Goat - Healthy'])
+    app_module.prediction_cache = PredictionCache(max_entries=10, ttl_seconds=60)
+    try:
+        photo = _photo(3)
+        first = client.post('/predict-image', data={'image': (_jpeg(photo), 'a.jpg')},
+                            content_type='multipart/form-data').get_json()
+        calls = len(model.batch_sizes)
+        again = client.post('/predict-image', data={'image': (_jpeg(photo), 'b.jpg')},
+                            content_type='multipart/form-data').get_json()
+        assert not first['cached'] and again['cached']
+        assert again['species'] == first['species'] and again['confidence'] == first['confidence']
+        assert len(model.batch_sizes) == calls
+        # Re-encoded, the pixels differ: scored again
+        reencoded = client.post('/predict-image', data={'image': (_jpeg(photo, quality=75), 'c.jpg')},
+                                content_type='multipart/form-data').get_json()
+        assert not reencoded['cached'] and len(model.batch_sizes) == calls + 1
+
+        assert client.get('/api/admin/predict-cache').status_code == 401
+        with client.session_transaction() as sess:
+            sess['admin'] = 'admin'
+        stats = client.get('/api/admin/predict-cache').get_json()['cache']
+        assert stats['hits'] == 1 and stats['misses'] == 2
+    finally:
+        app_module.model_loader, app_module.prediction_cache = real_loader, real_cache
+
+
+if __name__ == "__main__":
+    test_key_matches_same_picture()
+    test_key_tells_lookalikes_apart()
+    test_lru_ttl_and_counters()
+    test_repeat_upload_skips_the_model()
+    print("✓ Repeat uploads are answered from the prediction cache")
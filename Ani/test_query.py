@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 import sqlite3
+from db import DB_PATH
 import sys
 
 try:
     print("Testing database connection...")
-    conn = sqlite3.connect('users.db')
+    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
     # Test the exact query
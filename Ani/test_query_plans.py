@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""EXPLAIN QUERY PLAN regression test: the hot queries in app.py must use an index"""
+import re
+
+import db
+import app as app_module
+from conftest import fresh_db
+
+# Tables that grow without bound and must never be scanned in full by a hot endpoint
+HOT_TABLES = ['health_readings', 'notifications', 'appointment_queue', 'treatment_history', 'confirmed_appointments']
+SQL_KEYWORDS = {'WHERE', 'ORDER', 'GROUP', 'LEFT', 'JOIN', 'ON', 'SET', 'LIMIT', 'INNER', 'VALUES'}
+
+
+def _setup_app():
+    """Initialise a fresh database with some data and return logged-in user/vet clients"""
+    fresh_db()
+    app_module.init_db()
+    app_module.init_animals_table()
+
+    user = app_module.app.test_client()
+    user.post('/signup', data={'full_name': 'Plan Test', 'email': 'plan@test.com', 'mobile': '1', 'password': 'pw'})
+    user.get('/logout')
+    user.post('/login', data={'email': 'plan@test.com', 'password': 'pw'})
+    for _ in range(3):
+        app_module.scheduled_health_reading_job()
+
+    vet = app_module.app.test_client()
+    vet.post('/vetlogin', data={'email': 'aman@gmail.com', 'password': '12345'})
+    return user, vet
+
+
+def _capture_statements(client_calls):
+    """Run the given requests and return every SELECT/UPDATE/DELETE they executed"""
+    statements = []
+    conn = db.get_db()
+    conn.set_trace_callback(statements.append)
+    try:
+        for call in client_calls:
+            call()
+    finally:
+        conn.set_trace_callback(None)
+    return [s for s in statements if s.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE'))]
+
+
+def _hot_names(statement):
+    """Names a hot table can appear under in a plan: the table itself plus any alias"""
+    names = set()
+    for table in HOT_TABLES:
+        for match in re.finditer(rf'\b{table}\b(?:\s+(?:AS\s+)?(\w+))?', statement, re.IGNORECASE):
+            names.add(table)
+            alias = match.group(1)
+            if alias and alias.upper() not in SQL_KEYWORDS:
+                names.add(alias)
+    return names
+
+
+def _full_scans(statement):
+    """Return the plan lines that scan a hot table without an index"""
+    conn = db.get_db()
+    names = _hot_names(statement)
+    plan = conn.execute(f'EXPLAIN QUERY PLAN {statement}').fetchall()
+    return [
+        row['detail'] for row in plan
+        if row['detail'].startswith('SCAN ') and 'INDEX' not in row['detail']
+        and row['detail'].split()[1] in names
+    ]
+
+
+def test_hot_queries_use_indexes():
+    user, vet = _setup_app()
+    tag = list(user.get('/api/animals/status').get_json()['animals'])[0]
+    user.post('/api/appointments', json={'animal_tag': tag, 'health_status': 'Ill', 'health_index': 30})
+
+    statements = _capture_statements([
+        lambda: user.get('/api/animals/status'),
+        lambda: user.get(f'/api/health-readings/{tag}'),
+        lambda: user.get('/api/health-readings/all'),
+        lambda: user.get(f'/api/trend-data/{tag}?period=1day'),
+        lambda: user.get(f'/api/trend-data/{tag}?period=7days'),
+        lambda: user.get(f'/api/check-consecutive-readings/{tag}'),
+        lambda: user.get(f'/api/appointments/check/{tag}'),
+        lambda: user.post('/api/export-pdf', json={'animal_tag': 'all', 'date_from': '2025-01-01', 'date_to': '2099-12-31'}),
+        lambda: user.post('/api/export-pdf', json={'animal_tag': tag, 'date_from': '2025-01-01', 'date_to': '2099-12-31'}),
+        lambda: user.get('/api/notifications'),
+        lambda: user.get('/api/notifications/unread'),
+        lambda: vet.get('/api/appointments'),
+        lambda: vet.get('/api/vet/stats'),
+        lambda: vet.get('/api/vet/treatment-history'),
+        lambda: vet.get('/api/vet/confirmed-appointments'),
+    ])
+
+    hot = [s for s in statements if any(t in s for t in HOT_TABLES)]
+    assert hot, "No hot queries were captured"
+
+    failures = {}
+    for statement in hot:
+        scans = _full_scans(statement)
+        if scans:
+            failures[' '.join(statement.split())[:120]] = scans
+    assert not failures, f"Queries doing full table scans: {failures}"
+
+
+if __name__ == "__main__":
+    test_hot_queries_use_indexes()
+    print("✓ All hot queries use an index")
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Test non-blocking reading triggers: scoped jobs, progress, coalescing and one cycle at a time"""
+import threading
+import time
+
+import db
+import app as app_module
+from reading_jobs import ReadingJobQueue
+from conftest import fresh_db
+
+
+def _setup_app():
+    """Fresh database with two users who each own sample animals"""
+    fresh_db()
+    app_module.init_db()
+    app_module.init_animals_table()
+
+    clients = {}
+    for email in ('one@test.com', 'two@test.com'):
+        client = app_module.app.test_client()
+        client.post('/signup', data={'full_name': email, 'email': email, 'mobile': '1', 'password': 'pw'})
+        client.get('/logout')
+        client.post('/login', data={'email': email, 'password': 'pw'})
+        clients[email] = client
+    return clients
+
+
+def _readings_per_owner():
+    rows = db.get_db().execute('''
+        SELECT a.user_email, COUNT(*) AS n FROM health_readings hr
+        JOIN animals a ON a.tag = hr.animal_tag GROUP BY a.user_email
+    ''')
+    return {row['user_email']: row['n'] for row in rows}
+
+
+def test_trigger_is_scoped_and_reports_progress():
+    clients = _setup_app()
+    response = clients['one@test.com'].post('/api/trigger-reading')
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+
+    job = app_module.reading_jobs.wait(job_id, timeout=10)
+    assert job['status'] == 'done'
+    assert job['count'] == job['total'] == job['done'] > 0
+
+    # Only the caller's animals got a reading
+    assert _readings_per_owner() == {'one@test.com': job['count']}
+
+    data = clients['one@test.com'].get(f'/api/jobs/{job_id}').get_json()
+    assert data['job']['status'] == 'done'
+    assert clients['two@test.com'].get(f'/api/jobs/{job_id}').status_code == 404
+
+
+def test_duplicate_triggers_are_coalesced():
+    clients = _setup_app()
+    release = threading.Event()
+    real_run = app_module.reading_jobs.run_job
+
+    def slow_run(user_email, progress):
+        release.wait(10)
+        return real_run(user_email, progress)
+
+    app_module.reading_jobs.run_job = slow_run
+    try:
+        ids = {clients['one@test.com'].post('/api/trigger-reading').get_json()['job_id'] for _ in range(5)}
+        other = clients['two@test.com'].post('/api/trigger-reading').get_json()['job_id']
+        assert len(ids) == 1, "a queued or running job absorbs repeat triggers"
+        assert other not in ids, "coalescing is per user"
+        release.set()
+        job_id = ids.pop()
+        assert app_module.reading_jobs.wait(job_id, timeout=10)['status'] == 'done'
+        assert app_module.reading_jobs.wait(other, timeout=10)['status'] == 'done'
+    finally:
+        app_module.reading_jobs.run_job = real_run
+
+    # A trigger just after the job finished reuses it
+    data = clients['one@test.com'].post('/api/trigger-reading').get_json()
+    assert data['coalesced'] and data['job_id'] == job_id
+    assert _readings_per_owner()['one@test.com'] == data['job']['count']
+
+
+def test_window_expiry_and_failures():
+    _setup_app()
+    calls = []
+
+    def run_job(user_email, progress):
+        calls.append(user_email)
+        progress(0, 1)
+        if len(calls) == 2:
+            raise RuntimeError('disk full')
+        progress(1, 1)
+        return 1
+
+    jobs = ReadingJobQueue(run_job, coalesce_seconds=0.2, stale_seconds=60)
+    first, _ = jobs.submit('one@test.com')
+    assert jobs.wait(first['id'], timeout=5)['status'] == 'done'
+    time.sleep(0.3)
+
+    second, coalesced = jobs.submit('one@test.com')
+    assert not coalesced and second['id'] != first['id']
+    failed = jobs.wait(second['id'], timeout=5)
+    assert failed['status'] == 'failed' and failed['error'] == 'disk full'
+
+    # A failed job does not absorb the retry
+    third, coalesced = jobs.submit('one@test.com')
+    assert not coalesced
+    assert jobs.wait(third['id'], timeout=5)['status'] == 'done'
+
+
+
+def test_long_job_keeps_absorbing_triggers():
+    _setup_app()
+
+    def run_job(user_email, progress):
+        # Much longer than the stale window, but moving
+        for done in range(1, 9):
+            progress(done, 8)
+            time.sleep(0.1)
+        return 8
+
+    jobs = ReadingJobQueue(run_job, coalesce_seconds=60, stale_seconds=0.3)
+    first, _ = jobs.submit('one@test.com')
+    time.sleep(0.6)
+    job, coalesced = jobs.submit('one@test.com')
+    assert coalesced and job['id'] == first['id'] and job['status'] == 'running' and job['done'] > 0
+    assert jobs.wait(first['id'], timeout=5)['done'] == 8
+
+
+def test_cycles_never_overlap():
+    clients = _setup_app()
+    real_shards = app_module.generate_reading_shards
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow_shards(*args):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            time.sleep(0.2)
+            yield from real_shards(*args)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    app_module.generate_reading_shards = slow_shards
+    try:
+        # A triggered job in the job thread while the scheduler runs a full cycle
+        scheduled = threading.Thread(target=app_module.scheduled_health_reading_job)
+        scheduled.start()
+        job_id = clients['one@test.com'].post('/api/trigger-reading').get_json()['job_id']
+        scheduled.join()
+        job = app_module.reading_jobs.wait(job_id, timeout=10)
+    finally:
+        app_module.generate_reading_shards = real_shards
+
+    assert job['status'] == 'done' and peak[0] == 1
+    counts = _readings_per_owner()
+    assert counts['two@test.com'] * 2 == counts['one@test.com'] == job['count'] * 2
+
+def benchmark():
+    """Time to answer a trigger: the old synchronous cycle against enqueueing a job"""
+    clients = _setup_app()
+    client = clients['one@test.com']
+    start = time.perf_counter()
+    app_module.scheduled_health_reading_job()
+    sync_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    job_id = client.post('/api/trigger-reading').get_json()['job_id']
+    queued_ms = (time.perf_counter() - start) * 1000
+    app_module.reading_jobs.wait(job_id, timeout=10)
+    print(f"synchronous cycle {sync_ms:.1f} ms, trigger response {queued_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    test_trigger_is_scoped_and_reports_progress()
+    test_duplicate_triggers_are_coalesced()
+    test_window_expiry_and_failures()
+    test_long_job_keeps_absorbing_triggers()
+    test_cycles_never_overlap()
+    benchmark()
+    print("✓ Reading triggers are queued, scoped and coalesced")
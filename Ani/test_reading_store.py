@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""Test the compact reading archive: exact round trips, reports across both tiers, size and scan speed"""
+import random
+import time
+from datetime import datetime, timedelta
+
+import db
+from config import Config
+from health_report import fetch_report_data, summarize_groups
+from reading_store import (encode_block, decode_block, reading_at, archive_readings, to_epoch, from_epoch,
+                           RowStore, BlockStore, ReadingRepository)
+from retention import run_retention
+from test_health_report import _setup_app, _add_herd
+
+MOVEMENTS = ['Active', 'Normal', 'Inactive', 'Low', 'Lying Down']
+STATUSES = ['Healthy', 'Warning', 'Ill']
+
+
+def _no_pause(seconds):
+    pass
+
+
+def _reading_key(reading):
+    return reading['timestamp'], reading['animal_tag']
+
+
+def test_block_round_trip():
+    readings = [
+        {'timestamp': '2025-03-01 10:05:00', 'heart_rate': 72.5, 'body_temp': 38.6, 'blood_pressure': 120,
+         'movement': 'Normal', 'health_index': 81.3, 'status': 'Healthy'},
+        # Out of order, a vital that isn't a whole tenth and a label outside the simulator's
+        {'timestamp': '2025-03-01 10:00:00', 'heart_rate': 70.0, 'body_temp': 38.123456, 'blood_pressure': 300,
+         'movement': 'Grazing', 'health_index': 64.9, 'status': 'Warning'},
+        {'timestamp': '2025-03-02 00:00:00', 'heart_rate': 149.9, 'body_temp': 41.9, 'blood_pressure': 70,
+         'movement': 'Normal', 'health_index': 0.0, 'status': 'Ill'},
+    ]
+    first_ts, last_ts, payload = encode_block(readings)
+    assert (first_ts, last_ts) == (to_epoch('2025-03-01 10:00:00'), to_epoch('2025-03-02 00:00:00'))
+    assert from_epoch(first_ts) == '2025-03-01 10:00:00'
+
+    columns, labels = decode_block(payload)
+    expected = sorted(readings, key=lambda reading: reading['timestamp'])
+    assert columns['ts'].tolist() == [to_epoch(reading['timestamp']) for reading in expected]
+    # Decoded to plain Python values, equal to what went in
+    decoded = [reading_at('T-001', columns, labels, i) for i in range(len(expected))]
+    assert decoded == [dict(reading, animal_tag='T-001') for reading in expected]
+    assert [type(reading['blood_pressure']) for reading in decoded] == [int] * 3
+
+
+def test_report_spans_both_tiers():
+    _setup_app()
+    tags = _add_herd(animals=5, days=10, per_day=24, seed=3)
+    cursor = db.get_db().cursor()
+    ranges = [('2025-01-01', '2025-01-10'), ('2025-01-02', '2025-01-03'), ('2025-01-05', '2025-01-06')]
+    before = {dates: fetch_report_data(cursor, 'farmer@test.com', 'all', *dates) for dates in ranges}
+
+    # Archive everything before midday on the 5th, in small batches
+    conn = db.get_db()
+    moved, batches = archive_readings(conn, to_epoch('2025-01-05 12:00:00'), 500, 0, 64, _no_pause)
+    assert moved == 5 * 24 * 4 + 5 * 12 and batches == moved // 500 + 1
+    assert conn.execute("SELECT COUNT(*) FROM health_readings WHERE timestamp < '2025-01-05 12:00:00'").fetchone()[0] == 0
+    assert conn.execute('SELECT SUM(reading_count) FROM health_reading_blocks').fetchone()[0] == moved
+    # 108 readings an animal: topped up to 64, then a second block
+    assert [row[0] for row in conn.execute('SELECT reading_count FROM health_reading_blocks '
+                                           'WHERE animal_tag = ? ORDER BY last_ts', (tags[0],))] == [64, 44]
+
+    # Whole range, archive only, and a day split across the tiers: the same report
+    for dates in ranges:
+        _, stats, recent = fetch_report_data(cursor, 'farmer@test.com', 'all', *dates)
+        _, old_stats, old_recent = before[dates]
+        assert set(stats) == set(old_stats) == set(tags)
+        for tag, row in stats.items():
+            old = old_stats[tag]
+            # Ties between statuses may resolve either way; the winning count may not
+            assert row['readings'] == old['readings'] and row['status_count'] == old['status_count']
+            assert abs(row['avg_temp'] - old['avg_temp']) < 1e-9 and abs(row['avg_index'] - old['avg_index']) < 1e-9
+        # The herd shares timestamps, so compare in (timestamp, tag) order
+        assert sorted(map(dict, recent), key=_reading_key) == sorted(map(dict, old_recent), key=_reading_key), dates
+
+    # One animal, straight from the archive
+    _, stats, recent = fetch_report_data(cursor, 'farmer@test.com', tags[2], '2025-01-02', '2025-01-02', 5)
+    assert stats[tags[2]]['readings'] == 24
+    assert [reading['timestamp'] for reading in recent] == [f'2025-01-02 {hour}:00:00' for hour in range(23, 18, -1)]
+
+
+def test_retention_archives_or_drops():
+    _setup_app()
+    _add_herd(animals=2, days=4, per_day=24)
+    now = datetime(2025, 1, 5)
+
+    class Archive(Config):
+        READING_RETENTION_DAYS = 2
+        RETENTION_DELETE_BATCH = 50
+        READING_ARCHIVE = True
+
+    report = run_retention(now=now, config=Archive, sleep=_no_pause)
+    assert report['archived_readings'] == report['deleted_readings'] == 2 * 2 * 24
+    _, stats, _ = fetch_report_data(db.get_db().cursor(), 'farmer@test.com', 'all', '2025-01-01', '2025-01-04')
+    assert sum(row['readings'] for row in stats.values()) == 2 * 4 * 24
+
+    class Drop(Archive):
+        READING_RETENTION_DAYS = 1
+        READING_ARCHIVE = False
+
+    report = run_retention(now=now, config=Drop, sleep=_no_pause)
+    assert report['deleted_readings'] == 2 * 24 and report['archived_readings'] == 0
+    blocks = db.get_db().execute('SELECT SUM(reading_count) FROM health_reading_blocks').fetchone()[0]
+    assert blocks == 2 * 2 * 24
+
+
+def _table_bytes(conn, *names):
+    marks = ','.join('?' * len(names))
+    return conn.execute(f'SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name IN ({marks})', names).fetchone()[0]
+
+
+def benchmark(animals=100, days=30, every_minutes=5):
+    """Bytes per reading and report scan time, health_readings rows against archive blocks"""
+    _setup_app()
+    conn = db.get_db()
+    rng = random.Random(0)
+    tags = [f'C-{i:04d}' for i in range(animals)]
+    conn.executemany("INSERT INTO animals (tag, name, species, user_email) VALUES (?, ?, 'Cow', 'farmer@test.com')",
+                     [(tag, tag) for tag in tags])
+    start = datetime(2025, 1, 1)
+    count = days * 24 * 60 // every_minutes
+    # Rows as the simulator writes them: a cycle every few minutes, vitals to one decimal
+    conn.executemany('''
+        INSERT INTO health_readings (animal_tag, heart_rate, body_temp, blood_pressure, movement, health_index, status, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', ((tag, round(rng.gauss(70, 8), 1), round(rng.gauss(38.6, 0.4), 1), rng.randint(100, 140),
+           rng.choice(MOVEMENTS), round(rng.uniform(20, 100), 1), rng.choice(STATUSES),
+           (start + timedelta(minutes=every_minutes * n)).strftime('%Y-%m-%d %H:%M:%S'))
+          for n in range(count) for tag in tags))
+    conn.commit()
+    total = animals * count
+    print(f"{animals} animals, {total:,} readings")
+
+    date_to = (start + timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    scopes = [('herd', 'animal_tag IN (SELECT tag FROM animals WHERE user_email = ?)', ('farmer@test.com',)),
+              ('one animal', 'animal_tag = ?', (tags[0],))]
+
+    def scan(store):
+        times = []
+        for _, scope, params in scopes:
+            began = time.perf_counter()
+            summarize_groups(store.status_groups(conn.cursor(), scope, params, '2025-01-01', date_to))
+            store.recent(conn.cursor(), scope, params, '2025-01-01', date_to, 20)
+            times.append(time.perf_counter() - began)
+        return times
+
+    row_bytes = _table_bytes(conn, 'health_readings', 'idx_health_readings_tag_ts')
+    row_times = scan(RowStore())
+    began = time.perf_counter()
+    archive_readings(conn, to_epoch('9999-12-31'), Config.RETENTION_DELETE_BATCH, 0,
+                     Config.READING_ARCHIVE_BLOCK_SIZE, _no_pause)
+    archive_seconds = time.perf_counter() - began
+    block_bytes = _table_bytes(conn, 'health_reading_blocks', 'idx_health_reading_blocks_tag_time')
+    block_times = scan(BlockStore())
+    assert ReadingRepository().status_groups(conn.cursor(), *scopes[0][1:], '2025-01-01', date_to)
+
+    print(f"{'rows':>7}: {row_bytes / 1024 / 1024:7.1f} MB, {row_bytes / total:5.1f} bytes/reading")
+    print(f"{'blocks':>7}: {block_bytes / 1024 / 1024:7.1f} MB, {block_bytes / total:5.1f} bytes/reading "
+          f"(archived in {archive_seconds:.1f} s)")
+    for (name, _, _), row_time, block_time in zip(scopes, row_times, block_times):
+        print(f"{name:>10} report scan: rows {row_time * 1000:8.1f} ms, blocks {block_time * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    test_block_round_trip()
+    test_report_spans_both_tiers()
+    test_retention_archives_or_drops()
+    benchmark()
+    print("✓ Archived readings are compact and still reported")
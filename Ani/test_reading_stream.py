@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Test the SSE reading stream: fan-out per user, status changes and the endpoint"""
+import json
+import queue
+import threading
+
+import db
+import app as app_module
+from reading_stream import ReadingBroker
+from conftest import fresh_db
+
+
+def _setup_app():
+    """Fresh database with two users who each own sample animals"""
+    fresh_db()
+    app_module.init_db()
+    app_module.init_animals_table()
+
+    clients = {}
+    for email in ('one@test.com', 'two@test.com'):
+        client = app_module.app.test_client()
+        client.post('/signup', data={'full_name': email, 'email': email, 'mobile': '1', 'password': 'pw'})
+        client.get('/logout')
+        client.post('/login', data={'email': email, 'password': 'pw'})
+        clients[email] = client
+    return clients
+
+
+def _owned_tags(email):
+    rows = db.get_db().execute('SELECT tag FROM animals WHERE user_email = ? AND is_active = 1', (email,))
+    return {row['tag'] for row in rows}
+
+
+def _drain(subscription):
+    events = []
+    while True:
+        try:
+            events.append(subscription.get(timeout=0))
+        except queue.Empty:
+            return events
+
+
+def test_fan_out_to_owning_users():
+    _setup_app()
+    broker = ReadingBroker(poll_seconds=3600)
+    ones = [broker.subscribe('one@test.com') for _ in range(3)]
+    two = broker.subscribe('two@test.com')
+    broker.poll()  # baseline
+
+    app_module.scheduled_health_reading_job()
+    assert broker.poll() > 0
+
+    one_tags = _owned_tags('one@test.com')
+    for subscription in ones:
+        events = dict(_drain(subscription))
+        assert {r['animal_tag'] for r in events['readings']['readings']} == one_tags
+        assert set(events['readings']['consecutive']) == one_tags
+        # First readings ever: every animal's status changed from nothing
+        assert {c['animal_tag'] for c in events['status']['changes']} == one_tags
+    two_events = dict(_drain(two))
+    assert {r['animal_tag'] for r in two_events['readings']['readings']} == _owned_tags('two@test.com')
+
+    # Only real changes are reported on later cycles
+    app_module.scheduled_health_reading_job()
+    broker.poll()
+    events = dict(_drain(ones[0]))
+    latest = {r['animal_tag']: r['status'] for r in events['readings']['readings']}
+    changes = {c['animal_tag']: c for c in events.get('status', {}).get('changes', [])}
+    for tag, change in changes.items():
+        assert change['previous_status'] != change['status'] == latest[tag]
+
+    # Unsubscribed clients get nothing more
+    for subscription in ones + [two]:
+        broker.unsubscribe(subscription)
+    app_module.scheduled_health_reading_job()
+    assert broker.poll() == 0
+    assert broker.subscriber_count() == 0
+
+
+def test_slow_client_is_closed():
+    _setup_app()
+    broker = ReadingBroker(poll_seconds=3600, max_events=2)
+    slow = broker.subscribe('one@test.com')
+    broker.poll()
+    for _ in range(3):
+        app_module.scheduled_health_reading_job()
+        broker.poll()
+    assert _drain(slow)[-1] == (None, None)
+    assert broker.subscriber_count() == 0
+
+
+def test_stream_endpoint():
+    clients = _setup_app()
+    response = clients['one@test.com'].get('/api/stream/readings', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = (chunk.decode() for chunk in response.response)
+    assert next(chunks).startswith('retry:')
+
+    # The broker's first poll sets the baseline; then a committed cycle is pushed
+    received = []
+    reader = threading.Thread(target=lambda: received.extend(next(chunks) for _ in range(2)))
+    app_module.reading_broker.poll()
+    reader.start()
+    app_module.scheduled_health_reading_job()
+    reader.join(timeout=10)
+    response.close()
+
+    events = [chunk for chunk in received if chunk.startswith('event:')]
+    assert events, received
+    name, data = events[0].split('\n')[:2]
+    assert name == 'event: readings'
+    payload = json.loads(data[len('data: '):])
+    assert {r['animal_tag'] for r in payload['readings']} == _owned_tags('one@test.com')
+
+    assert app_module.app.test_client().get('/api/stream/readings').status_code == 401
+
+
+if __name__ == "__main__":
+    test_fan_out_to_owning_users()
+    test_slow_client_is_closed()
+    test_stream_endpoint()
+    print("✓ Reading stream fans out committed readings")
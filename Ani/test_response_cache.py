@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""Test the API response cache: hits until a write bumps a version, per-user keys, ETags and 304s"""
+import time
+from datetime import datetime
+
+import db
+import app as app_module
+from reading_store import archive_readings, to_epoch
+from readings import save_health_readings
+from response_cache import ResponseCache, read_versions
+from test_health_report import _setup_app, _add_herd
+from test_trend_rollups import _rows
+from user import deactivate_animal
+
+
+def _fresh_cache(max_entries=100, ttl_seconds=60):
+    cache = app_module.response_cache
+    cache.clear()
+    cache.max_entries, cache.ttl_seconds = max_entries, ttl_seconds
+    cache.hits = cache.misses = cache.invalidations = cache.not_modified = 0
+    return cache
+
+
+def _login(email):
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user'] = email.split('@')[0]
+        sess['user_email'] = email
+    return client
+
+
+def test_lru_ttl_and_versions():
+    cache = ResponseCache(max_entries=2, ttl_seconds=0.2)
+    cache.put('a', (1,), b'{}', 'etag-a')
+    cache.put('b', (1,), b'[]', 'etag-b')
+    assert cache.get('a', (1,)) == (b'{}', 'etag-a')
+    cache.put('c', (1,), b'""', 'etag-c')  # evicts b, the least recently used
+    assert cache.get('b', (1,)) is None
+    # A bumped version drops the entry
+    assert cache.get('c', (2,)) is None and cache.get('c', (1,)) is None
+    time.sleep(0.25)
+    assert cache.get('a', (1,)) is None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['invalidations'], stats['evictions'], stats['expirations']) == \
+        (1, 4, 1, 1, 1)
+
+
+def test_writes_invalidate_cached_responses():
+    _setup_app()
+    cache = _fresh_cache()
+    tags = _add_herd(animals=2, days=1, per_day=4)
+    client = _login('farmer@test.com')
+    conn = db.get_db()
+
+    first = client.get('/api/health-readings/all?limit=2')
+    assert first.headers['X-Cache'] == 'MISS' and first.get_json()['count'] == 4
+    again = client.get('/api/health-readings/all?limit=2')
+    assert again.headers['X-Cache'] == 'HIT' and again.data == first.data
+    # Other arguments are another entry
+    assert client.get('/api/health-readings/all?limit=3').headers['X-Cache'] == 'MISS'
+
+    # A new reading, saved the way the scheduler does
+    save_health_readings(conn.cursor(), [(tags[0], 70, 38.5, 120, 'Normal', 88.0, 'Healthy', '2025-01-02 00:00:00')])
+    conn.commit()
+    fresh = client.get('/api/health-readings/all?limit=2')
+    assert fresh.headers['X-Cache'] == 'MISS'
+    assert fresh.get_json()['readings'][tags[0]][0]['timestamp'] == '2025-01-02 00:00:00'
+    status = client.get('/api/animals/status').get_json()['animals']
+    assert status[tags[0]]['last_reading'] == '2025-01-02 00:00:00'
+
+    # Animal added and removed: both animal lists follow
+    assert len(client.get('/api/animals').get_json()['animals']) == 2
+    added = client.post('/api/animals', json={'name': 'Daisy', 'species': 'Cow'}).get_json()['animal']
+    assert len(client.get('/api/animals').get_json()['animals']) == 3
+    assert added['tag'] in client.get('/api/animals/status').get_json()['animals']
+    # As /api/animals/<tag>/remove does
+    assert deactivate_animal(added['tag'])
+    assert len(client.get('/api/animals').get_json()['animals']) == 2
+    assert added['tag'] not in client.get('/api/animals/status').get_json()['animals']
+
+    # Notifications: created and read, straight through the cache
+    assert client.get('/api/notifications/unread').get_json()['count'] == 0
+    notification_id = client.post('/api/notifications', json={'title': 'Check', 'message': 'Temp'}).get_json()['id']
+    assert client.get('/api/notifications/unread').get_json()['count'] == 1
+    client.post(f'/api/notifications/{notification_id}/read')
+    assert client.get('/api/notifications/unread').get_json()['count'] == 0
+
+    # Readings leaving the table, e.g. archived by retention in another process, move the version too
+    before = read_versions(conn, ['readings'])
+    moved, batches = archive_readings(conn, to_epoch('9999-12-31'), 3, 0, 64, lambda seconds: None)
+    assert read_versions(conn, ['readings'])[0] == before[0] + batches - 1
+    assert client.get('/api/health-readings/all?limit=2').get_json()['readings'] == {}
+    assert cache.stats()['invalidations'] > 0
+
+
+def test_cache_is_per_user():
+    _setup_app()
+    _fresh_cache()
+    _add_herd(animals=2, days=1, per_day=2)
+    _add_herd(animals=3, days=1, per_day=2, user_email='grower@test.com')
+    farmer, grower = _login('farmer@test.com'), _login('grower@test.com')
+    assert len(farmer.get('/api/animals').get_json()['animals']) == 2
+    response = grower.get('/api/animals')
+    assert response.headers['X-Cache'] == 'MISS' and len(response.get_json()['animals']) == 3
+
+    # One user's notification leaves the other's entry alone
+    farmer.get('/api/notifications/unread')
+    grower.get('/api/notifications/unread')
+    grower.post('/api/notifications', json={'title': 'Check', 'message': 'Temp'})
+    assert farmer.get('/api/notifications/unread').headers['X-Cache'] == 'HIT'
+    assert grower.get('/api/notifications/unread').get_json()['count'] == 1
+
+    # Logged out (user_email stays in the session): no cached data
+    farmer.get('/logout')
+    assert farmer.get('/api/animals').status_code == 401
+
+
+def test_etag_not_modified():
+    _setup_app()
+    _fresh_cache()
+    _add_herd(animals=2, days=1, per_day=2)
+    client = _login('farmer@test.com')
+    first = client.get('/api/animals/status')
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    unchanged = client.get('/api/animals/status', headers={'If-None-Match': etag})
+    assert unchanged.status_code == 304 and unchanged.data == b''
+    # Recomputed after a write, the same data keeps its ETag
+    conn = db.get_db()
+    conn.execute("UPDATE animals SET name = name WHERE user_email = 'farmer@test.com'")
+    conn.commit()
+    recomputed = client.get('/api/animals/status', headers={'If-None-Match': etag})
+    assert recomputed.status_code == 304 and recomputed.headers['X-Cache'] == 'MISS'
+    conn.execute("UPDATE animals SET name = 'Renamed' WHERE user_email = 'farmer@test.com'")
+    conn.commit()
+    changed = client.get('/api/animals/status', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+
+    # Vet stats: keyed per vet, invalidated by the appointment queue
+    vet = app_module.app.test_client()
+    with vet.session_transaction() as sess:
+        sess['vet'] = 'Dr Test'
+    stats = vet.get('/api/vet/stats')
+    assert vet.get('/api/vet/stats', headers={'If-None-Match': stats.headers['ETag']}).status_code == 304
+    conn.execute("INSERT INTO appointment_queue (animal_tag, user_email, owner_name, owner_mobile, health_status, status) "
+                 "VALUES ('R-f00000', 'farmer@test.com', 'Farmer', '1', 'Ill', 'pending')")
+    conn.commit()
+    assert vet.get('/api/vet/stats').get_json()['stats']['critical_alerts'] == 1
+
+    admin = app_module.app.test_client()
+    assert admin.get('/api/admin/response-cache').status_code == 401
+    with admin.session_transaction() as sess:
+        sess['admin'] = 'admin'
+    assert admin.get('/api/admin/response-cache').get_json()['cache']['not_modified'] == 3
+
+
+def benchmark(animals=200, users=20, polls=2000):
+    """Dashboard polling of /api/health-readings/all and /api/animals/status between
+    scheduler cycles: requests per second uncached, cached, and revalidated with ETags"""
+    _setup_app()
+    # _add_herd tags animals by the email's first letter
+    emails = [f'{chr(ord("a") + i)}-user@test.com' for i in range(users)]
+    for email in emails:
+        _add_herd(animals=animals // users, days=2, per_day=48, user_email=email)
+    clients = [_login(email) for email in emails]
+    paths = ['/api/health-readings/all', '/api/animals/status']
+    print(f"{users} users, {animals} animals, {polls} polls")
+
+    for name, max_entries, revalidate in (('uncached', 0, False), ('cached', 4096, False), ('304', 4096, True)):
+        _fresh_cache(max_entries=max_entries)
+        etags = {}
+        sent = 0
+        start = time.perf_counter()
+        for i in range(polls):
+            client, path = clients[i % users], paths[i // users % 2]
+            headers = {'If-None-Match': etags[i % users, path]} if revalidate and (i % users, path) in etags else {}
+            response = client.get(path, headers=headers)
+            etags[i % users, path] = response.headers.get('ETag')
+            sent += len(response.data)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>9}: {polls / elapsed:7.0f} requests/s ({elapsed / polls * 1000:.2f} ms each), "
+              f"{sent / polls / 1024:5.1f} KB/response")
+
+    # What the version counter costs the scheduler's batch insert
+    conn = db.get_db()
+    rows = _rows(datetime(2025, 3, 1), hours=24 * 30, every_minutes=1)
+    start = time.perf_counter()
+    save_health_readings(conn.cursor(), rows)
+    conn.commit()
+    print(f"batch insert: {(time.perf_counter() - start) / len(rows) * 1e6:.1f} us/reading with one version bump")
+
+
+if __name__ == "__main__":
+    test_lru_ttl_and_versions()
+    test_writes_invalidate_cached_responses()
+    test_cache_is_per_user()
+    test_etag_not_modified()
+    benchmark()
+    print("✓ Polled APIs are served from the cache until their data changes")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Test retention: old raw readings go in batches, rollups keep the history, the file shrinks"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import db
+import app as app_module
+from config import Config
+from readings import save_health_readings
+from retention import run_retention, convert_to_incremental_vacuum
+from trends import get_trend_data
+from test_trend_rollups import _rows
+from conftest import fresh_db
+
+NOW = datetime(2025, 6, 1, 12, 0)
+
+
+class RetentionConfig(Config):
+    READING_RETENTION_DAYS = 30
+    HOURLY_ROLLUP_RETENTION_DAYS = 60
+    RETENTION_DELETE_BATCH = 1000
+    RETENTION_BATCH_PAUSE_SECONDS = 0.01
+    RETENTION_VACUUM_PAGES = 100
+    # Dropped outright, the default; archiving is covered by test_reading_store.py
+    READING_ARCHIVE = False
+
+
+def _setup_db(days=90, every_minutes=30):
+    fresh_db()
+    app_module.init_db()
+    conn = db.get_db()
+    rows = _rows(NOW, hours=24 * days, every_minutes=every_minutes)
+    save_health_readings(conn.cursor(), rows)
+    conn.commit()
+    return conn, rows
+
+
+def _count(conn, sql, *params):
+    return conn.execute(sql, params).fetchone()[0]
+
+
+def test_old_readings_deleted_in_batches():
+    conn, rows = _setup_db()
+    daily_before = conn.execute('SELECT * FROM health_rollup_daily ORDER BY bucket').fetchall()
+    pauses = []
+    report = run_retention(now=NOW, config=RetentionConfig, sleep=pauses.append)
+
+    cutoff = (NOW - timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
+    expected = sum(1 for row in rows if row[7] < cutoff)
+    assert report['deleted_readings'] == expected
+    assert _count(conn, 'SELECT COUNT(*) FROM health_readings WHERE timestamp < ?', cutoff) == 0
+    assert _count(conn, 'SELECT COUNT(*) FROM health_readings') == len(rows) - expected
+    # 60 days of readings at 48 a day, 1000 per batch
+    assert report['batches'] >= expected // 1000 and len(pauses) >= expected // 1000
+
+    # Hourly rollups are trimmed at 60 days; the daily ones keep everything
+    assert _count(conn, 'SELECT MIN(bucket) FROM health_rollup_hourly') >= \
+        (NOW - timedelta(days=60)).strftime('%Y-%m-%d %H:00:00')
+    assert report['deleted_hourly_rollups'] > 0
+    assert conn.execute('SELECT * FROM health_rollup_daily ORDER BY bucket').fetchall() == daily_before
+
+    # The 90-day chart still counts every reading in its range
+    _, points = get_trend_data(conn.cursor(), 'T-001', '90days', NOW)
+    first_day = (NOW - timedelta(days=89)).strftime('%Y-%m-%d')
+    assert sum(point['count'] for point in points) == sum(1 for row in rows if row[7] >= first_day)
+
+    # A second run has nothing to do
+    assert run_retention(now=NOW, config=RetentionConfig, sleep=pauses.append)['deleted_readings'] == 0
+
+
+def test_incremental_vacuum_shrinks_file():
+    conn, _ = _setup_db(days=120, every_minutes=10)
+    assert _count(conn, 'PRAGMA auto_vacuum') == 2
+    report = run_retention(now=NOW, config=RetentionConfig, sleep=lambda seconds: None)
+    assert report['auto_vacuum'] == 'incremental'
+    assert report['reclaimed_pages'] == report['free_pages'] > 0
+    assert report['pages_after'] <= report['pages_before'] - report['reclaimed_pages']
+    assert _count(conn, 'PRAGMA freelist_count') == 0
+
+
+def test_legacy_database_is_converted():
+    # A database created without auto_vacuum keeps its free pages
+    fresh_db()
+    sqlite3.connect(db.DB_PATH).executescript('CREATE TABLE legacy (x); DROP TABLE legacy;').close()
+    app_module.init_db()
+    conn = db.get_db()
+    save_health_readings(conn.cursor(), _rows(NOW, hours=24 * 60, every_minutes=10))
+    conn.commit()
+    report = run_retention(now=NOW, config=RetentionConfig, sleep=lambda seconds: None)
+    assert report['auto_vacuum'] == 'none' and report['free_pages'] > 0 and report['reclaimed_pages'] == 0
+
+    assert convert_to_incremental_vacuum() == 'incremental'
+    assert _count(conn, 'PRAGMA freelist_count') == 0
+
+
+def benchmark(animals=40, days=120, every_minutes=5):
+    """Longest writer stall while 90 days of 5-minute readings for a herd are purged:
+    one big DELETE against batched deletes"""
+    class BigDelete(RetentionConfig):
+        RETENTION_DELETE_BATCH = 10 ** 9
+
+    class Batched(RetentionConfig):
+        RETENTION_DELETE_BATCH = Config.RETENTION_DELETE_BATCH
+        RETENTION_BATCH_PAUSE_SECONDS = Config.RETENTION_BATCH_PAUSE_SECONDS
+        RETENTION_VACUUM_PAGES = Config.RETENTION_VACUUM_PAGES
+
+    for name, config in (('single DELETE', BigDelete), ('batched', Batched)):
+        conn, _ = _setup_db(days=1, every_minutes=60)
+        for i in range(animals):
+            save_health_readings(conn.cursor(), _rows(NOW, hours=24 * days, every_minutes=every_minutes,
+                                                      tag=f'B-{i:03d}', seed=i))
+            conn.commit()
+        size_before = os.path.getsize(db.DB_PATH)
+        stop = threading.Event()
+        started = threading.Event()
+        latencies = []
+
+        def writer():
+            # The scheduler inserting a reading every few milliseconds
+            try:
+                cursor = db.get_db().cursor()
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    save_health_readings(cursor, [('W-001', 70, 38.5, 120, 'Normal', 80, 'Healthy',
+                                                   NOW.strftime('%Y-%m-%d %H:%M:%S'))])
+                    db.get_db().commit()
+                    latencies.append(time.perf_counter() - start)
+                    started.set()
+                    time.sleep(0.005)
+            finally:
+                db.close_db()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        started.wait()
+        report = run_retention(now=NOW, config=config)
+        stop.set()
+        thread.join()
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        latencies.sort()
+        print(f"{name:>14}: {report['deleted_readings']:,} rows in {report['seconds']:.2f} s, "
+              f"writer p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, max {latencies[-1] * 1000:.0f} ms, "
+              f"file {size_before / 1024 / 1024:.1f} -> {os.path.getsize(db.DB_PATH) / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    test_old_readings_deleted_in_batches()
+    test_incremental_vacuum_shrinks_file()
+    test_legacy_database_is_converted()
+    benchmark()
+    print("✓ Retention purges in batches and reclaims the space")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Test scheduler leadership: one leader at a time, one cycle per interval, failover"""
+import os
+import runpy
+import sqlite3
+import threading
+import time
+
+import db
+from schema import init_db
+from scheduler_lease import SchedulerLease
+from conftest import fresh_db
+
+
+def _setup():
+    fresh_db()
+    init_db()
+
+
+def test_single_leader_and_failover():
+    _setup()
+    first = SchedulerLease('readings', ttl_seconds=0.3)
+    second = SchedulerLease('readings', ttl_seconds=0.3)
+
+    assert first.acquire()
+    assert not second.acquire()
+    assert first.acquire(), "the holder renews its own lease"
+
+    # The leader dies: it stops renewing and the lease runs out
+    time.sleep(0.4)
+    assert second.acquire()
+    assert not first.acquire()
+
+
+def test_release_hands_over_immediately():
+    _setup()
+    first = SchedulerLease('readings', ttl_seconds=60)
+    second = SchedulerLease('readings', ttl_seconds=60)
+    assert first.acquire()
+    first.release()
+    assert second.acquire()
+
+
+def test_one_cycle_per_interval():
+    _setup()
+    lease = SchedulerLease('readings', ttl_seconds=60)
+    assert lease.acquire()
+    assert lease.claim_run(interval_seconds=0.3)
+    assert not lease.claim_run(interval_seconds=0.3)
+    time.sleep(0.35)
+    assert lease.claim_run(interval_seconds=0.3)
+
+    other = SchedulerLease('readings', ttl_seconds=60)
+    assert not other.claim_run(interval_seconds=0), "only the holder may claim a cycle"
+
+
+def test_workers_never_double_run():
+    """Four 'workers' heartbeat against one database while the leader keeps dying"""
+    _setup()
+    interval, ttl = 0.2, 0.15
+    runs = []
+    stop = threading.Event()
+
+    def worker(index):
+        try:
+            while not stop.is_set():
+                # Each incarnation is a fresh process with a new holder id
+                lease = SchedulerLease('readings', ttl_seconds=ttl)
+                for _ in range(15):
+                    if stop.is_set():
+                        break
+                    if lease.acquire() and lease.claim_run(interval):
+                        runs.append((time.time(), index))
+                    time.sleep(0.02)
+                # Crash without releasing the lease
+        finally:
+            db.close_db()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(3)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    gaps = [b[0] - a[0] for a, b in zip(runs, runs[1:])]
+    print(f"{len(runs)} cycles by {len(set(i for _, i in runs))} workers, "
+          f"shortest gap {min(gaps) * 1000:.0f} ms, longest {max(gaps) * 1000:.0f} ms")
+    assert len(runs) >= 5
+    assert min(gaps) >= interval - 0.01
+    # Failover keeps cycles coming: never more than interval + lease ttl + a heartbeat apart
+    assert max(gaps) <= interval + ttl + 0.2
+
+
+def test_gunicorn_master_migrates_schema():
+    # An existing database from before the derived tables, as gunicorn would find it
+    fresh_db()
+    legacy = sqlite3.connect(db.DB_PATH)
+    legacy.execute('CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT UNIQUE)')
+    legacy.close()
+
+    class Server:
+        class app:
+            @staticmethod
+            def wsgi():
+                raise AssertionError('the master built the app without PRELOAD_MODEL')
+
+    config = runpy.run_path(os.path.join(os.path.dirname(__file__), '..', 'gunicorn.conf.py'))
+    assert not config['preload_app']
+    config['when_ready'](Server)
+    tables = {row[0] for row in sqlite3.connect(db.DB_PATH).execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'animals', 'health_readings', 'latest_health_reading', 'simulator_state',
+            'tag_sequences', 'cache_versions', 'scheduler_lease', 'reading_jobs'} <= tables
+
+
+if __name__ == "__main__":
+    test_single_leader_and_failover()
+    test_release_hands_over_immediately()
+    test_one_cycle_per_interval()
+    test_workers_never_double_run()
+    test_gunicorn_master_migrates_schema()
+    print("✓ Exactly one worker runs each scheduler cycle")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""Test the persisted, LRU-bounded simulator state store"""
+import pickle
+import threading
+
+import db
+import app as app_module
+from simulator_state import AnimalState, StateStore, state_store
+from conftest import fresh_db
+
+
+def _use_temp_db():
+    """Initialise a fresh database with the sample animals"""
+    fresh_db()
+    app_module.init_db()
+    app_module.init_animals_table()
+    state_store.clear()
+    return db.get_db()
+
+
+def _in_other_connection(func):
+    """Run func on another thread, i.e. another connection, as a second worker would"""
+    def run():
+        try:
+            func(db.get_db())
+        finally:
+            db.close_db()
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+
+
+def test_state_round_trip():
+    conn = _use_temp_db()
+    store = StateStore(max_entries=10)
+    state = store.get('S-1')
+    assert state.previous_reading() is None
+
+    state.advance({'heart_rate': 70.5, 'body_temp': 38.6, 'blood_pressure': 130, 'movement': 'Normal'}, 'Warning')
+    state.advance({'heart_rate': 71.0, 'body_temp': 38.7, 'blood_pressure': 131, 'movement': 'Low'}, 'Ill')
+    store.save(conn.cursor(), 'S-1', state)
+    conn.commit()
+
+    loaded = StateStore(max_entries=10).get('S-1')
+    assert loaded.previous_reading() == {'heart_rate': 71.0, 'body_temp': 38.7, 'blood_pressure': 131, 'movement': 'Low'}
+    assert loaded.recent_statuses == ('Warning', 'Ill')
+    # Worker processes receive states through pickle
+    assert pickle.loads(pickle.dumps(loaded)).recent_statuses == ('Warning', 'Ill')
+
+
+def test_lru_eviction():
+    conn = _use_temp_db()
+    store = StateStore(max_entries=3)
+    states = {f'S-{i}': AnimalState(60.0 + i, 38.5, 120, 'Normal') for i in range(5)}
+    store.save_many(conn.cursor(), states)
+    conn.commit()
+
+    for i in range(5):
+        assert store.get(f'S-{i}').heart_rate == 60.0 + i
+    assert len(store) == 3
+    # Evicted entries are loaded again from SQLite
+    assert store.get('S-0').heart_rate == 60.0
+
+
+def test_sees_other_connections_writes():
+    _use_temp_db()
+    store = StateStore(max_entries=10)
+    _in_other_connection(lambda conn: (store.save(conn.cursor(), 'S-1', AnimalState(60.0, 38.5, 120, 'Normal')),
+                                       conn.commit()))
+    assert store.get('S-1').heart_rate == 60.0
+
+    # A second worker with its own store moves the state on; the cached copy must follow
+    other = StateStore(max_entries=10)
+    _in_other_connection(lambda conn: (other.save(conn.cursor(), 'S-1', AnimalState(65.0, 38.9, 125, 'Low', ('Ill',))),
+                                       conn.commit()))
+    state = store.get('S-1')
+    assert state.heart_rate == 65.0
+    assert state.recent_statuses == ('Ill',)
+
+
+def test_scheduler_persists_state():
+    conn = _use_temp_db()
+    for _ in range(3):
+        app_module.scheduled_health_reading_job()
+
+    latest = {row['animal_tag']: row for row in conn.execute('SELECT * FROM latest_health_reading')}
+    assert latest
+    # A fresh process (empty cache) continues from the stored readings and statuses
+    state_store.clear()
+    states = state_store.get_many(list(latest))
+    for tag, row in latest.items():
+        assert states[tag].heart_rate == row['heart_rate']
+        assert states[tag].recent_statuses[-1] == row['status']
+        assert len(states[tag].recent_statuses) == 3
+
+
+def test_cycles_reuse_cached_state():
+    conn = _use_temp_db()
+    app_module.scheduled_health_reading_job()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        app_module.scheduled_health_reading_job()
+    finally:
+        conn.set_trace_callback(None)
+    # The second cycle starts from the states the first one committed
+    assert not [s for s in statements if 'FROM simulator_state WHERE animal_tag IN' in s]
+    assert len(state_store) == conn.execute('SELECT COUNT(*) FROM simulator_state').fetchone()[0] > 0
+    cached = state_store.get_many([row[0] for row in conn.execute('SELECT animal_tag FROM simulator_state')])
+    for row in conn.execute('SELECT * FROM latest_health_reading'):
+        assert cached[row['animal_tag']].heart_rate == row['heart_rate']
+
+
+def test_cycle_holds_no_lock_while_generating():
+    conn = _use_temp_db()
+    real_shards = app_module.generate_reading_shards
+    generated, writes = [], []
+
+    def write_elsewhere(conn):
+        # No busy wait: this fails at once if the cycle holds the write lock
+        conn.execute('PRAGMA busy_timeout = 0')
+        conn.execute('BEGIN IMMEDIATE')
+        conn.rollback()
+        writes.append(True)
+
+    def shards_with_writer(*args):
+        for result in real_shards(*args):
+            generated.append(result)
+            _in_other_connection(write_elsewhere)
+            yield result
+
+    def failing_shards(*args):
+        yield next(real_shards(*args))
+        raise RuntimeError('worker failed')
+
+    app_module.generate_reading_shards = shards_with_writer
+    try:
+        assert app_module.generate_health_readings() > 0
+        # Another writer got the lock after every shard
+        assert len(writes) == len(generated) > 0
+        before = conn.execute('SELECT COUNT(*) FROM health_readings').fetchone()[0]
+
+        # A cycle that fails part way writes nothing
+        app_module.generate_reading_shards = failing_shards
+        try:
+            app_module.generate_health_readings()
+            assert False, 'expected the cycle to fail'
+        except RuntimeError:
+            pass
+        assert conn.execute('SELECT COUNT(*) FROM health_readings').fetchone()[0] == before
+    finally:
+        app_module.generate_reading_shards = real_shards
+
+
+def test_migration_seeds_from_latest_readings():
+    conn = _use_temp_db()
+    app_module.scheduled_health_reading_job()
+    conn.execute('DELETE FROM simulator_state')
+    conn.commit()
+
+    app_module.init_db()
+    seeded = conn.execute('''
+        SELECT COUNT(*) FROM simulator_state s
+        JOIN latest_health_reading l ON l.animal_tag = s.animal_tag AND l.heart_rate = s.heart_rate
+    ''').fetchone()[0]
+    assert seeded == conn.execute('SELECT COUNT(*) FROM latest_health_reading').fetchone()[0] > 0
+
+
+if __name__ == "__main__":
+    test_state_round_trip()
+    test_lru_eviction()
+    test_sees_other_connections_writes()
+    test_scheduler_persists_state()
+    test_cycles_reuse_cached_state()
+    test_cycle_holds_no_lock_while_generating()
+    test_migration_seeds_from_latest_readings()
+    print("✓ Simulator state is persisted, shared and bounded")
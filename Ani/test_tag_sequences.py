@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Test tag counters: unique tags under concurrency, seeding from existing animals and speed"""
+import threading
+import time
+
+import db
+import app as app_module
+from login import assign_animals_if_needed
+from user import add_animal, init_animals_table, reserve_tag_range
+from conftest import fresh_db
+
+
+def _use_temp_db():
+    fresh_db()
+    app_module.init_db()
+    init_animals_table()
+
+
+def _counter(prefix):
+    row = db.get_db().execute('SELECT last_value FROM tag_sequences WHERE prefix = ?', (prefix,)).fetchone()
+    return row[0] if row else None
+
+
+def test_concurrent_adds_get_unique_tags():
+    _use_temp_db()
+    tags, failures = [], []
+
+    def worker(n):
+        try:
+            for i in range(20):
+                animal = add_animal(f'Cow {n}-{i}', 'Cow', 400, 3, 'Female', 'farmer@test.com')
+                if animal is None:
+                    failures.append((n, i))
+                else:
+                    tags.append(animal['tag'])
+        finally:
+            db.close_db()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not failures
+    # No duplicates and no gaps after the sample cows C-001 and C-002
+    assert sorted(tags) == [f'C-{n:03d}' for n in range(3, 163)]
+    assert _counter('C') == 162
+
+
+def test_seeded_from_existing_animals():
+    _use_temp_db()
+    conn = db.get_db()
+    # A database from before the counters: tags exist, counters don't
+    conn.execute('DELETE FROM tag_sequences')
+    conn.executemany("INSERT INTO animals (tag, name, species, user_email) VALUES (?, ?, ?, 'x@test.com')",
+                     [('H-007', 'Old', 'Horse'), ('H-012', 'Older', 'Horse'), ('P-1000', 'Big', 'Pig')])
+    conn.commit()
+
+    init_animals_table()
+    assert _counter('H') == 12 and _counter('P') == 1000 and _counter('C') == 2
+    # Seeding again never moves a counter backwards
+    conn.execute("UPDATE tag_sequences SET last_value = 40 WHERE prefix = 'H'")
+    conn.commit()
+    init_animals_table()
+    assert _counter('H') == 40
+
+    assert add_animal('New', 'Pig', 90, 1, 'Male', 'x@test.com')['tag'] == 'P-1001'
+
+
+def test_ranges_and_signup_samples_share_the_counter():
+    _use_temp_db()
+    conn = db.get_db()
+    assert reserve_tag_range(conn.cursor(), 'Buffalo', 3) == ['B-001', 'B-002', 'B-003']
+    assert reserve_tag_range(conn.cursor(), 'Yak', 1) == ['A-001']
+    conn.commit()
+
+    assign_animals_if_needed('new@test.com')
+    tags = [row[0] for row in conn.execute("SELECT tag FROM animals WHERE user_email = 'new@test.com' ORDER BY id")]
+    assert tags == ['C-003', 'C-004', 'G-002', 'S-002']
+    assert add_animal('Next', 'Cow', 300, 1, 'Female', 'new@test.com')['tag'] == 'C-005'
+
+
+def legacy_generate_tag(cursor, prefix):
+    """Tag generation before the counters, for comparison"""
+    cursor.execute("SELECT tag FROM animals WHERE tag LIKE ?", (f'{prefix}-%',))
+    max_num = 0
+    for tag in cursor.fetchall():
+        max_num = max(max_num, int(tag[0].split('-')[1]))
+    return f"{prefix}-{str(max_num + 1).zfill(3)}"
+
+
+def benchmark(existing=50_000, adds=200):
+    """Time per new tag against a herd of existing animals: LIKE scan vs counter"""
+    _use_temp_db()
+    conn = db.get_db()
+    cursor = conn.cursor()
+    tags = reserve_tag_range(cursor, 'Cow', existing)
+    cursor.executemany("INSERT INTO animals (tag, name, species, user_email) VALUES (?, 'Herd', 'Cow', 'x@test.com')",
+                       [(tag,) for tag in tags])
+    conn.commit()
+
+    start = time.perf_counter()
+    for _ in range(adds):
+        legacy_generate_tag(cursor, 'C')
+    legacy_ms = (time.perf_counter() - start) * 1000 / adds
+
+    start = time.perf_counter()
+    for _ in range(adds):
+        reserve_tag_range(cursor, 'Cow')
+    conn.commit()
+    counter_ms = (time.perf_counter() - start) * 1000 / adds
+    print(f"{existing:,} cows: LIKE scan {legacy_ms:.2f} ms/tag, counter {counter_ms:.3f} ms/tag "
+          f"({legacy_ms / counter_ms:.0f}x)")
+
+
+if __name__ == "__main__":
+    test_concurrent_adds_get_unique_tags()
+    test_seeded_from_existing_animals()
+    test_ranges_and_signup_samples_share_the_counter()
+    benchmark()
+    print("✓ Tags come from atomic per-species counters")
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""Test the integer ts column: kept in step with timestamp, added to old databases, and used as a range"""
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import db
+import app as app_module
+from health_report import fetch_report_data, report_range
+from reading_store import to_epoch
+from readings import save_health_reading, save_health_readings
+from test_health_report import _setup_app, _add_herd
+from test_trend_rollups import _rows
+from conftest import fresh_db
+
+
+def _ts_mismatches(conn):
+    return conn.execute('''
+        SELECT COUNT(*) FROM health_readings
+        WHERE ts IS NOT CAST(strftime('%s', timestamp) AS INTEGER)
+    ''').fetchone()[0]
+
+
+def test_ts_follows_timestamp():
+    _setup_app()
+    conn = db.get_db()
+    cursor = conn.cursor()
+    rows = _rows(datetime(2025, 3, 1, 12, 0), hours=6, every_minutes=30)
+    save_health_reading(cursor, *rows[0])
+    save_health_readings(cursor, rows[1:])
+    # Whatever writes the row, including the column default
+    conn.execute("INSERT INTO health_readings (animal_tag, heart_rate, body_temp, blood_pressure, movement, "
+                 "health_index, status) VALUES ('T-001', 70, 38.5, 120, 'Normal', 80, 'Healthy')")
+    conn.commit()
+
+    stored = conn.execute('SELECT timestamp, ts FROM health_readings ORDER BY id').fetchall()
+    assert [row['ts'] for row in stored] == [to_epoch(row['timestamp']) for row in stored]
+    assert stored[0]['ts'] == to_epoch(rows[0][7])
+    assert _ts_mismatches(conn) == 0
+
+
+def test_legacy_database_gets_ts():
+    # A database from before the ts column, with the old text index
+    fresh_db()
+    legacy = sqlite3.connect(db.DB_PATH)
+    legacy.executescript('''
+        CREATE TABLE health_readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            animal_tag TEXT NOT NULL,
+            heart_rate REAL NOT NULL,
+            body_temp REAL NOT NULL,
+            blood_pressure INTEGER NOT NULL,
+            movement TEXT NOT NULL,
+            health_index REAL NOT NULL,
+            status TEXT NOT NULL,
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX idx_health_readings_tag_time ON health_readings(animal_tag, timestamp);
+    ''')
+    legacy.executemany('INSERT INTO health_readings (animal_tag, heart_rate, body_temp, blood_pressure, movement, '
+                       'health_index, status, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                       _rows(datetime(2025, 3, 1), hours=24, every_minutes=60))
+    legacy.commit()
+    legacy.close()
+
+    app_module.init_db()
+    conn = db.get_db()
+    assert _ts_mismatches(conn) == 0
+    indexes = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert 'idx_health_readings_tag_ts' in indexes and 'idx_health_readings_tag_time' not in indexes
+    # Running the migration again is a no-op
+    app_module.init_db()
+
+
+def test_time_filters_are_index_ranges():
+    _setup_app()
+    tags = _add_herd(animals=3, days=3, per_day=24)
+    conn = db.get_db()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        fetch_report_data(conn.cursor(), 'farmer@test.com', tags[0], '2025-01-02', '2025-01-02')
+    finally:
+        conn.set_trace_callback(None)
+
+    timed = [s for s in statements if 'FROM health_readings' in s and 'ts >=' in s]
+    assert len(timed) == 2
+    for statement in timed:
+        plan = ' '.join(row['detail'] for row in conn.execute(f'EXPLAIN QUERY PLAN {statement}'))
+        assert 'idx_health_readings_tag_ts (animal_tag=? AND ts>? AND ts<?)' in plan, plan
+    # Dates are whole days, both ends included
+    assert report_range('2025-01-02', '2025-01-02') == (to_epoch('2025-01-02'), to_epoch('2025-01-03'))
+
+
+
+def test_all_readings_in_one_statement():
+    client = _setup_app()
+    tags = _add_herd(animals=3, days=1, per_day=24)
+    conn = db.get_db()
+    app_module.response_cache.clear()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        readings = client.get('/api/health-readings/all?limit=5').get_json()['readings']
+    finally:
+        conn.set_trace_callback(None)
+
+    assert sorted(readings) == tags
+    for tag in tags:
+        stamps = [reading['timestamp'] for reading in readings[tag]]
+        assert stamps == sorted(stamps, reverse=True) and stamps[0] == '2025-01-01 23:00:00' and len(stamps) == 5
+    assert len([s for s in statements if 'FROM health_readings' in s]) == 1
+    # limit is clamped to 1..READINGS_PER_ANIMAL_MAX
+    assert client.get('/api/health-readings/all?limit=-1').get_json()['count'] == 3
+    assert client.get('/api/health-readings/all?limit=100000').get_json()['count'] == 3 * 24
+
+def _build_table(rows, animals, every_minutes):
+    """rows readings round-robin over animals, every_minutes apart per animal, generated in SQL"""
+    _setup_app()
+    conn = db.get_db()
+    start = to_epoch(datetime(2024, 1, 1))
+    conn.execute('''
+        WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < ? - 1)
+        INSERT INTO health_readings (animal_tag, heart_rate, body_temp, blood_pressure, movement,
+                                     health_index, status, timestamp)
+        SELECT printf('B-%04d', i % ?), 50 + abs(random() % 400) / 10.0, 37.5 + abs(random() % 30) / 10.0,
+               100 + abs(random() % 40), 'Normal', abs(random() % 1000) / 10.0, 'Healthy',
+               datetime(? + (i / ?) * ?, 'unixepoch')
+        FROM n
+    ''', (rows, animals, start, animals, every_minutes * 60))
+    conn.commit()
+    return conn, datetime(2024, 1, 1) + timedelta(minutes=every_minutes * (rows // animals))
+
+
+def benchmark(rows=10_000_000, animals=1000, every_minutes=5):
+    """A week's export and a day's hourly trend for one animal, date()/strftime() on the
+    text column (with the old (animal_tag, timestamp) index) against ts ranges"""
+    began = time.perf_counter()
+    conn, end = _build_table(rows, animals, every_minutes)
+    conn.execute('CREATE INDEX idx_health_readings_tag_time ON health_readings(animal_tag, timestamp)')
+    conn.commit()
+    print(f"{rows:,} readings, {animals} animals, up to {end:%Y-%m-%d} (built in {time.perf_counter() - began:.0f} s)")
+
+    tag = 'B-0007'
+    week_from, week_to = (end - timedelta(days=7)).strftime('%Y-%m-%d'), (end - timedelta(days=1)).strftime('%Y-%m-%d')
+    day_start = end - timedelta(days=1)
+    queries = [
+        ('export, 1 week', '''
+            SELECT * FROM health_readings
+            WHERE animal_tag = ? AND date(timestamp) >= date(?) AND date(timestamp) <= date(?)
+            ORDER BY timestamp DESC
+        ''', (tag, week_from, week_to), '''
+            SELECT * FROM health_readings
+            WHERE animal_tag = ? AND ts >= ? AND ts < ?
+            ORDER BY ts DESC
+        ''', (tag, *report_range(week_from, week_to))),
+        ('trend, 24 hours', '''
+            SELECT strftime('%Y-%m-%d %H', timestamp) AS hour, AVG(health_index), COUNT(*)
+            FROM health_readings
+            WHERE animal_tag = ? AND datetime(timestamp) >= datetime(?)
+            GROUP BY strftime('%Y-%m-%d %H', timestamp)
+        ''', (tag, day_start.strftime('%Y-%m-%d %H:%M:%S')), '''
+            SELECT ts / 3600 AS hour, AVG(health_index), COUNT(*)
+            FROM health_readings
+            WHERE animal_tag = ? AND ts >= ?
+            GROUP BY ts / 3600
+        ''', (tag, to_epoch(day_start))),
+    ]
+    for name, legacy_sql, legacy_params, ts_sql, ts_params in queries:
+        timings = []
+        for sql, params in ((legacy_sql, legacy_params), (ts_sql, ts_params)):
+            conn.execute(sql, params).fetchall()
+            start = time.perf_counter()
+            for _ in range(5):
+                result = conn.execute(sql, params).fetchall()
+            timings.append(((time.perf_counter() - start) / 5 * 1000, len(result)))
+        (legacy_ms, legacy_rows), (ts_ms, ts_rows) = timings
+        assert legacy_rows == ts_rows
+        print(f"{name:>16}: text {legacy_ms:8.2f} ms, ts {ts_ms:6.2f} ms ({legacy_ms / ts_ms:.1f}x, {ts_rows} rows)")
+
+
+if __name__ == "__main__":
+    test_ts_follows_timestamp()
+    test_legacy_database_gets_ts()
+    test_time_filters_are_index_ranges()
+    test_all_readings_in_one_statement()
+    benchmark()
+    print("✓ Time filters are integer ranges on (animal_tag, ts)")
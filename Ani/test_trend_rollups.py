@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""Test the trend rollups: kept in step with inserts, rebuilt by the migration, and fast to chart"""
+import random
+import runpy
+import time
+from datetime import datetime, timedelta
+
+import db
+import app as app_module
+from readings import save_health_reading, save_health_readings, rebuild_rollups
+from trends import get_trend_data, TREND_PERIODS
+from conftest import fresh_db
+
+
+def _setup_app():
+    fresh_db()
+    app_module.init_db()
+    app_module.init_animals_table()
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user'] = 'Farmer'
+        sess['user_email'] = 'farmer@test.com'
+    db.get_db().execute("INSERT INTO animals (tag, name, species, user_email) VALUES ('T-001', 'Trend', 'Cow', 'farmer@test.com')")
+    db.get_db().commit()
+    return client
+
+
+def _rows(end, hours, every_minutes, tag='T-001', seed=0):
+    """Readings every few minutes for the hours before end"""
+    rng = random.Random(seed)
+    count = hours * 60 // every_minutes
+    return [(tag, rng.uniform(50, 90), rng.uniform(37.5, 40), rng.randint(100, 140), 'Normal',
+             rng.uniform(20, 100), 'Healthy',
+             (end - timedelta(minutes=every_minutes * n)).strftime('%Y-%m-%d %H:%M:%S'))
+            for n in range(count, 0, -1)]
+
+
+def _raw_buckets(fmt):
+    """What the rollups should hold, straight from the raw readings"""
+    return db.get_db().execute(f'''
+        SELECT animal_tag, strftime('{fmt}', timestamp), COUNT(*),
+               ROUND(SUM(health_index), 6), MIN(health_index), MAX(health_index),
+               ROUND(SUM(body_temp), 6), MIN(body_temp), MAX(heart_rate)
+        FROM health_readings GROUP BY 1, 2 ORDER BY 1, 2
+    ''').fetchall()
+
+
+def _rollup_buckets(table):
+    return db.get_db().execute(f'''
+        SELECT animal_tag, bucket, reading_count, ROUND(index_sum, 6), index_min, index_max,
+               ROUND(temp_sum, 6), temp_min, hr_max
+        FROM {table} ORDER BY 1, 2
+    ''').fetchall()
+
+
+def _assert_rollups_match():
+    assert [tuple(r) for r in _rollup_buckets('health_rollup_hourly')] == \
+        [tuple(r) for r in _raw_buckets('%Y-%m-%d %H:00:00')]
+    assert [tuple(r) for r in _rollup_buckets('health_rollup_daily')] == \
+        [tuple(r) for r in _raw_buckets('%Y-%m-%d')]
+
+
+def test_rollups_follow_inserts():
+    _setup_app()
+    conn = db.get_db()
+    cursor = conn.cursor()
+    rows = _rows(datetime(2025, 3, 10, 12, 0), hours=30, every_minutes=20)
+    # Single inserts and batches, landing in buckets that already exist
+    for row in rows[:10]:
+        save_health_reading(cursor, *row)
+    save_health_readings(cursor, rows[10:50])
+    save_health_readings(cursor, rows[50:] + _rows(datetime(2025, 3, 10, 12, 0), hours=3, every_minutes=30,
+                                                   tag='T-002', seed=1))
+    conn.commit()
+    _assert_rollups_match()
+    assert conn.execute('SELECT COUNT(*) FROM health_rollup_daily').fetchone()[0] == 3
+
+
+def test_batch_ids_need_not_be_contiguous():
+    _setup_app()
+    conn = db.get_db()
+    cursor = conn.cursor()
+    # Use up an id after every insert (AUTOINCREMENT never reuses it), leaving gaps between the batch's ids
+    conn.execute('''
+        CREATE TRIGGER skip_ids AFTER INSERT ON health_readings WHEN NEW.animal_tag != 'GAP' BEGIN
+            INSERT INTO health_readings (animal_tag, heart_rate, body_temp, blood_pressure, movement,
+                                         health_index, status, timestamp)
+            VALUES ('GAP', 0, 0, 0, 'Normal', 0, 'Ill', NEW.timestamp);
+            DELETE FROM health_readings WHERE animal_tag = 'GAP';
+        END
+    ''')
+    rows = _rows(datetime(2025, 3, 10, 12, 0), hours=6, every_minutes=20)
+    save_health_readings(cursor, rows[:5])
+    save_health_readings(cursor, rows[5:])
+    conn.commit()
+    _assert_rollups_match()
+    latest = conn.execute('SELECT reading_id, timestamp FROM latest_health_reading').fetchone()
+    assert tuple(latest) == tuple(conn.execute('SELECT MAX(id), MAX(timestamp) FROM health_readings').fetchone())
+
+
+def test_migration_rebuilds_rollups():
+    _setup_app()
+    conn = db.get_db()
+    save_health_readings(conn.cursor(), _rows(datetime(2025, 3, 10, 12, 0), hours=50, every_minutes=15))
+    conn.commit()
+    expected = _rollup_buckets('health_rollup_hourly')
+
+    # A database from before the rollups
+    conn.execute('DELETE FROM health_rollup_hourly')
+    conn.execute('DELETE FROM health_rollup_daily')
+    conn.commit()
+    app_module.init_db()
+    assert _rollup_buckets('health_rollup_hourly') == expected
+    _assert_rollups_match()
+    assert rebuild_rollups(conn.cursor()) == len(expected)
+
+
+def test_trend_periods():
+    client = _setup_app()
+    conn = db.get_db()
+    now = datetime.now()
+    # The newest reading is taken right now
+    save_health_readings(conn.cursor(), _rows(now + timedelta(hours=4), hours=24 * 400, every_minutes=240))
+    conn.commit()
+
+    for period, (size, count) in TREND_PERIODS.items():
+        data = client.get(f'/api/trend-data/T-001?period={period}').get_json()
+        assert data['status'] == 'success' and data['bucket'] == size
+        assert len(data['labels']) == len(data['data']) == count
+        # A reading every 4 hours for 400 days: every day and week has some
+        filled = [point for point in data['data'] if point['count']]
+        assert len(filled) == (6 if size == 'hour' else count), period
+        assert all(point['min'] <= point['value'] <= point['max'] for point in data['data'] if point['count'])
+
+    # The 7-day chart agrees with averaging the raw readings per day
+    data = client.get('/api/trend-data/T-001?period=7days').get_json()
+    raw = conn.execute('''
+        SELECT AVG(health_index) FROM health_readings WHERE date(timestamp) = ?
+    ''', (now.strftime('%Y-%m-%d'),)).fetchone()[0]
+    assert data['data'][-1]['value'] == round(raw, 1)
+    assert data['labels'][-1] == ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'][now.weekday()]
+
+    # A year is 52 Monday-based weeks, the last one being this week
+    labels, points = get_trend_data(conn.cursor(), 'T-001', '1year', now)
+    monday = now.date() - timedelta(days=now.weekday())
+    assert labels[-1] == f"{monday.strftime('%b')} {monday.day}"
+    assert sum(point['count'] for point in points[-2:]) == conn.execute(
+        'SELECT COUNT(*) FROM health_readings WHERE timestamp >= ?',
+        ((monday - timedelta(days=7)).isoformat(),)).fetchone()[0]
+
+    # Unknown periods get the 7-day chart
+    fallback = client.get('/api/trend-data/T-001?period=10years').get_json()
+    assert fallback['period'] == '7days' and fallback['data'] == data['data']
+
+
+def test_cleanup_demo_removes_derived_rows():
+    _setup_app()
+    conn = db.get_db()
+    conn.execute("INSERT INTO animals (tag, name, species, user_email) VALUES ('T-002', 'Demo', 'Cow', 'demo@example.com')")
+    for tag in ('T-001', 'T-002'):
+        save_health_readings(conn.cursor(), _rows(datetime(2025, 3, 1), hours=48, every_minutes=60, tag=tag))
+        conn.execute('INSERT INTO simulator_state (animal_tag, seq) VALUES (?, 1)', (tag,))
+    conn.commit()
+
+    runpy.run_path('cleanup_demo.py')
+    # The farmer's animal keeps its rows, the demo animal has none left anywhere
+    for table in ['health_readings', 'latest_health_reading', 'simulator_state',
+                  'health_rollup_hourly', 'health_rollup_daily', 'animals']:
+        tags = {row[0] for row in conn.execute(f'SELECT {"tag" if table == "animals" else "animal_tag"} FROM {table}')}
+        assert tags == {'T-001'}, table
+
+
+def legacy_trend_query(cursor, tag, start_time, fmt):
+    """The per-request GROUP BY over raw readings, for comparison"""
+    cursor.execute(f'''
+        SELECT strftime('{fmt}', timestamp) as bucket, AVG(health_index), AVG(body_temp), AVG(heart_rate), COUNT(*)
+        FROM health_readings
+        WHERE animal_tag = ? AND timestamp >= ?
+        GROUP BY strftime('{fmt}', timestamp)
+        ORDER BY bucket ASC
+    ''', (tag, start_time.strftime('%Y-%m-%d %H:%M:%S')))
+    return cursor.fetchall()
+
+
+def benchmark(every_minutes=5, herd=1000):
+    """Chart latency for a year of 5-minute readings, raw GROUP BY against rollups,
+    and what maintaining the rollups adds to a scheduler batch"""
+    _setup_app()
+    conn = db.get_db()
+    cursor = conn.cursor()
+    now = datetime.now()
+    rows = _rows(now, hours=24 * 365, every_minutes=every_minutes)
+    save_health_readings(cursor, rows)
+    conn.commit()
+    print(f"{len(rows):,} readings for one animal")
+
+    periods = [('1day', timedelta(days=1), '%Y-%m-%d %H:00:00'), ('7days', timedelta(days=7), '%Y-%m-%d'),
+               ('90days', timedelta(days=90), '%Y-%m-%d'), ('1year', timedelta(days=365), '%Y-%m-%d')]
+    for period, span, fmt in periods:
+        start = time.perf_counter()
+        for _ in range(10):
+            legacy_trend_query(cursor, 'T-001', now - span, fmt)
+        legacy_ms = (time.perf_counter() - start) * 100
+        start = time.perf_counter()
+        for _ in range(10):
+            get_trend_data(cursor, 'T-001', period, now)
+        rollup_ms = (time.perf_counter() - start) * 100
+        print(f"{period:>7}: raw GROUP BY {legacy_ms:8.2f} ms, rollups {rollup_ms:6.2f} ms")
+
+    batch = [(f'H-{i:04d}',) + rows[0][1:7] + (now.strftime('%Y-%m-%d %H:%M:%S'),) for i in range(herd)]
+    start = time.perf_counter()
+    save_health_readings(cursor, batch)
+    conn.commit()
+    print(f"scheduler batch of {herd} readings incl. rollups: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    test_rollups_follow_inserts()
+    test_batch_ids_need_not_be_contiguous()
+    test_migration_rebuilds_rollups()
+    test_trend_periods()
+    test_cleanup_demo_removes_derived_rows()
+    benchmark()
+    print("✓ Trend charts read from the rollups")
@@ -0,0 +1,94 @@
+"""
+Health index trend charts, read from the rollup tables that readings.py
+maintains on every insert. A chart reads one rollup row per bucket (at most
+24 hourly or 90 daily rows, or 364 daily rows folded into weeks), never the
+raw readings, so long periods cost the same as short ones.
+"""
+from datetime import timedelta
+
+DAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# period -> (bucket size, number of buckets)
+TREND_PERIODS = {
+    '1day': ('hour', 24),
+    '7days': ('day', 7),
+    '30days': ('day', 30),
+    '90days': ('day', 90),
+    '1year': ('week', 52),
+}
+
+# bucket size -> (rollup table, SQL expression for the bucket key)
+# Weeks start on Monday: 'weekday 0' moves to the next Sunday (or stays), then back 6 days
+BUCKET_SOURCES = {
+    'hour': ('health_rollup_hourly', 'bucket'),
+    'day': ('health_rollup_daily', 'bucket'),
+    'week': ('health_rollup_daily', "date(bucket, 'weekday 0', '-6 days')"),
+}
+
+TREND_SQL = '''
+    SELECT {key} AS bucket_key,
+           SUM(reading_count) AS reading_count,
+           SUM(index_sum) / SUM(reading_count) AS avg_health_index,
+           MIN(index_min) AS min_health_index,
+           MAX(index_max) AS max_health_index,
+           SUM(temp_sum) / SUM(reading_count) AS avg_temp,
+           SUM(hr_sum) / SUM(reading_count) AS avg_heart_rate
+    FROM {table}
+    WHERE animal_tag = ? AND bucket >= ? AND bucket < ?
+    GROUP BY bucket_key
+'''
+
+
+def _format_day(day):
+    return f"{MONTH_NAMES[day.month - 1]} {day.day}"
+
+
+def trend_buckets(period, now):
+    """Return [(bucket key, label)] oldest first, plus the [start, end) range of
+    rollup bucket keys to read"""
+    size, count = TREND_PERIODS[period]
+    if size == 'hour':
+        hours = [now - timedelta(hours=count - 1 - i) for i in range(count)]
+        buckets = [(hour.strftime('%Y-%m-%d %H:00:00'), hour.strftime('%H:00')) for hour in hours]
+        end = (now + timedelta(hours=1)).strftime('%Y-%m-%d %H:00:00')
+        return buckets, buckets[0][0], end
+
+    today = now.date()
+    if size == 'day':
+        days = [today - timedelta(days=count - 1 - i) for i in range(count)]
+        label = (lambda day: DAY_NAMES[day.weekday()]) if count <= 7 else _format_day
+    else:
+        monday = today - timedelta(days=today.weekday())
+        days = [monday - timedelta(weeks=count - 1 - i) for i in range(count)]
+        label = _format_day
+    buckets = [(day.isoformat(), label(day)) for day in days]
+    return buckets, buckets[0][0], (today + timedelta(days=1)).isoformat()
+
+
+def get_trend_data(cursor, animal_tag, period, now):
+    """Labels and data points (None values for empty buckets) for one animal's trend chart"""
+    size, _ = TREND_PERIODS[period]
+    table, key = BUCKET_SOURCES[size]
+    buckets, start, end = trend_buckets(period, now)
+    cursor.execute(TREND_SQL.format(table=table, key=key), (animal_tag, start, end))
+    rows = {row['bucket_key']: row for row in cursor}
+
+    labels = []
+    data_points = []
+    for bucket_key, label in buckets:
+        labels.append(label)
+        row = rows.get(bucket_key)
+        if row is None:
+            data_points.append({'value': None, 'temp': None, 'heart_rate': None, 'count': 0,
+                                'min': None, 'max': None})
+            continue
+        data_points.append({
+            'value': round(row['avg_health_index'], 1),
+            'temp': round(row['avg_temp'], 1) if row['avg_temp'] else None,
+            'heart_rate': round(row['avg_heart_rate'], 1) if row['avg_heart_rate'] else None,
+            'count': row['reading_count'],
+            'min': round(row['min_health_index'], 1),
+            'max': round(row['max_health_index'], 1)
+        })
+    return labels, data_points
@@ -1,9 +1,10 @@
 import sqlite3
 from flask import session
+from db import get_db
 
 def init_animals_table():
     """Initialize the animals table in users.db - table is defined in schema.sql"""
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # Create animals table if not exists (also defined in schema.sql)
@@ -40,45 +41,60 @@ def init_animals_table():
             VALUES (?, ?, ?, ?, ?, ?, ?)
         ''', sample_animals)
         conn.commit()
-    
-    conn.close()
+
+    # Per-prefix tag counters (see reserve_tag_range)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tag_sequences (
+            prefix TEXT PRIMARY KEY,
+            last_value INTEGER NOT NULL
+        )
+    ''')
+    # Bring each counter up to the highest tag already in the table
+    # (the fixed sample tags, or tags created before the counters existed)
+    cursor.execute('''
+        INSERT INTO tag_sequences (prefix, last_value)
+        SELECT substr(tag, 1, instr(tag, '-') - 1), MAX(CAST(substr(tag, instr(tag, '-') + 1) AS INTEGER))
+        FROM animals
+        WHERE instr(tag, '-') > 1
+        GROUP BY 1
+        ON CONFLICT(prefix) DO UPDATE SET last_value = MAX(last_value, excluded.last_value)
+    ''')
+    conn.commit()
+
+# Tag prefix per species; anything else gets 'A'
+TAG_PREFIXES = {
+    'Cow': 'C',
+    'Buffalo': 'B',
+    'Goat': 'G',
+    'Sheep': 'S',
+    'Horse': 'H',
+    'Pig': 'P'
+}
+
+def format_tag(prefix, number):
+    return f"{prefix}-{str(number).zfill(3)}"
+
+def reserve_tag_range(cursor, species, count=1):
+    """Reserve count consecutive tags for species from the tag_sequences counter
+    and return them. The counter is bumped by a single UPSERT ... RETURNING, so
+    concurrent callers (threads or workers) always get disjoint ranges.
+    Runs in the caller's transaction: commit once the animals are inserted."""
+    prefix = TAG_PREFIXES.get(species, 'A')
+    cursor.execute('''
+        INSERT INTO tag_sequences (prefix, last_value) VALUES (?, ?)
+        ON CONFLICT(prefix) DO UPDATE SET last_value = last_value + excluded.last_value
+        RETURNING last_value
+    ''', (prefix, count))
+    last_value = cursor.fetchone()[0]
+    return [format_tag(prefix, number) for number in range(last_value - count + 1, last_value + 1)]
 
 def generate_animal_tag(species):
-    """Generate a unique animal tag based on species"""
-    conn = sqlite3.connect('users.db')
-    cursor = conn.cursor()
-    
-    # Get species prefix
-    prefix_map = {
-        'Cow': 'C',
-        'Buffalo': 'B',
-        'Goat': 'G',
-        'Sheep': 'S',
-        'Horse': 'H',
-        'Pig': 'P'
-    }
-    prefix = prefix_map.get(species, 'A')
-    
-    # Find the highest tag number for this prefix
-    cursor.execute("SELECT tag FROM animals WHERE tag LIKE ?", (f'{prefix}-%',))
-    tags = cursor.fetchall()
-    conn.close()
-    
-    max_num = 0
-    for tag in tags:
-        try:
-            num = int(tag[0].split('-')[1])
-            if num > max_num:
-                max_num = num
-        except:
-            pass
-    
-    new_tag = f"{prefix}-{str(max_num + 1).zfill(3)}"
-    return new_tag
+    """Reserve the next unique animal tag for species (in the current transaction)"""
+    return reserve_tag_range(get_db().cursor(), species)[0]
 
 def add_animal(name, species, weight, age, gender, user_email):
     """Add a new animal to the database"""
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     tag = generate_animal_tag(species)
@@ -93,7 +109,6 @@ def add_animal(name, species, weight, age, gender, user_email):
         # Get the inserted animal
         cursor.execute("SELECT * FROM animals WHERE tag = ?", (tag,))
         animal = cursor.fetchone()
-        conn.close()
         
         if animal:
             return {
@@ -108,19 +123,18 @@ def add_animal(name, species, weight, age, gender, user_email):
                 'date_added': animal[8]
             }
     except sqlite3.IntegrityError as e:
-        conn.close()
+        conn.rollback()
         return None
-    
+
     return None
 
 def get_animals_by_user(user_email):
     """Get all ACTIVE animals belonging to a user"""
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute("SELECT * FROM animals WHERE user_email = ? AND (is_active = 1 OR is_active IS NULL) ORDER BY date_added DESC", (user_email,))
     animals = cursor.fetchall()
-    conn.close()
     
     result = []
     for animal in animals:
@@ -141,12 +155,11 @@ def get_animals_by_user(user_email):
 
 def get_inactive_animals_by_user(user_email):
     """Get all INACTIVE animals belonging to a user (for history)"""
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute("SELECT * FROM animals WHERE user_email = ? AND is_active = 0 ORDER BY date_added DESC", (user_email,))
     animals = cursor.fetchall()
-    conn.close()
     
     result = []
     for animal in animals:
@@ -167,12 +180,11 @@ def get_inactive_animals_by_user(user_email):
 
 def get_all_animals_by_user(user_email):
     """Get ALL animals belonging to a user (both active and inactive)"""
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute("SELECT * FROM animals WHERE user_email = ? ORDER BY is_active DESC, date_added DESC", (user_email,))
     animals = cursor.fetchall()
-    conn.close()
     
     result = []
     for animal in animals:
@@ -193,12 +205,11 @@ def get_all_animals_by_user(user_email):
 
 def get_all_animals():
     """Get all animals in the database"""
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute("SELECT * FROM animals ORDER BY date_added DESC")
     animals = cursor.fetchall()
-    conn.close()
     
     result = []
     for animal in animals:
@@ -218,12 +229,11 @@ def get_all_animals():
 
 def get_animal_by_tag(tag):
     """Get a specific animal by its tag"""
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute("SELECT * FROM animals WHERE tag = ?", (tag,))
     animal = cursor.fetchone()
-    conn.close()
     
     if animal:
         return {
@@ -242,7 +252,7 @@ def get_animal_by_tag(tag):
 
 def update_animal(tag, name, species, weight, age, gender):
     """Update an existing animal"""
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -252,19 +262,17 @@ def update_animal(tag, name, species, weight, age, gender):
     ''', (name, species, weight, age, gender, tag))
     
     conn.commit()
-    conn.close()
     
     return get_animal_by_tag(tag)
 
 def delete_animal(tag):
     """Mark an animal as inactive (soft delete)"""
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute("UPDATE animals SET is_active = 0 WHERE tag = ?", (tag,))
     conn.commit()
     affected = cursor.rowcount
-    conn.close()
     
     return affected > 0
 
@@ -274,9 +282,8 @@ def deactivate_animal(tag):
 
 def assign_sample_animals_to_user(user_email):
     """Assign sample animals to a specific user"""
-    conn = sqlite3.connect('users.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute("UPDATE animals SET user_email = ? WHERE user_email = 'demo@example.com'", (user_email,))
     conn.commit()
-    conn.close()
@@ -2,12 +2,10 @@
 """Test by making a request to the Flask app"""
 import sqlite3
 from flask import Flask, render_template, session
-import os
-
-os.chdir('d:\\Ani_Health(Final)\\Ani')
+from db import DB_PATH
 
 # Test just the database query
-conn = sqlite3.connect('users.db')
+conn = sqlite3.connect(DB_PATH)
 cursor = conn.cursor()
 cursor.execute('SELECT COUNT(*) FROM treatment_history')
 result = cursor.fetchone()
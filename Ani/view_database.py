@@ -1,13 +1,14 @@
 #!/usr/bin/env python3
 """Script to view database contents"""
 import sqlite3
+from db import DB_PATH
 
 def view_users_db():
     print("=" * 80)
-    print("USERS DATABASE (users.db)")
+    print(f"USERS ({DB_PATH})")
     print("=" * 80)
     
-    conn = sqlite3.connect('users.db')
+    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
     # Get table schema
@@ -33,12 +34,13 @@ def view_users_db():
     
     conn.close()
 
-def view_vets_db():
+def view_vets():
     print("\n" + "=" * 80)
-    print("VETS DATABASE (vets.db)")
+    print(f"VETS ({DB_PATH})")
     print("=" * 80)
     
-    conn = sqlite3.connect('vets.db')
+    # Vets live in the vets table of the main database
+    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
     # Get table schema
@@ -68,7 +70,7 @@ def view_vets_db():
 if __name__ == "__main__":
     try:
         view_users_db()
-        view_vets_db()
+        view_vets()
         print("\n✓ Database viewing completed successfully!\n")
     except Exception as e:
         print(f"\n✗ Error: {e}\n")
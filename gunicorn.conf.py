@@ -0,0 +1,56 @@
+"""
+Gunicorn settings, loaded automatically from the working directory (see Procfile).
+The master creates or migrates the database once before forking, so every
+worker starts on the current schema; it imports Ani/schema.py for that, not the
+app. Every worker then starts its own scheduler; the SQLite lease in
+Ani/scheduler_lease.py makes sure exactly one of them runs the readings job.
+With PRELOAD_MODEL=true the app is imported and the TFLite file read once in
+the master, and the forked workers share those pages copy-on-write; each worker
+then builds and warms up its own interpreter.
+"""
+import os
+import sys
+
+# The app's modules import each other by their flat names (as in api/index.py)
+ANI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Ani')
+if ANI_DIR not in sys.path:
+    sys.path.insert(0, ANI_DIR)
+
+# Each open /api/stream/readings connection holds a thread, so use threaded workers
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 32))
+
+# Import the app in the master so the model file read in when_ready is inherited by every worker
+preload_app = os.getenv('PRELOAD_MODEL', 'false').lower() == 'true'
+
+
+def when_ready(server):
+    """Runs in the master before any worker is forked: migrate the schema, and
+    read the model file with PRELOAD_MODEL"""
+    import db
+    import schema
+    schema.prepare_database()
+    # Each worker opens its own connection; none may be inherited across the fork
+    db.close_db()
+    if preload_app:
+        # gunicorn has already imported the app in the master for preload_app
+        app_module = sys.modules[server.app.wsgi().import_name]
+        app_module.model_loader.preload()
+
+
+def post_worker_init(worker):
+    """Build the preloaded model's interpreter, and start the scheduler in this
+    worker when ENABLE_SCHEDULER is on"""
+    app_module = sys.modules[worker.wsgi.import_name]
+    if preload_app:
+        app_module.model_loader.load()
+    if app_module.get_config().ENABLE_SCHEDULER:
+        app_module.start_scheduler()
+
+
+def worker_exit(server, worker):
+    """Hand the lease over straight away instead of waiting for it to expire"""
+    wsgi = getattr(worker, 'wsgi', None)
+    app_module = sys.modules.get(wsgi.import_name) if wsgi is not None else None
+    if app_module is not None:
+        app_module.stop_scheduler()